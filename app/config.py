@@ -15,6 +15,47 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # Choix de l'IA à utiliser : "gemini" ou "groq"
 AI_PROVIDER = os.getenv("AI_PROVIDER", "groq")  # Par défaut : Groq
 
+# Correction par lot : toutes les questions d'une copie en une seule requête
+# (repli question par question pour les réponses mal formées)
+CORRECTION_BATCH_ENABLED = os.getenv("CORRECTION_BATCH_ENABLED", "true").lower() == "true"
+
+# Tâches simultanées (découpage des copies + corrections) pour TOUTE la session :
+# le débit réel reste borné par le limiteur Groq (GROQ_RPM / GROQ_TPM)
+CORRECTION_CONCURRENCE = int(os.getenv("CORRECTION_CONCURRENCE", 8))
+
+# Corrections de sessions exécutées en même temps (tâches de fond, POST /corriger)
+CORRECTION_TACHES_PARALLELES = int(os.getenv("CORRECTION_TACHES_PARALLELES", 2))
+
+# Réponse considérée vide (0 point sans appel IA) sous ce nombre de lettres/chiffres
+CORRECTION_REPONSE_MIN_CARACTERES = int(os.getenv("CORRECTION_REPONSE_MIN_CARACTERES", 2))
+
+# Identification des élèves : regex sur l'en-tête d'abord, IA (une requête
+# groupée) seulement pour les pages dont la confiance est sous ce seuil (0-1)
+IDENTIFICATION_SEUIL_CONFIANCE = float(os.getenv("IDENTIFICATION_SEUIL_CONFIANCE", 0.75))
+
+# Cache disque des réponses IA (clé = fournisseur + modèle + température + prompt)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", 100))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 0))  # secondes, 0 = sans expiration
+
+# Limites Groq du compte (offre gratuite llama-3.1-8b-instant : 30 req/min, 6000 tokens/min)
+# La limite de tokens est recalibrée avec les en-têtes renvoyés par Groq
+GROQ_RPM = int(os.getenv("GROQ_RPM", 30))
+GROQ_TPM = int(os.getenv("GROQ_TPM", 6000))
+GROQ_TOKENS_REPONSE_ESTIMES = int(os.getenv("GROQ_TOKENS_REPONSE_ESTIMES", 500))
+
+# Prompts sous budget : au-delà de PROMPT_BUDGET_TOKENS tokens de document,
+# le texte est découpé en morceaux qui se chevauchent, traités en parallèle
+PROMPT_BUDGET_TOKENS = int(os.getenv("PROMPT_BUDGET_TOKENS", 1200))
+PROMPT_CHEVAUCHEMENT_TOKENS = int(os.getenv("PROMPT_CHEVAUCHEMENT_TOKENS", 80))
+PROMPT_MAX_PARALLELE = int(os.getenv("PROMPT_MAX_PARALLELE", 4))
+
+# Routeur Groq ↔ Gemini : bascule sur erreur / rate limit, et hedging optionnel
+# (doublon vers l'autre fournisseur si pas de réponse au bout du p95 observé)
+LLM_FAILOVER_ENABLED = os.getenv("LLM_FAILOVER_ENABLED", "true").lower() == "true"
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+LLM_HEDGE_DELAI_DEFAUT = float(os.getenv("LLM_HEDGE_DELAI_DEFAUT", 10))  # tant que le p95 est inconnu (s)
+
 # Configuration des modèles
 AI_MODELS = {
     "gemini": "gemini-pro",
@@ -28,6 +69,22 @@ AI_MODELS = {
 # ✅ NOUVEAU : Clé API OCR.space
 OCRSPACE_API_KEY = os.getenv("OCRSPACE_API_KEY", "K87899142388957")
 
+# Client OCR.space (URL modifiable pour pointer vers ocrspace_standin.py)
+OCRSPACE_URL = os.getenv("OCRSPACE_URL", "https://api.ocr.space/parse/image")
+OCRSPACE_CONCURRENCY = int(os.getenv("OCRSPACE_CONCURRENCY", 4))
+OCRSPACE_MAX_RETRIES = int(os.getenv("OCRSPACE_MAX_RETRIES", 4))
+OCRSPACE_TIMEOUT = float(os.getenv("OCRSPACE_TIMEOUT", 60))  # par tentative (s)
+OCRSPACE_DEADLINE = float(os.getenv("OCRSPACE_DEADLINE", 180))  # retries compris (s)
+
+# Quota OCR.space (registre partagé entre threads et workers)
+OCR_USAGE_FILE = os.getenv("OCR_USAGE_FILE", "ocr_usage.json")
+OCRSPACE_MONTHLY_LIMIT = int(os.getenv("OCRSPACE_MONTHLY_LIMIT", 25000))
+OCRSPACE_RATE_PER_MINUTE = int(os.getenv("OCRSPACE_RATE_PER_MINUTE", 30))
+
+# Limites par requête OCR.space (offre gratuite : 3 pages par PDF, 1 Mo)
+OCRSPACE_MAX_PAGES = int(os.getenv("OCRSPACE_MAX_PAGES", 3))
+OCRSPACE_MAX_FILE_KB = int(os.getenv("OCRSPACE_MAX_FILE_KB", 1024))
+
 # ====================================
 # CONFIGURATION DES FICHIERS
 # ====================================
@@ -45,7 +102,43 @@ UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
 COPIES_FOLDER = os.path.join(UPLOAD_FOLDER, "copies")
 CORRECTIONS_FOLDER = os.path.join(UPLOAD_FOLDER, "corrections")
 EPREUVES_FOLDER = os.path.join(UPLOAD_FOLDER, "epreuves")
-EXPORTS_FOLDER = "exports"
+EXPORTS_FOLDER = os.getenv("EXPORTS_FOLDER", "exports")
+
+# Base des sessions (SQLite, mode WAL) : sessions, copies et résultats
+# survivent aux redémarrages
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join("data", "sessions.db"))
+
+# Dossier des caches disque (résultats OCR, ...)
+CACHE_FOLDER = os.getenv("CACHE_FOLDER", "cache")
+
+# Modèles d'examen (barème + correction découpée) réutilisés entre sessions
+# qui envoient la même épreuve et la même correction
+EXAM_TEMPLATES_ENABLED = os.getenv("EXAM_TEMPLATES_ENABLED", "true").lower() == "true"
+EXAM_TEMPLATES_FOLDER = os.getenv("EXAM_TEMPLATES_FOLDER", os.path.join(CACHE_FOLDER, "modeles"))
+
+# Points de reprise des corrections (journal JSONL par session, fsync à
+# chaque résultat) : une correction interrompue reprend là où elle s'est arrêtée
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "true").lower() == "true"
+CHECKPOINT_FOLDER = os.getenv("CHECKPOINT_FOLDER", "checkpoints")
+
+# ====================================
+# DÉPLOIEMENT MULTI-WORKERS
+# ====================================
+
+# État partagé (tâches de correction, baux des sessions) :
+# - "local" : un seul processus
+# - "fichier" : dossier commun + verrou fichier (uvicorn --workers N, ou
+#   conteneurs montant le même volume que UPLOAD_FOLDER, EXPORTS_FOLDER,
+#   DATABASE_PATH, CHECKPOINT_FOLDER et OCR_USAGE_FILE)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")
+STATE_FOLDER = os.getenv("STATE_FOLDER", os.path.join("data", "etat"))
+
+# Bail d'une session en correction : un seul worker la corrige ; renouvelé
+# tant que la tâche vit, repris par un autre worker s'il expire (worker mort)
+SESSION_BAIL_SECONDES = float(os.getenv("SESSION_BAIL_SECONDES", 60))
+
+# Durée de conservation de l'état des tâches terminées (GET /taches/{id})
+TACHES_RETENTION_SECONDES = float(os.getenv("TACHES_RETENTION_SECONDES", 24 * 3600))
 
 # ====================================
 # CONFIGURATION TESSERACT (OCR) - DÉSACTIVÉ
@@ -54,6 +147,37 @@ EXPORTS_FOLDER = "exports"
 # Chemin vers Tesseract (non utilisé avec OCR.space)
 TESSERACT_PATH = os.getenv("TESSERACT_PATH", "tesseract")
 
+# Moteur Tesseract : "cli" (pytesseract, 1 processus par appel)
+# ou "api" (tesserocr, moteur chaud en mémoire - voir bench_tesseract.py)
+TESSERACT_ENGINE = os.getenv("TESSERACT_ENGINE", "cli")
+
+# Nombre de processus pour l'OCR Tesseract page par page
+# 0 = automatique (nombre de cœurs), 1 = séquentiel
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", 0))
+
+# Nombre de pages rastérisées à la fois (mémoire bornée : ~25 Mo/page à 300 dpi)
+PDF_RASTER_WINDOW = int(os.getenv("PDF_RASTER_WINDOW", 2))
+
+# Moteur de rastérisation PDF :
+# - "pdfium" : pypdfium2 en processus, rendu direct en NumPy niveaux de gris
+# - "pdf2image" : poppler (pdftoppm en sous-processus + fichiers PPM)
+PDF_RASTER_ENGINE = os.getenv("PDF_RASTER_ENGINE", "pdfium")
+
+# Couche texte native des PDF numériques : utilisée sans OCR si exploitable
+PDF_TEXT_LAYER_ENABLED = os.getenv("PDF_TEXT_LAYER_ENABLED", "true").lower() == "true"
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", 50))
+
+# Cache des résultats OCR (clé = hash du fichier + moteur + paramètres)
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", 500))
+
+# Détection imprimé/manuscrit :
+# "tesseract" (pleine page, texte réutilisé), "vignette_cv" ou "vignette_tesseract"
+# (basse résolution, voir bench_detection.py pour comparer)
+OCR_DETECTION_MODE = os.getenv("OCR_DETECTION_MODE", "tesseract")
+OCR_DETECTION_DPI = int(os.getenv("OCR_DETECTION_DPI", 100))
+OCR_DETECTION_SEUIL_CV = float(os.getenv("OCR_DETECTION_SEUIL_CV", 0.9))
+
 # ====================================
 # CONFIGURATION API
 # ====================================
@@ -1 +1,277 @@
-sessions = {}
+"""
+Dépôt des sessions (SQLite, mode WAL)
+- Sessions, copies et résultats survivent aux redémarrages
+- Colonnes indexées pour les listes : status, created_at
+- Textes des copies et résultats dans des tables séparées, lus seulement
+  quand on en a besoin (liste et statut sans charger les gros blobs)
+- Changements de statut transactionnels (BEGIN IMMEDIATE + condition)
+- Une connexion par thread (endpoints FastAPI, tâches de correction)
+"""
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from app.config import DATABASE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id          TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    nb_copies   INTEGER NOT NULL DEFAULT 0,
+    donnees     TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+
+CREATE TABLE IF NOT EXISTS copies (
+    session_id     TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    idx            INTEGER NOT NULL,
+    nom_eleve      TEXT,
+    classe         TEXT,
+    pages_sources  TEXT NOT NULL DEFAULT '[]',
+    texte_complet  TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (session_id, idx)
+);
+
+CREATE TABLE IF NOT EXISTS resultats (
+    session_id  TEXT PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+    contenu     TEXT NOT NULL
+);
+"""
+
+
+class DepotSessions:
+    """
+    Accès aux sessions de correction.
+
+    Une session est un dict léger : id, status, created_at, nb_copies +
+    les champs de `donnees` (epreuve, correction, modele_id, statistiques
+    de la dernière correction...). Copies et résultats : copies(), resultats().
+    """
+
+    def __init__(self, chemin: str):
+        self.chemin = chemin
+        self._local = threading.local()
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        self._connexion().executescript(SCHEMA)
+
+    def _connexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.chemin, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Transaction en écriture (verrou pris dès le début : pas de conflit lecture → écriture)"""
+        conn = self._connexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _session(ligne) -> dict:
+        session = json.loads(ligne["donnees"])
+        session.update({
+            "id": ligne["id"],
+            "status": ligne["status"],
+            "created_at": ligne["created_at"],
+            "updated_at": ligne["updated_at"],
+            "nb_copies": ligne["nb_copies"],
+        })
+        return session
+
+    # ------------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------------
+
+    def creer(self, session_id: str, copies: list, status: str = "copies_uploaded", **donnees) -> dict:
+        """Crée la session et ses copies en une transaction"""
+        maintenant = datetime.now().isoformat()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, status, created_at, updated_at, nb_copies, donnees) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, status, maintenant, maintenant, len(copies), json.dumps(donnees, ensure_ascii=False))
+            )
+            conn.executemany(
+                "INSERT INTO copies (session_id, idx, nom_eleve, classe, pages_sources, texte_complet) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (session_id, idx, copie.get("nom_eleve"), copie.get("classe"),
+                     json.dumps(copie.get("pages_sources", [])), copie.get("texte_complet", ""))
+                    for idx, copie in enumerate(copies)
+                ]
+            )
+        return self.get(session_id)
+
+    def get(self, session_id: str):
+        """Session sans copies ni résultats, ou None"""
+        ligne = self._connexion().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return self._session(ligne) if ligne else None
+
+    def existe(self, session_id: str) -> bool:
+        return self._connexion().execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def statut(self, session_id: str):
+        ligne = self._connexion().execute("SELECT status FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return ligne["status"] if ligne else None
+
+    def compter(self, status: str = None) -> int:
+        if status:
+            return self._connexion().execute("SELECT COUNT(*) FROM sessions WHERE status = ?", (status,)).fetchone()[0]
+        return self._connexion().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def lister(self, status: str = None, limite: int = 100, decalage: int = 0) -> list:
+        """Sessions les plus récentes d'abord (sans copies ni résultats)"""
+        requete = "SELECT * FROM sessions"
+        parametres = []
+        if status:
+            requete += " WHERE status = ?"
+            parametres.append(status)
+        requete += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        parametres += [limite, decalage]
+        return [self._session(ligne) for ligne in self._connexion().execute(requete, parametres)]
+
+    def mettre_a_jour(self, session_id: str, status: str = None, **donnees) -> bool:
+        """
+        Fusionne `donnees` dans la session (et change le statut si fourni).
+
+        Returns:
+            False si la session n'existe pas
+        """
+        with self._transaction() as conn:
+            ligne = conn.execute("SELECT status, donnees FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if not ligne:
+                return False
+            contenu = json.loads(ligne["donnees"])
+            contenu.update(donnees)
+            conn.execute(
+                "UPDATE sessions SET status = ?, donnees = ?, updated_at = ? WHERE id = ?",
+                (status or ligne["status"], json.dumps(contenu, ensure_ascii=False),
+                 datetime.now().isoformat(), session_id)
+            )
+            return True
+
+    def changer_statut(self, session_id: str, nouveau: str, depuis: tuple = None, sauf: tuple = None):
+        """
+        Transition de statut atomique.
+
+        Args:
+            depuis: statuts de départ autorisés (tous si None)
+            sauf: statuts de départ interdits
+
+        Returns:
+            Le statut précédent, ou None si la session n'existe pas ou si
+            la transition est refusée
+        """
+        with self._transaction() as conn:
+            ligne = conn.execute("SELECT status FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if not ligne:
+                return None
+            precedent = ligne["status"]
+            if (depuis and precedent not in depuis) or (sauf and precedent in sauf):
+                return None
+            conn.execute("UPDATE sessions SET status = ?, updated_at = ? WHERE id = ?",
+                         (nouveau, datetime.now().isoformat(), session_id))
+            return precedent
+
+    def supprimer(self, session_id: str, sauf: tuple = ()) -> bool:
+        """Supprime la session, ses copies et ses résultats (refusé si son statut est dans `sauf`)"""
+        with self._transaction() as conn:
+            ligne = conn.execute("SELECT status FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if not ligne or ligne["status"] in sauf:
+                return False
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return True
+
+    # ------------------------------------------------------------------
+    # Copies et résultats (chargés à la demande)
+    # ------------------------------------------------------------------
+
+    def copies(self, session_id: str, avec_texte: bool = True) -> list:
+        colonnes = "nom_eleve, classe, pages_sources" + (", texte_complet" if avec_texte else "")
+        copies = []
+        for ligne in self._connexion().execute(
+                f"SELECT {colonnes} FROM copies WHERE session_id = ? ORDER BY idx", (session_id,)):
+            copie = dict(ligne)
+            copie["pages_sources"] = json.loads(copie["pages_sources"])
+            copies.append(copie)
+        return copies
+
+    def copie(self, session_id: str, idx: int):
+        """Une copie avec son texte complet, ou None"""
+        ligne = self._connexion().execute(
+            "SELECT nom_eleve, classe, pages_sources, texte_complet FROM copies WHERE session_id = ? AND idx = ?",
+            (session_id, idx)).fetchone()
+        if not ligne:
+            return None
+        copie = dict(ligne)
+        copie["pages_sources"] = json.loads(copie["pages_sources"])
+        return copie
+
+    def resultats(self, session_id: str):
+        """Résultats de la dernière correction, ou None"""
+        ligne = self._connexion().execute("SELECT contenu FROM resultats WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(ligne["contenu"]) if ligne else None
+
+    def page_resultats(self, session_id: str, limite: int = 20, decalage: int = 0):
+        """
+        (nombre total, résultats de la page) ; None si pas de résultats.
+        Découpé par SQLite (json_each) : seule la page est décodée.
+        """
+        conn = self._connexion()
+        ligne = conn.execute("SELECT json_array_length(contenu) AS total FROM resultats WHERE session_id = ?",
+                             (session_id,)).fetchone()
+        if not ligne:
+            return None
+        page = conn.execute(
+            "SELECT json_quote(value) AS value FROM resultats, json_each(resultats.contenu) WHERE session_id = ? "
+            "ORDER BY key LIMIT ? OFFSET ?", (session_id, limite, decalage))
+        return ligne["total"], [json.loads(r["value"]) for r in page]
+
+    def resume_resultats(self, session_id: str):
+        """Élève et note de chaque copie corrigée (sans le détail par question), ou None"""
+        conn = self._connexion()
+        if not conn.execute("SELECT 1 FROM resultats WHERE session_id = ?", (session_id,)).fetchone():
+            return None
+        return [dict(ligne) for ligne in conn.execute(
+            "SELECT json_extract(value, '$.nom_eleve') AS nom_eleve, json_extract(value, '$.classe') AS classe, "
+            "json_extract(value, '$.note_finale') AS note_finale "
+            "FROM resultats, json_each(resultats.contenu) WHERE session_id = ? ORDER BY key", (session_id,))]
+
+    def enregistrer_resultats(self, session_id: str, resultats: list, status: str = "corrected", **donnees) -> bool:
+        """Résultats + statut + statistiques de la correction, en une transaction"""
+        with self._transaction() as conn:
+            ligne = conn.execute("SELECT donnees FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if not ligne:
+                return False
+            contenu = json.loads(ligne["donnees"])
+            contenu.update(donnees)
+            conn.execute(
+                "INSERT INTO resultats (session_id, contenu) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET contenu = excluded.contenu",
+                (session_id, json.dumps(resultats, ensure_ascii=False))
+            )
+            conn.execute(
+                "UPDATE sessions SET status = ?, donnees = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(contenu, ensure_ascii=False), datetime.now().isoformat(), session_id)
+            )
+            return True
+
+
+depot_sessions = DepotSessions(DATABASE_PATH)
@@ -2,18 +2,24 @@ from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import uuid
 import os
 from fastapi_offline import FastAPIOffline
 
-from app.config import CORS_ORIGINS, UPLOAD_FOLDER, EPREUVES_FOLDER, COPIES_FOLDER, CORRECTIONS_FOLDER
+from app.config import CORS_ORIGINS, UPLOAD_FOLDER, EPREUVES_FOLDER, COPIES_FOLDER, CORRECTIONS_FOLDER, EXPORTS_FOLDER
 from app.services.file_service import validate_file, save_file
-from app.services.correction_service import lancer_correction_automatique
+from app.services.job_service import gestionnaire_taches, STATUTS_ACTIFS
 from app.services.report_service import generer_rapport_consolide_pdf
-from app.database import sessions
+from app.database import depot_sessions
 from app.services.split_copies_service import decouper_copies_par_eleve
-from app.services.ocr_hybrid_service import print_quota_status
+from app.services.ocr_hybrid_service import print_quota_status, get_quota_status, get_ocr_cache_stats, ocr_cache
+from app.services.groq_client import get_llm_cache_stats, llm_cache, routeur
+from app.services.rate_limit_service import limiteur_groq
+from app.services.prompt_service import get_calibrage_tokens
+from app.services.template_service import modeles_examen, modele_pour_session
+from app.services.metrics_service import suivre_session, get_metriques, supprimer_metriques
+from app.services.checkpoint_service import supprimer_journal
 
 app = FastAPIOffline(
     title="API Correction Automatique",
@@ -36,10 +42,15 @@ async def startup_event():
     os.makedirs(COPIES_FOLDER, exist_ok=True)
     os.makedirs(CORRECTIONS_FOLDER, exist_ok=True)
     os.makedirs(EPREUVES_FOLDER, exist_ok=True)
-    os.makedirs("exports", exist_ok=True)
+    os.makedirs(EXPORTS_FOLDER, exist_ok=True)
     
     print("🚀 Démarrage de l'API de correction automatique.")
     
+    # Corrections interrompues par l'arrêt d'un worker (bail expiré) : relançables (journal de reprise)
+    interrompues = gestionnaire_taches.reprendre_interrompues()
+    if interrompues:
+        print(f"♻️  {interrompues} correction(s) interrompue(s) : sessions remises à ready_to_correct")
+    
     # ✅ AFFICHER LE QUOTA OCR.SPACE
     print_quota_status()
 
@@ -59,30 +70,98 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ocr/quota", summary="Quota OCR.space : usage, budget restant, attente du limiteur")
+def ocr_quota():
+    return get_quota_status()
+
+
+@app.get("/ocr/cache", summary="Statistiques du cache OCR")
+def ocr_cache_stats():
+    return get_ocr_cache_stats()
+
+
+@app.delete("/ocr/cache", summary="Vide le cache OCR")
+def ocr_cache_clear():
+    return {"message": "Cache OCR vidé.", "entrees_supprimees": ocr_cache.clear()}
+
+
+@app.get("/llm/cache", summary="Statistiques du cache des réponses IA")
+def llm_cache_stats():
+    return get_llm_cache_stats()
+
+
+@app.delete("/llm/cache", summary="Vide le cache des réponses IA")
+def llm_cache_clear():
+    return {"message": "Cache IA vidé.", "entrees_supprimees": llm_cache.clear()}
+
+
+@app.get("/llm/debit", summary="Limiteur Groq : capacité disponible, attente cumulée, 429 reçus, comptage des tokens")
+def llm_debit():
+    return {**limiteur_groq.statut(), "comptage_tokens": get_calibrage_tokens()}
+
+
+@app.get("/llm/fournisseurs", summary="Routeur IA : santé, latences (p95), bascules et hedging par fournisseur")
+def llm_fournisseurs():
+    return routeur.statut()
+
+
+@app.get("/modeles", summary="Modèles d'examen (barème + correction découpée) réutilisés entre sessions")
+def lister_modeles():
+    return {"modeles": modeles_examen.lister(), "stats": modeles_examen.stats()}
+
+
+@app.delete("/modeles/{modele_id}", summary="Invalide un modèle d'examen (recalculé à la prochaine correction)")
+def supprimer_modele(modele_id: str):
+    if not modeles_examen.supprimer(modele_id):
+        raise HTTPException(status_code=404, detail="Modèle d'examen introuvable.")
+    return {"message": "Modèle d'examen invalidé.", "modele_id": modele_id}
+
+
+@app.delete("/modeles", summary="Invalide tous les modèles d'examen")
+def vider_modeles():
+    return {"message": "Modèles d'examen invalidés.", "modeles_supprimes": modeles_examen.clear()}
+
+
 @app.get("/sessions")
-def list_sessions():
-    """Liste toutes les sessions avec informations basiques"""
+def list_sessions(status: Optional[str] = None, limite: int = 100, decalage: int = 0):
+    """Liste les sessions (plus récentes d'abord, par pages) avec informations basiques"""
+    limite = max(1, min(limite, 1000))
     return {
-        "total_sessions": len(sessions),
+        "total_sessions": depot_sessions.compter(status),
+        "limite": limite,
+        "decalage": decalage,
         "sessions": {
-            session_id: {
+            data["id"]: {
                 "status": data.get("status", "unknown"),
-                "has_epreuve": "epreuve" in data and data["epreuve"] is not None,
-                "copies_count": len(data.get("copies", [])),
-                "has_correction": "correction" in data and data["correction"] is not None
+                "created_at": data.get("created_at"),
+                "has_epreuve": data.get("epreuve") is not None,
+                "copies_count": data.get("nb_copies", 0),
+                "has_correction": data.get("correction") is not None
             }
-            for session_id, data in sessions.items()
+            for data in depot_sessions.lister(status, limite, decalage)
         }
     }
 
 
 @app.get("/sessions/{session_id}")
 def get_session_details(session_id: str):
-    """Récupère les détails complets d'une session spécifique"""
-    if session_id not in sessions:
+    """
+    Détails d'une session : copies sans leur texte, résultats résumés
+    (élève et note). Textes et résultats détaillés : endpoints dédiés.
+    """
+    session_data = depot_sessions.get(session_id)
+    if not session_data:
         raise HTTPException(status_code=404, detail="Session introuvable.")
 
-    session_data = sessions[session_id]
+    # Correction en cours : compteurs publiés par le worker qui la porte ;
+    # sinon ceux enregistrés avec la session (ils survivent aux redémarrages)
+    metriques = session_data.get("metriques")
+    cache_llm = session_data.get("cache_llm")
+    if session_data["status"] == "correcting":
+        tache = gestionnaire_taches.tache_de_session(session_id, avec_resultats=False)
+        if tache and tache.get("metriques"):
+            metriques = tache["metriques"]
+            cache_llm = get_llm_cache_stats(metriques=metriques)
 
     return {
         "id": session_data.get("id", session_id),
@@ -90,23 +169,54 @@ def get_session_details(session_id: str):
         "created_at": session_data.get("created_at", datetime.now().isoformat()),
         "epreuve": session_data.get("epreuve"),
         "correction": session_data.get("correction"),
-        "copies": session_data.get("copies", []),
-        "results": session_data.get("results")
+        "modele_id": session_data.get("modele_id"),
+        "copies": depot_sessions.copies(session_id, avec_texte=False),
+        "results": depot_sessions.resume_resultats(session_id),
+        "cache_llm": cache_llm,
+        "appels_evites": session_data.get("appels_evites"),
+        "ordonnancement": session_data.get("ordonnancement"),
+        "reprise": session_data.get("reprise"),
+        "ocr": session_data.get("ocr"),
+        "metriques": metriques
     }
 
 
+@app.get("/sessions/{session_id}/copies/{idx}", summary="Une copie avec son texte complet")
+def get_copie(session_id: str, idx: int):
+    copie = depot_sessions.copie(session_id, idx)
+    if not copie:
+        raise HTTPException(status_code=404, detail="Copie introuvable.")
+    return {"session_id": session_id, "idx": idx, **copie}
+
+
+@app.get("/sessions/{session_id}/resultats", summary="Résultats détaillés de la session, par pages")
+def get_resultats(session_id: str, limite: int = 20, decalage: int = 0):
+    limite = max(1, min(limite, 200))
+    decalage = max(0, decalage)
+    page = depot_sessions.page_resultats(session_id, limite, decalage)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Session ou résultats introuvables.")
+    total, resultats = page
+    return {"session_id": session_id, "total": total, "limite": limite, "decalage": decalage,
+            "resultats": resultats}
+
+
 @app.post("/upload-copies-bundle")
 async def upload_copies_bundle(file: UploadFile = File(...)):
     validate_file(file)
     file_path = await save_file(file, COPIES_FOLDER.split(os.sep)[-1])
-    groupes_par_eleve = decouper_copies_par_eleve(file_path)
+
+    # Identifiant créé avant le découpage : l'extraction des noms compte dans les métriques
+    session_id = str(uuid.uuid4())
+    with suivre_session(session_id):
+        groupes_par_eleve, niveaux_identification, stats_ocr = decouper_copies_par_eleve(file_path)
 
     if not groupes_par_eleve:
         os.remove(file_path)
+        supprimer_metriques(session_id)
         raise HTTPException(status_code=400,
                             detail="Aucun élève n'a pu être détecté dans le fichier. Assurez-vous que le nom et la classe sont bien visibles.")
 
-    session_id = str(uuid.uuid4())
     copies_pour_session = []
 
     for (nom, classe), pages in groupes_par_eleve.items():
@@ -118,15 +228,13 @@ async def upload_copies_bundle(file: UploadFile = File(...)):
             "pages_sources": [p["page_num"] for p in pages]
         })
 
-    sessions[session_id] = {
-        "id": session_id,
-        "epreuve": None,
-        "copies": copies_pour_session,
-        "correction": None,
-        "status": "copies_uploaded",
-        "created_at": datetime.now().isoformat(),
-        "results": None
-    }
+    # Métriques de l'extraction des noms gardées avec la session : la
+    # correction peut tourner sur un autre worker
+    metriques = get_metriques(session_id)
+    depot_sessions.creer(session_id, copies_pour_session, status="copies_uploaded",
+                         epreuve=None, correction=None, ocr={"copies": stats_ocr},
+                         metriques=metriques, cache_llm=get_llm_cache_stats(metriques=metriques))
+    supprimer_metriques(session_id)
     os.remove(file_path)
 
     return {
@@ -134,51 +242,107 @@ async def upload_copies_bundle(file: UploadFile = File(...)):
         "session_id": session_id,
         "eleves_detectes": [
             {"nom": c["nom_eleve"], "classe": c["classe"], "pages": c["pages_sources"]} for c in copies_pour_session
-        ]
+        ],
+        "identification_pages": niveaux_identification
     }
 
 
+def _resume_modele(modele):
+    """Modèle d'examen rattaché à l'upload (barème connu avant la correction)"""
+    if not modele:
+        return None
+    return {"id": modele["id"], "bareme": modele["bareme"], "utilisations": modele.get("utilisations", 0)}
+
+
 @app.post("/upload-epreuve/{session_id}")
 async def upload_epreuve(session_id: str, file: UploadFile = File(...)):
-    if session_id not in sessions:
+    session = depot_sessions.get(session_id)
+    if not session:
         raise HTTPException(status_code=404, detail="Session introuvable.")
     validate_file(file)
     file_path = await save_file(file, EPREUVES_FOLDER.split(os.sep)[-1])
-    sessions[session_id]["epreuve"] = {"filename": file.filename, "path": file_path}
-    sessions[session_id]["status"] = "epreuve_uploaded"
-    return {"message": "Épreuve uploadée.", "session_id": session_id}
+    session["epreuve"] = {"filename": file.filename, "path": file_path}
+    modele = modele_pour_session(session)
+    depot_sessions.mettre_a_jour(session_id, status="epreuve_uploaded",
+                                 epreuve=session["epreuve"], modele_id=session.get("modele_id"))
+    return {"message": "Épreuve uploadée.", "session_id": session_id, "modele_examen": _resume_modele(modele)}
 
 
 @app.post("/upload-correction/{session_id}")
 async def upload_correction(session_id: str, file: UploadFile = File(...)):
-    if session_id not in sessions:
+    session = depot_sessions.get(session_id)
+    if not session:
         raise HTTPException(status_code=404, detail="Session introuvable.")
     validate_file(file)
     file_path = await save_file(file, CORRECTIONS_FOLDER.split(os.sep)[-1])
-    sessions[session_id]["correction"] = {"filename": file.filename, "path": file_path}
-    sessions[session_id]["status"] = "ready_to_correct"
-    return {"message": "Correction du professeur uploadée.", "session_id": session_id}
+    session["correction"] = {"filename": file.filename, "path": file_path}
+    modele = modele_pour_session(session)
+    depot_sessions.mettre_a_jour(session_id, status="ready_to_correct", epreuve=session.get("epreuve"),
+                                 correction=session["correction"], modele_id=session.get("modele_id"))
+    return {"message": "Correction du professeur uploadée.", "session_id": session_id,
+            "modele_examen": _resume_modele(modele)}
 
 
-@app.post("/corriger/{session_id}", summary="Lance la correction automatique d'une session")
+@app.post("/corriger/{session_id}", status_code=202,
+          summary="Lance la correction automatique d'une session en tâche de fond")
 def corriger_session(session_id: str):
+    session = depot_sessions.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session introuvable.")
+    if not session.get("epreuve") or not session.get("correction"):
+        raise HTTPException(status_code=400, detail="L'épreuve et la correction doivent être uploadées avant la correction.")
+
     try:
-        resultats = lancer_correction_automatique(session_id)
-        if isinstance(resultats, dict) and "error" in resultats:
-            raise HTTPException(status_code=500, detail=resultats["error"])
-        return {"message": "Correction terminée", "session_id": session_id, "resultats": resultats}
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Une erreur inattendue est survenue: {str(e)}")
+        tache, deja_en_cours = gestionnaire_taches.soumettre(session_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "message": "Correction déjà en cours" if deja_en_cours else "Correction lancée",
+        "session_id": session_id,
+        "job_id": tache["job_id"],
+        "statut": tache["statut"],
+        "worker": tache.get("worker"),
+        "deja_en_cours": deja_en_cours
+    }
+
+
+@app.get("/taches", summary="Tâches de correction (sans les résultats)")
+def lister_taches():
+    return {"taches": gestionnaire_taches.lister()}
+
+
+@app.get("/taches/{job_id}", summary="Progression d'une correction : copies, questions, ETA, résultats partiels")
+def statut_tache(job_id: str):
+    tache = gestionnaire_taches.statut(job_id)
+    if not tache:
+        raise HTTPException(status_code=404, detail="Tâche introuvable.")
+    return tache
+
+
+@app.post("/taches/{job_id}/annuler", summary="Annule une correction (les copies terminées restent consultables)")
+def annuler_tache(job_id: str):
+    tache = gestionnaire_taches.annuler(job_id)
+    if not tache:
+        raise HTTPException(status_code=404, detail="Tâche introuvable.")
+    active = tache["statut"] in STATUTS_ACTIFS
+    return {"message": "Annulation demandée." if active else "Tâche déjà terminée.",
+            "job_id": job_id, "statut": tache["statut"]}
+
+
+@app.get("/sessions/{session_id}/tache", summary="Dernière tâche de correction d'une session")
+def tache_de_session(session_id: str):
+    tache = gestionnaire_taches.tache_de_session(session_id)
+    if not tache:
+        raise HTTPException(status_code=404, detail="Aucune correction lancée pour cette session.")
+    return tache
 
 
 @app.get("/export-pdf/{session_id}", summary="Génère un rapport PDF consolidé pour une session")
 def export_pdf_consolide(session_id: str):
-    if session_id not in sessions or not sessions[session_id].get("results"):
+    resultats = depot_sessions.resultats(session_id)
+    if not resultats:
         raise HTTPException(status_code=404, detail="Session ou résultats introuvables.")
 
-    resultats = sessions[session_id]["results"]
     output_filename = f"rapport_consolide_{session_id}.pdf"
 
     pdf_path = generer_rapport_consolide_pdf(resultats, output_filename)
@@ -188,7 +352,8 @@ def export_pdf_consolide(session_id: str):
 
 @app.get("/download-pdf/{filename}")
 def download_pdf(filename: str):
-    file_path = os.path.join("exports", filename)
+    # Dossier partagé entre workers ; pas de chemin relatif dans le nom
+    file_path = os.path.join(EXPORTS_FOLDER, os.path.basename(filename))
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="PDF non trouvé.")
     return FileResponse(file_path, media_type="application/pdf", filename=filename)
@@ -197,21 +362,26 @@ def download_pdf(filename: str):
 @app.delete("/sessions/{session_id}")
 def delete_session(session_id: str):
     """🗑️ Supprime une session INACHEVÉE (fichiers + DB)"""
-    if session_id not in sessions:
+    session_data = depot_sessions.get(session_id)
+    if not session_data:
         raise HTTPException(status_code=404, detail="Session introuvable.")
 
-    if sessions[session_id].get("status") == "corrected":
+    if session_data.get("status") == "corrected":
         raise HTTPException(status_code=400, detail="Impossible de supprimer une session terminée.")
 
-    import shutil
-    session_data = sessions[session_id]
+    tache = gestionnaire_taches.tache_de_session(session_id, avec_resultats=False)
+    if tache and tache["statut"] in STATUTS_ACTIFS:
+        raise HTTPException(status_code=400, detail="Correction en cours : annulez-la avant de supprimer la session.")
+
+    if not depot_sessions.supprimer(session_id, sauf=("corrected", "correcting")):
+        raise HTTPException(status_code=400, detail="La session a changé de statut pendant la suppression.")
 
     for file_key in ["epreuve", "correction"]:
         if file_key in session_data and session_data[file_key]:
             file_path = session_data[file_key]["path"]
             if os.path.exists(file_path):
                 os.remove(file_path)
-
-    del sessions[session_id]
+    supprimer_metriques(session_id)
+    supprimer_journal(session_id)
 
     return {"message": "Session supprimée avec succès."}
\ No newline at end of file
@@ -5,100 +5,87 @@ Gestion d'erreurs et fallbacks multiples
 import json
 import re
 from app.services.groq_client import call_groq
-from app.config import AI_PROVIDER
+from app.services.metrics_service import etape
+from app.services.prompt_service import (
+    compacter, compter_tokens, decouper_en_morceaux, traiter_morceaux, fusionner_segments
+)
+from app.services.extract_utils import NOM_INCONNU, CLASSE_INCONNUE
+from app.config import AI_PROVIDER, PROMPT_BUDGET_TOKENS
 
-# Compteur global de tokens
-TOKENS_UTILISES = {
-    "extraction_nom": 0,
-    "decoupage_questions": 0,
-    "correction": 0,
-    "bareme": 0,
-    "total": 0
-}
+REPONSE_ABSENTE = "AUCUNE RÉPONSE FOURNIE."
 
 
-def get_tokens_stats():
-    """Retourne les statistiques d'usage des tokens."""
-    return TOKENS_UTILISES
-
-
-def reset_tokens_stats():
-    """Réinitialise le compteur de tokens."""
-    global TOKENS_UTILISES
-    TOKENS_UTILISES = {
-        "extraction_nom": 0,
-        "decoupage_questions": 0,
-        "correction": 0,
-        "bareme": 0,
-        "total": 0
-    }
-
-
-def extraire_nom_classe_avec_ia(texte_ocr: str) -> tuple:
-    """Extrait le nom et la classe avec IA + fallback regex."""
-    
-    # TENTATIVE 1 : IA
-    prompt = f"""
-Extrait le NOM et la CLASSE de l'élève.
-
-TEXTE (300 premiers caractères) :
-{texte_ocr[:300]}
+def _construire_prompt_noms(entetes: dict) -> str:
+    """Un seul prompt pour les en-têtes de plusieurs pages"""
+    pages = "\n\n".join(f"### PAGE {page_num}\n{entete}" for page_num, entete in entetes.items())
+    return f"""Pour chaque PAGE ci-dessous (début d'une page de copie scannée), extrait le NOM et la CLASSE de l'élève.
 
 INSTRUCTIONS :
 - Cherche "Nom :", "Matricule :", patterns capitalisés
 - Ignore "Copie", "Code", "Etudiant"
 - Classe : "3IL", "L3", etc. (2-4 caractères)
-
-SORTIE JSON :
-{{
-  "nom": "<NOM Prénom>",
-  "classe": "<code>"
-}}
-
-Si rien : {{"nom": "Eleve inconnu", "classe": "Classe inconnue"}}
-"""
-    
-    try:
-        response = call_groq(prompt)
-        json_text = response.strip().replace("```json", "").replace("```", "")
-        data = json.loads(json_text)
+- Page sans nom d'élève : {{"nom": "{NOM_INCONNU}", "classe": "{CLASSE_INCONNUE}"}}
+
+{pages}
+
+SORTIE JSON (une clé par page) :
+{{"{next(iter(entetes))}": {{"nom": "<NOM Prénom>", "classe": "<code>"}}}}"""
+
+
+def extraire_noms_classes_par_lot(entetes: dict) -> dict:
+    """
+    Extrait nom et classe de plusieurs pages en UNE requête IA
+    (plusieurs en parallèle seulement si les en-têtes dépassent le budget).
+    
+    Args:
+        entetes: {page_num: texte de l'en-tête}
+    
+    Returns:
+        {page_num: (nom, classe)} pour les pages lues par l'IA ;
+        pages en erreur ou sans nom absentes
+    """
+    lots, lot, tokens = [], {}, 0
+    for page_num, entete in entetes.items():
+        tokens_entete = compter_tokens(entete)
+        if lot and tokens + tokens_entete > PROMPT_BUDGET_TOKENS:
+            lots.append(lot)
+            lot, tokens = {}, 0
+        lot[page_num] = entete
+        tokens += tokens_entete
+    if lot:
+        lots.append(lot)
+    
+    def extraire_lot(i, lot):
+        try:
+            with etape("extraction_nom"):
+                response = call_groq(_construire_prompt_noms(lot))
+            json_text = response.strip().replace("```json", "").replace("```", "")
+            data = json.loads(json_text)
+        except Exception as e:
+            print(f"    ⚠️ Erreur IA (pages {list(lot)}) : {e}")
+            return {}
         
-        nom = data.get("nom", "Eleve inconnu")
-        classe = data.get("classe", "Classe inconnue")
-        
-        tokens_utilises = len(prompt.split()) + len(response.split())
-        TOKENS_UTILISES["extraction_nom"] += tokens_utilises
-        TOKENS_UTILISES["total"] += tokens_utilises
-        
-        if nom != "Eleve inconnu":
-            print(f"    🤖 IA : {nom} ({classe})")
-            return nom, classe
-        else:
-            print(f"    ⚠️ IA n'a rien trouvé, passage au fallback...")
+        trouves = {}
+        for page_num in lot:
+            eleve = data.get(str(page_num)) if isinstance(data, dict) else None
+            if not isinstance(eleve, dict):
+                continue
+            nom = str(eleve.get("nom") or NOM_INCONNU).strip()
+            if nom and nom != NOM_INCONNU:
+                trouves[page_num] = (nom, str(eleve.get("classe") or CLASSE_INCONNUE).strip())
+        return trouves
     
-    except Exception as e:
-        print(f"    ⚠️ Erreur IA : {e}, passage au fallback...")
-    
-    # TENTATIVE 2 : REGEX (fallback)
-    print(f"    🔧 Extraction avec regex...")
-    
-    # Pattern 1 : "DUPONT Jean - Matricule"
-    m = re.search(r'([A-ZÀ-Ÿ][A-Za-zÀ-ÿ]{2,15}\s+[A-ZÀ-Ÿ][A-Za-zà-ÿ]{2,15})\s*[-–]\s*[Mm]atric', texte_ocr)
-    if m:
-        nom = m.group(1).strip()
-        print(f"    ✅ Nom trouvé (regex) : {nom}")
-    else:
-        nom = "Eleve inconnu"
+    resultats = {}
+    for trouves in traiter_morceaux(lots, extraire_lot):
+        resultats.update(trouves)
     
-    # Pattern classe : "3IL", "L3"
-    m_classe = re.search(r'\b([0-9][A-Z]{1,3}|[A-Z][0-9])\b', texte_ocr)
-    if m_classe:
-        classe = m_classe.group(1)
-        print(f"    ✅ Classe trouvée (regex) : {classe}")
-    else:
-        classe = "Classe inconnue"
-    
-    return nom, classe
+    print(f"    🤖 IA : {len(resultats)}/{len(entetes)} page(s) identifiée(s) en {len(lots)} requête(s)")
+    return resultats
+
+
+def _pattern_question(question: str) -> str:
+    # Ex: "Exercice 1" → pattern "Exercice\s*1"
+    return re.escape(question).replace(r'\ ', r'\s*')
 
 
 def _decouper_questions_regex(texte_copie: str, bareme: dict) -> dict:
@@ -110,8 +97,7 @@ def _decouper_questions_regex(texte_copie: str, bareme: dict) -> dict:
     
     # Créer des patterns pour chaque question
     for i, question in enumerate(questions_triees):
-        # Ex: "Exercice 1" → pattern "Exercice\s*1"
-        pattern_question = re.escape(question).replace(r'\ ', r'\s*')
+        pattern_question = _pattern_question(question)
         
         # Chercher la position de cette question
         match = re.search(pattern_question, texte_copie, re.IGNORECASE)
@@ -121,7 +107,7 @@ def _decouper_questions_regex(texte_copie: str, bareme: dict) -> dict:
             # Chercher la fin (début de la question suivante ou fin du texte)
             if i + 1 < len(questions_triees):
                 question_suivante = questions_triees[i + 1]
-                pattern_suivant = re.escape(question_suivante).replace(r'\ ', r'\s*')
+                pattern_suivant = _pattern_question(question_suivante)
                 match_suivant = re.search(pattern_suivant, texte_copie[debut:], re.IGNORECASE)
                 if match_suivant:
                     fin = debut + match_suivant.start()
@@ -131,23 +117,25 @@ def _decouper_questions_regex(texte_copie: str, bareme: dict) -> dict:
             else:
                 reponses[question] = texte_copie[debut:].strip()
         else:
-            reponses[question] = "AUCUNE RÉPONSE FOURNIE."
+            reponses[question] = REPONSE_ABSENTE
     
     return reponses
 
 
-def decouper_questions_avec_ia(texte_copie: str, bareme: dict) -> dict:
-    """Découpe les réponses par question avec IA + fallback regex."""
-    
-    if not bareme or len(bareme) == 0:
-        print("    ⚠️ Barème vide, impossible de découper")
-        return {}
-    
-    liste_questions = "\n".join([f"- {q} ({pts} pts)" for q, pts in bareme.items()])
-    
-    # TENTATIVE 1 : IA
-    prompt = f"""
-Découpe la copie en associant chaque partie à la bonne question.
+def _question_en_cours(texte_copie: str, position: int, bareme: dict):
+    """Dernière question annoncée avant `position` (réponse à cheval sur deux morceaux)"""
+    en_cours, derniere_position = None, -1
+    for question in bareme:
+        for match in re.finditer(_pattern_question(question) + r'(?!\d)', texte_copie[:position], re.IGNORECASE):
+            if match.start() > derniere_position:
+                en_cours, derniere_position = question, match.start()
+    return en_cours
+
+
+def _construire_prompt_decoupage(morceau: str, liste_questions: str, partie: str = "", en_cours=None) -> str:
+    """Prompt de découpage d'une copie (ou d'une partie de copie)."""
+    if not partie:
+        return f"""Découpe la copie en associant chaque partie à la bonne question.
 
 QUESTIONS ATTENDUES :
 {liste_questions}
@@ -155,38 +143,88 @@ QUESTIONS ATTENDUES :
 ⚠️ UTILISE UNIQUEMENT CES CLÉS (pas d'invention)
 
 COPIE :
-{texte_copie[:1500]}...
+{morceau}
 
 SORTIE JSON :
-{{
-  "Exercice 1": "<texte réponse>",
-  "Exercice 2": "<texte réponse>"
-}}
+{{"Exercice 1": "<texte réponse>", "Exercice 2": "<texte réponse>"}}
 
-Si question absente : "AUCUNE RÉPONSE FOURNIE."
-"""
+Si question absente : "{REPONSE_ABSENTE}\""""
+
+    suite = f'\nLe début de cette partie continue la réponse à "{en_cours}".' if en_cours else ""
+    return f"""Découpe cette PARTIE {partie} d'une copie en associant chaque passage à la bonne question.
+Recopie mot pour mot le texte présent dans CETTE partie seulement : une réponse peut
+commencer dans la partie précédente ou continuer dans la suivante.{suite}
+
+QUESTIONS ATTENDUES :
+{liste_questions}
+
+⚠️ UTILISE UNIQUEMENT CES CLÉS (pas d'invention)
+
+COPIE (partie {partie}) :
+{morceau}
+
+SORTIE JSON :
+{{"Exercice 1": "<texte réponse>", "Exercice 2": "<texte réponse>"}}
+
+Si question absente de cette partie : \"\""""
+
+
+def _valider_decoupage(data, bareme: dict) -> dict:
+    """Garde les clés du barème, segments en texte"""
+    if not isinstance(data, dict):
+        raise ValueError("Réponse invalide")
     
-    try:
-        response = call_groq(prompt)
+    invalid_keys = [k for k in data.keys() if k not in bareme.keys()]
+    if invalid_keys:
+        print(f"    ⚠️ Clés invalides : {invalid_keys}")
+    
+    return {k: v if isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+            for k, v in data.items() if k in bareme.keys()}
+
+
+def decouper_questions_avec_ia(texte_copie: str, bareme: dict) -> dict:
+    """
+    Découpe les réponses par question avec IA + fallback regex.
+    
+    La copie est envoyée EN ENTIER : au-delà du budget de tokens, elle est
+    découpée en morceaux qui se chevauchent, découpés en parallèle, puis
+    les segments de chaque question sont recollés dans l'ordre.
+    """
+    
+    if not bareme or len(bareme) == 0:
+        print("    ⚠️ Barème vide, impossible de découper")
+        return {}
+    
+    liste_questions = "\n".join([f"- {q} ({pts} pts)" for q, pts in bareme.items()])
+    texte = compacter(texte_copie)
+    morceaux = decouper_en_morceaux(texte)
+    
+    def decouper_morceau(i, morceau):
+        position, extrait = morceau
+        partie = f"{i + 1}/{len(morceaux)}" if len(morceaux) > 1 else ""
+        prompt = _construire_prompt_decoupage(
+            extrait, liste_questions, partie, _question_en_cours(texte, position, bareme) if partie else None
+        )
+        with etape("decoupage_questions"):
+            response = call_groq(prompt)
         json_text = response.strip().replace("```json", "").replace("```", "")
-        data = json.loads(json_text)
-        
-        # Validation : vérifier les clés
-        invalid_keys = [k for k in data.keys() if k not in bareme.keys()]
-        if invalid_keys:
-            print(f"    ⚠️ Clés invalides : {invalid_keys}")
-            data = {k: v for k, v in data.items() if k in bareme.keys()}
+        return _valider_decoupage(json.loads(json_text), bareme)
+    
+    # TENTATIVE 1 : IA (map sur les morceaux, puis fusion)
+    try:
+        segments = traiter_morceaux(morceaux, decouper_morceau)
         
-        # Ajouter les questions manquantes
+        data = {}
         for question in bareme.keys():
-            if question not in data:
-                data[question] = "AUCUNE RÉPONSE FOURNIE."
-        
-        tokens_utilises = len(prompt.split()) + len(response.split())
-        TOKENS_UTILISES["decoupage_questions"] += tokens_utilises
-        TOKENS_UTILISES["total"] += tokens_utilises
+            reponse = ""
+            for segments_morceau in segments:
+                segment = segments_morceau.get(question, "")
+                if segment.strip() and segment.strip() != REPONSE_ABSENTE:
+                    reponse = fusionner_segments(reponse, segment)
+            data[question] = reponse or REPONSE_ABSENTE
         
-        print(f"    🤖 IA : {len(data)} question(s) détectée(s)")
+        print(f"    🤖 IA : {sum(r != REPONSE_ABSENTE for r in data.values())} question(s) détectée(s)"
+              + (f" sur {len(morceaux)} morceaux" if len(morceaux) > 1 else ""))
         return data
     
     except Exception as e:
@@ -203,28 +241,7 @@ Si question absente : "AUCUNE RÉPONSE FOURNIE."
     # TENTATIVE 3 : Tout mettre dans la première question (dernière chance)
     print(f"    ⚠️ Fallback : tout dans la première question")
     premiere_question = list(bareme.keys())[0]
-    reponses_default = {q: "AUCUNE RÉPONSE FOURNIE." for q in bareme.keys()}
+    reponses_default = {q: REPONSE_ABSENTE for q in bareme.keys()}
     reponses_default[premiere_question] = texte_copie
     
     return reponses_default
-
-
-def print_tokens_summary():
-    """Affiche le résumé de l'usage des tokens."""
-    total = TOKENS_UTILISES['total']
-    
-    if total == 0:
-        print("\n📊 Aucun token utilisé")
-        return
-    
-    print("\n" + "="*60)
-    print("📊 RÉSUMÉ DE L'USAGE DES TOKENS GROQ")
-    print("="*60)
-    print(f"  🔍 Extraction nom/classe : {TOKENS_UTILISES['extraction_nom']:>8,} tokens ({TOKENS_UTILISES['extraction_nom']/total*100:>5.1f}%)")
-    print(f"  ✂️  Découpage questions  : {TOKENS_UTILISES['decoupage_questions']:>8,} tokens ({TOKENS_UTILISES['decoupage_questions']/total*100:>5.1f}%)")
-    print(f"  📋 Extraction barème     : {TOKENS_UTILISES['bareme']:>8,} tokens ({TOKENS_UTILISES['bareme']/total*100:>5.1f}%)")
-    print(f"  ✅ Correction copies     : {TOKENS_UTILISES['correction']:>8,} tokens ({TOKENS_UTILISES['correction']/total*100:>5.1f}%)")
-    print(f"  {'─'*58}")
-    print(f"  📈 TOTAL                 : {total:>8,} tokens")
-    print(f"  💰 Coût estimé Groq      : ${total * 0.0000001:.6f}")
-    print("="*60 + "\n")
\ No newline at end of file
@@ -6,12 +6,17 @@ import json
 import re
 from app.config import AI_PROVIDER
 from app.services.groq_client import call_gemini, call_groq
+from app.services.metrics_service import etape
+from app.services.prompt_service import compacter, decouper_en_morceaux, traiter_morceaux
 
 
-def _get_tokens_dict():
-    """Récupère le dictionnaire de tokens depuis ai_extract_service"""
-    from app.services import ai_extract_service
-    return ai_extract_service.TOKENS_UTILISES
+def _appeler_ia(prompt: str) -> str:
+    """Envoie le prompt au fournisseur configuré (AI_PROVIDER)."""
+    if AI_PROVIDER == "gemini":
+        return call_gemini(prompt)
+    elif AI_PROVIDER == "groq":
+        return call_groq(prompt)
+    raise ValueError(f"❌ Fournisseur d'IA non reconnu : {AI_PROVIDER}")
 
 
 # ====================================
@@ -48,81 +53,47 @@ def _extraire_bareme_regex(texte_epreuve: str) -> dict:
     return bareme
 
 
-def _construire_prompt_bareme(texte_epreuve: str) -> str:
-    """Construit le prompt pour extraire le barème."""
-    return f"""
-Tu es un expert en analyse de sujets d'examen.
+def _construire_prompt_bareme(texte_epreuve: str, partie: str = "") -> str:
+    """Construit le prompt pour extraire le barème (d'une partie du sujet si `partie`)."""
+    document = f"DOCUMENT (partie {partie})" if partie else "DOCUMENT"
+    return f"""Tu es un expert en analyse de sujets d'examen.
 
 MISSION : Extraire UNIQUEMENT les questions/exercices du SUJET (pas de la correction).
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📄 DOCUMENT (premiers 1500 caractères)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{document} :
+{texte_epreuve}
 
-{texte_epreuve[:1500]}
+INSTRUCTIONS :
+1. CHERCHE les patterns : "Exercice 1 (5 points)", "Question 1 (3 points)", "TD N°1: Question 1 (4 points)"
+2. IGNORE tout après : "Solution correcte", "Correction -", "Barème détaillé"
+3. Si tu ne trouves RIEN : {{}}
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🔍 INSTRUCTIONS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-1. **CHERCHE les patterns suivants :**
-   - "Exercice 1 (5 points)"
-   - "Question 1 (3 points)"
-   - "TD N°1: Question 1 (4 points)"
-
-2. **IGNORE tout après :**
-   - "Solution correcte"
-   - "Correction -"
-   - "Barème détaillé"
-
-3. **Si tu ne trouves RIEN :**
-   - Retourne un objet vide : {{}}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📤 FORMAT DE SORTIE (JSON STRICT)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{{
-  "Exercice 1": 5,
-  "Exercice 2": 8
-}}
-
-OU
-
-{{
-  "Question 1": 3,
-  "Question 2": 4
-}}
-
-Si rien trouvé : {{}}
-"""
+SORTIE JSON : {{"Exercice 1": 5, "Exercice 2": 8}} ou {{"Question 1": 3, "Question 2": 4}}"""
 
 
 def extraire_bareme_de_epreuve(texte_epreuve: str) -> dict:
     """Extrait le barème avec IA + fallback regex."""
     print("🤖 Extraction du barème...")
     
-    # TENTATIVE 1 : Extraction avec IA
-    try:
-        prompt = _construire_prompt_bareme(texte_epreuve)
+    morceaux = decouper_en_morceaux(compacter(texte_epreuve))
+    
+    def extraire_morceau(i, morceau):
+        partie = f"{i + 1}/{len(morceaux)}" if len(morceaux) > 1 else ""
+        with etape("bareme"):
+            ia_response_text = _appeler_ia(_construire_prompt_bareme(morceau[1], partie))
         
-        if AI_PROVIDER == "gemini":
-            ia_response_text = call_gemini(prompt)
-        elif AI_PROVIDER == "groq":
-            ia_response_text = call_groq(prompt)
-        else:
-            raise ValueError(f"❌ Fournisseur d'IA non reconnu : {AI_PROVIDER}")
-
         json_text = ia_response_text.strip().replace("```json", "").replace("```", "")
-        bareme = json.loads(json_text)
-
-        if not isinstance(bareme, dict):
+        resultat = json.loads(json_text)
+        if not isinstance(resultat, dict):
             raise ValueError("Réponse invalide")
-
-        tokens = len(prompt.split()) + len(ia_response_text.split())
-        tokens_dict = _get_tokens_dict()
-        tokens_dict["bareme"] += tokens
-        tokens_dict["total"] += tokens
+        return resultat
+    
+    # TENTATIVE 1 : Extraction avec IA (sujet entier, par morceaux en parallèle si long)
+    try:
+        bareme = {}
+        for resultat in traiter_morceaux(morceaux, extraire_morceau):
+            for question, points in resultat.items():
+                bareme.setdefault(question, points)
 
         if len(bareme) > 0:
             print(f"✅ Barème extrait avec IA : {bareme}")
@@ -169,52 +140,32 @@ def extraire_bareme_de_epreuve(texte_epreuve: str) -> dict:
 # 2. PROMPT DE CORRECTION AMÉLIORÉ
 # ====================================
 
-def _construire_prompt_correction(enonce_question, reponse_etudiant, correction_prof, points_max, numero_question):
-    """Construit le prompt de correction avec feedbacks détaillés."""
-    return f"""
-Tu es un professeur expert en correction de copies.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📝 {numero_question} ({points_max} points)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+CONSIGNES_CORRECTION = """## CONSIGNES
+TOLÉRANCE : variantes de formulation (sens correct), fautes d'orthographe,
+erreurs OCR ("NIM" = "N:M", "Maticule" = "Matricule"), différences de notation ("1:N" = "1..N")
+VALORISE : compréhension du concept, raisonnement valide
+RÈGLE D'OR : si l'étudiant a compris le concept principal → au moins 50% des points"""
 
-**Énoncé :** {enonce_question}
 
-**Correction attendue :** {correction_prof}
-
-**Réponse étudiant :** {reponse_etudiant}
+def _construire_prompt_correction(enonce_question, reponse_etudiant, correction_prof, points_max, numero_question):
+    """Construit le prompt de correction avec feedbacks détaillés."""
+    return f"""Tu es un professeur expert en correction de copies.
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🎯 BARÈME
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+## {numero_question} ({points_max} points)
+Énoncé : {enonce_question}
+Correction attendue : {correction_prof}
+Réponse étudiant : {reponse_etudiant}
 
+## BARÈME
 - {points_max} pts : Réponse complète et correcte
 - {points_max * 0.75:.1f} pts : Correcte avec petites erreurs
 - {points_max * 0.5:.1f} pts : Partiellement correcte
 - {points_max * 0.25:.1f} pts : Très incomplète
 - 0 pt : Incorrecte ou absente
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-✅ CONSIGNES
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-**TOLÉRANCE :**
-- Variantes de formulation (sens correct)
-- Fautes d'orthographe
-- Erreurs OCR ("NIM" = "N:M", "Maticule" = "Matricule")
-- Différences de notation ("1:N" = "1..N")
-
-**VALORISE :**
-- Compréhension du concept
-- Raisonnement valide
-
-**RÈGLE D'OR :**
-Si l'étudiant a compris le concept principal → au moins 50% des points
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📤 FORMAT DE SORTIE (JSON)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{CONSIGNES_CORRECTION}
 
+## SORTIE JSON
 {{
   "points_obtenus": <nombre entre 0 et {points_max}>,
   "categorie": "REUSSIE" | "PARTIELLE" | "RATEE",
@@ -226,11 +177,21 @@ Si l'étudiant a compris le concept principal → au moins 50% des points
   "erreurs_detectees": ["<erreur 1>", "<erreur 2>"]
 }}
 
-**Exemples de conseils :**
+Exemples de conseils :
 - "Révisez les cardinalités : 1:N (un à plusieurs), N:M (plusieurs à plusieurs)"
 - "Entraînez-vous avec CREATE TABLE : spécifiez PRIMARY KEY pour la clé"
-- "Pour compter : utilisez COUNT() avec GROUP BY"
-"""
+- "Pour compter : utilisez COUNT() avec GROUP BY\""""
+
+
+def _completer_resultat(result: dict) -> dict:
+    """Validation et valeurs par défaut d'un résultat de correction."""
+    result.setdefault("points_obtenus", 0)
+    result.setdefault("categorie", "ERREUR")
+    result.setdefault("feedback_detaille", "Feedback non disponible")
+    result.setdefault("elements_corrects", [])
+    result.setdefault("elements_manquants", [])
+    result.setdefault("erreurs_detectees", [])
+    return result
 
 
 def corriger_question(enonce_question: str, reponse_etudiant: str, correction_prof: str, 
@@ -251,34 +212,13 @@ def corriger_question(enonce_question: str, reponse_etudiant: str, correction_pr
         prompt = _construire_prompt_correction(enonce_question, reponse_etudiant, correction_prof, 
                                                points_max, numero_question)
         
-        if AI_PROVIDER == "gemini":
-            ia_response_text = call_gemini(prompt)
-        elif AI_PROVIDER == "groq":
-            ia_response_text = call_groq(prompt)
-        else:
-            raise ValueError(f"❌ Fournisseur d'IA non reconnu : {AI_PROVIDER}")
+        with etape("correction"):
+            ia_response_text = _appeler_ia(prompt)
 
         json_text = ia_response_text.strip().replace("```json", "").replace("```", "")
         result = json.loads(json_text)
         
-        # Validation et valeurs par défaut
-        if "points_obtenus" not in result:
-            result["points_obtenus"] = 0
-        if "categorie" not in result:
-            result["categorie"] = "ERREUR"
-        if "feedback_detaille" not in result:
-            result["feedback_detaille"] = "Feedback non disponible"
-        if "elements_corrects" not in result:
-            result["elements_corrects"] = []
-        if "elements_manquants" not in result:
-            result["elements_manquants"] = []
-        if "erreurs_detectees" not in result:
-            result["erreurs_detectees"] = []
-        
-        tokens = len(prompt.split()) + len(ia_response_text.split())
-        tokens_dict = _get_tokens_dict()
-        tokens_dict["correction"] += tokens
-        tokens_dict["total"] += tokens
+        _completer_resultat(result)
         
         return result
         
@@ -287,4 +227,123 @@ def corriger_question(enonce_question: str, reponse_etudiant: str, correction_pr
         return error_response
     except Exception as e:
         print(f"⚠️ Erreur correction : {e}")
-        return error_response
\ No newline at end of file
+        return error_response
+
+
+# ====================================
+# 3. CORRECTION PAR LOT (UNE REQUÊTE PAR COPIE)
+# ====================================
+
+CATEGORIES_VALIDES = {"REUSSIE", "PARTIELLE", "RATEE"}
+
+
+def _construire_prompt_correction_lot(questions: dict) -> str:
+    """
+    Construit UN prompt pour toutes les questions d'une copie.
+    
+    Args:
+        questions: {numero_question: {"points_max", "correction_prof", "reponse_etudiant"}}
+    """
+    blocs = "\n\n".join(
+        f"""### {numero} ({q['points_max']} points)
+Correction attendue : {q['correction_prof']}
+Réponse étudiant : {q['reponse_etudiant']}"""
+        for numero, q in questions.items()
+    )
+    cles = ", ".join(f'"{numero}"' for numero in questions)
+
+    return f"""Tu es un professeur expert en correction de copies.
+Corrige CHAQUE question ci-dessous indépendamment.
+
+## QUESTIONS DE LA COPIE
+{blocs}
+
+## BARÈME (pour chaque question, sur ses points max)
+- 100% : Réponse complète et correcte
+- 75% : Correcte avec petites erreurs
+- 50% : Partiellement correcte
+- 25% : Très incomplète
+- 0 pt : Incorrecte ou absente
+
+{CONSIGNES_CORRECTION}
+
+## SORTIE JSON
+Un objet avec EXACTEMENT ces clés : {cles}
+Chaque valeur :
+{{
+  "points_obtenus": <nombre entre 0 et les points max de la question>,
+  "categorie": "REUSSIE" | "PARTIELLE" | "RATEE",
+  "annotation_courte": "<feedback en 10-15 mots>",
+  "feedback_detaille": "<ce qui est correct, ce qui manque, les erreurs>",
+  "conseil_revision": "<conseil concret avec ressources>",
+  "elements_corrects": ["<élément 1>"],
+  "elements_manquants": ["<élément 1>"],
+  "erreurs_detectees": ["<erreur 1>"]
+}}"""
+
+
+def _valider_resultat_lot(result, points_max: float):
+    """Retourne le résultat complété, ou None s'il est mal formé."""
+    if not isinstance(result, dict):
+        return None
+    
+    try:
+        points = float(result.get("points_obtenus"))
+    except (TypeError, ValueError):
+        return None
+    
+    if not 0 <= points <= points_max or result.get("categorie") not in CATEGORIES_VALIDES:
+        return None
+    
+    result["points_obtenus"] = points
+    return _completer_resultat(result)
+
+
+def corriger_copie(questions: dict) -> dict:
+    """
+    Corrige toutes les questions d'une copie en UNE requête.
+    
+    Les questions absentes ou mal formées dans la réponse sont
+    recorrigées une par une avec corriger_question.
+    
+    Args:
+        questions: {numero_question: {"points_max", "correction_prof", "reponse_etudiant"}}
+    
+    Returns:
+        {numero_question: résultat de correction}
+    """
+    resultats = {}
+    
+    try:
+        prompt = _construire_prompt_correction_lot(questions)
+        with etape("correction"):
+            ia_response_text = _appeler_ia(prompt)
+        
+        json_text = ia_response_text.strip().replace("```json", "").replace("```", "")
+        data = json.loads(json_text)
+        if not isinstance(data, dict):
+            raise ValueError("Réponse invalide")
+        
+        for numero, q in questions.items():
+            result = _valider_resultat_lot(data.get(numero), q["points_max"])
+            if result is not None:
+                resultats[numero] = result
+    
+    except Exception as e:
+        print(f"  ⚠️ Correction par lot impossible : {e}")
+    
+    a_reprendre = [numero for numero in questions if numero not in resultats]
+    print(f"  🤖 Lot : {len(resultats)}/{len(questions)} question(s) en 1 requête"
+          + (f", {len(a_reprendre)} reprise(s) une par une" if a_reprendre else ""))
+    
+    for numero in a_reprendre:
+        q = questions[numero]
+        resultats[numero] = corriger_question(
+            f"Évaluation de la {numero}",
+            q["reponse_etudiant"],
+            q["correction_prof"],
+            q["points_max"],
+            numero
+        )
+    
+    return resultats
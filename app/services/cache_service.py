@@ -0,0 +1,178 @@
+"""
+Cache disque adressé par contenu
+- Clés = hash SHA-256 (fichier, paramètres, moteur...)
+- Éviction LRU quand la taille maximale est dépassée
+- Compteurs hits / misses / évictions
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+# ====================================
+# HASH DE CONTENU
+# ====================================
+
+def hash_fichier(file_path: str) -> str:
+    """Hash SHA-256 du contenu d'un fichier (lu par blocs)"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloc in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+def hash_contenu(contenu: bytes) -> str:
+    """Hash SHA-256 d'un contenu en mémoire"""
+    return hashlib.sha256(contenu).hexdigest()
+
+
+def construire_cle(*parties) -> str:
+    """Construit une clé de cache stable à partir de plusieurs éléments"""
+    brut = json.dumps(parties, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(brut.encode("utf-8")).hexdigest()
+
+
+# ====================================
+# CACHE DISQUE
+# ====================================
+
+class DiskCache:
+    """
+    Cache clé → valeur JSON persistant sur disque.
+
+    Chaque entrée est un fichier <dossier>/<2 premiers car.>/<clé>.json.
+    La date de modification sert d'horodatage LRU : elle est rafraîchie
+    à chaque lecture et les entrées les plus anciennes sont supprimées
+    quand la taille totale dépasse max_bytes.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, ttl=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "ecritures": 0}
+        self._taille = None
+
+    def _chemin(self, cle: str) -> str:
+        return os.path.join(self.folder, cle[:2], f"{cle}.json")
+
+    def get(self, cle: str):
+        """Retourne la valeur en cache ou None"""
+        chemin = self._chemin(cle)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(chemin) > self.ttl:
+                self._supprimer(chemin)
+                raise FileNotFoundError(chemin)
+
+            with open(chemin, 'r', encoding='utf-8') as f:
+                valeur = json.load(f)
+
+            # Rafraîchir l'horodatage LRU (sauf si TTL : l'âge compte depuis l'écriture)
+            if self.ttl is None:
+                os.utime(chemin, None)
+
+            with self._lock:
+                self._stats["hits"] += 1
+            return valeur
+
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+    def set(self, cle: str, valeur) -> None:
+        """Écrit une valeur (écriture atomique puis éviction si besoin)"""
+        chemin = self._chemin(cle)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+
+        contenu = json.dumps(valeur, ensure_ascii=False).encode("utf-8")
+        tmp = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(contenu)
+        # Entrée remplacée : sa taille ne compte plus
+        try:
+            taille_remplacee = os.path.getsize(chemin)
+        except OSError:
+            taille_remplacee = 0
+        os.replace(tmp, chemin)
+
+        with self._lock:
+            self._stats["ecritures"] += 1
+            if self._taille is None:
+                self._taille = self._calculer_taille()
+            else:
+                self._taille += len(contenu) - taille_remplacee
+
+            if self._taille > self.max_bytes:
+                self._evincer()
+
+    def clear(self) -> int:
+        """Vide le cache, retourne le nombre d'entrées supprimées"""
+        with self._lock:
+            entrees = self._lister_entrees()
+            for chemin, _, _ in entrees:
+                self._supprimer(chemin)
+            self._taille = 0
+            return len(entrees)
+
+    def stats(self) -> dict:
+        """Compteurs d'usage du cache"""
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            if self._taille is None:
+                self._taille = self._calculer_taille()
+            return {
+                **self._stats,
+                "taux_hit": round(self._stats["hits"] / total, 3) if total else 0.0,
+                "taille_mo": round(self._taille / (1024 * 1024), 2),
+                "taille_max_mo": round(self.max_bytes / (1024 * 1024), 2)
+            }
+
+    def _lister_entrees(self) -> list:
+        """Liste (chemin, taille, mtime) de toutes les entrées"""
+        entrees = []
+        if not os.path.isdir(self.folder):
+            return entrees
+
+        for racine, _, fichiers in os.walk(self.folder):
+            for nom in fichiers:
+                if not nom.endswith(".json"):
+                    continue
+                chemin = os.path.join(racine, nom)
+                try:
+                    st = os.stat(chemin)
+                    entrees.append((chemin, st.st_size, st.st_mtime))
+                except OSError:
+                    pass
+        return entrees
+
+    def _calculer_taille(self) -> int:
+        return sum(taille for _, taille, _ in self._lister_entrees())
+
+    def _evincer(self) -> None:
+        """Supprime les entrées les moins récemment utilisées (appelé sous verrou)"""
+        # Re-scanner : d'autres processus peuvent partager le dossier
+        entrees = sorted(self._lister_entrees(), key=lambda e: e[2])
+        taille = sum(e[1] for e in entrees)
+
+        # Descendre à 90% pour ne pas évincer à chaque écriture
+        cible = self.max_bytes * 0.9
+        for chemin, taille_entree, _ in entrees:
+            if taille <= cible:
+                break
+            self._supprimer(chemin)
+            taille -= taille_entree
+            self._stats["evictions"] += 1
+
+        self._taille = taille
+
+    @staticmethod
+    def _supprimer(chemin: str) -> None:
+        try:
+            os.remove(chemin)
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+"""
+Points de reprise des corrections
+- Un journal JSONL par session, en ajout seul, fsync à chaque écriture :
+  un résultat écrit survit à un arrêt brutal du serveur
+- Textes OCR, barème, correction découpée, réponses découpées par copie et
+  résultat de chaque (copie, question) enregistrés dès qu'ils sont produits
+- Les clés contiennent le hash des entrées (document, texte de la copie,
+  question, barème...) : une entrée obsolète n'est jamais relue
+- Relancer une session ne refait que le travail manquant
+"""
+import os
+import json
+import threading
+
+from app.config import CHECKPOINT_ENABLED, CHECKPOINT_FOLDER
+from app.services.cache_service import construire_cle
+
+
+class JournalSession:
+    """
+    Journal de reprise d'une session (<dossier>/<session_id>.jsonl).
+
+    Une ligne = {"type", "cle", "valeur"} ; la dernière écriture d'une
+    clé l'emporte. Une ligne tronquée par un crash est ignorée.
+    """
+
+    def __init__(self, session_id: str, folder: str = CHECKPOINT_FOLDER, actif: bool = CHECKPOINT_ENABLED):
+        self.session_id = session_id
+        self.chemin = os.path.join(folder, f"{session_id}.jsonl")
+        self.actif = actif
+        self._verrou = threading.Lock()
+        self._entrees = {}
+        self.stats = {"relues": 0, "ecrites": 0}
+        # Dernière ligne tronquée : la terminer avant d'ajouter la suivante
+        self._ligne_ouverte = False
+        if actif:
+            self._charger()
+
+    def _charger(self) -> None:
+        try:
+            with open(self.chemin, 'r', encoding='utf-8') as f:
+                for ligne in f:
+                    self._ligne_ouverte = not ligne.endswith("\n")
+                    try:
+                        entree = json.loads(ligne)
+                        self._entrees[(entree["type"], entree["cle"])] = entree["valeur"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # ligne incomplète (arrêt pendant l'écriture)
+        except OSError:
+            pass
+
+        if self._entrees:
+            print(f"  💾 Journal de reprise : {len(self._entrees)} entrée(s) déjà enregistrée(s)")
+
+    @staticmethod
+    def cle(*parties) -> str:
+        return construire_cle(*parties)
+
+    def get(self, type_entree: str, cle: str):
+        """Valeur enregistrée, ou None"""
+        if not self.actif:
+            return None
+        with self._verrou:
+            valeur = self._entrees.get((type_entree, cle))
+            if valeur is not None:
+                self.stats["relues"] += 1
+            return valeur
+
+    def ecrire(self, type_entree: str, cle: str, valeur) -> None:
+        """Ajoute une entrée et la force sur disque (flush + fsync)"""
+        if not self.actif:
+            return
+        ligne = json.dumps({"type": type_entree, "cle": cle, "valeur": valeur}, ensure_ascii=False) + "\n"
+
+        with self._verrou:
+            nouveau = not os.path.exists(self.chemin)
+            if nouveau:
+                os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+            with open(self.chemin, 'a', encoding='utf-8') as f:
+                if self._ligne_ouverte:
+                    f.write("\n")
+                    self._ligne_ouverte = False
+                f.write(ligne)
+                f.flush()
+                os.fsync(f.fileno())
+            if nouveau:
+                _fsync_dossier(os.path.dirname(self.chemin) or ".")
+            self._entrees[(type_entree, cle)] = valeur
+            self.stats["ecrites"] += 1
+
+    def effacer(self) -> None:
+        with self._verrou:
+            self._entrees.clear()
+            try:
+                os.remove(self.chemin)
+            except OSError:
+                pass
+
+
+def _fsync_dossier(dossier: str) -> None:
+    """Rend durable la création du fichier journal (entrée de répertoire)"""
+    try:
+        fd = os.open(dossier, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def supprimer_journal(session_id: str) -> None:
+    JournalSession(session_id, actif=False).effacer()
@@ -5,34 +5,605 @@ Version ultra-robuste - Novembre 2025
 import re
 import traceback
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import copy
+import threading
 
-from app.services.ai_service import corriger_question, extraire_bareme_de_epreuve
-from app.services.ocr_hybrid_service import extract_text_from_pdf
-from app.services.ai_extract_service import (
-    decouper_questions_avec_ia, 
-    print_tokens_summary, 
-    reset_tokens_stats,
-    TOKENS_UTILISES
-)
-from app.database import sessions
+from app.config import CORRECTION_BATCH_ENABLED, CORRECTION_REPONSE_MIN_CARACTERES, CORRECTION_CONCURRENCE
+from app.services.ai_service import corriger_question, corriger_copie, extraire_bareme_de_epreuve
+from app.services.ocr_hybrid_service import extract_text_from_pdf_with_stats
+from app.services.ai_extract_service import decouper_questions_avec_ia, REPONSE_ABSENTE
+from app.services.groq_client import get_llm_cache_stats
+from app.services.metrics_service import suivre_session, get_metriques, charger_metriques, print_resume_metriques
+from app.services.template_service import modeles_examen, modele_pour_session
+from app.services.scheduler_service import Ordonnanceur
+from app.services.checkpoint_service import JournalSession
+from app.database import depot_sessions
 
 
-def lancer_correction_automatique(session_id: str):
+CORRECTION_ABSENTE = "Correction de référence non trouvée."
+
+
+# ====================================
+# SUIVI ET ANNULATION
+# ====================================
+
+class CorrectionAnnulee(Exception):
+    """La correction a été annulée en cours de route"""
+
+
+class SuiviCorrection:
+    """
+    Avancement et annulation d'une correction.
+    
+    Implémentation neutre (correction synchrone) ; les tâches de fond
+    (job_service) la spécialisent pour exposer la progression.
+    """
+    
+    def annulee(self) -> bool:
+        return False
+    
+    def etape(self, nom: str) -> None:
+        """Début d'une étape : lève CorrectionAnnulee si l'annulation est demandée"""
+        if self.annulee():
+            raise CorrectionAnnulee(f"Correction annulée avant l'étape {nom}")
+    
+    def debut_copies(self, copies: list, nb_questions: int) -> None:
+        pass
+    
+    def questions_terminees(self, idx: int, nombre: int) -> None:
+        pass
+    
+    def copie_terminee(self, idx: int, resultat: dict) -> None:
+        pass
+    
+    def detient_session(self) -> bool:
+        """La correction a toujours le droit d'écrire dans la session"""
+        return True
+
+
+# ====================================
+# PRÉ-TRI DES RÉPONSES (SANS APPEL IA)
+# ====================================
+
+def _normaliser_reponse(reponse: str) -> str:
+    """Forme canonique d'une réponse : casse et espacement ignorés"""
+    return re.sub(r"\s+", " ", reponse or "").strip().lower()
+
+
+def _est_reponse_vide(reponse: str) -> bool:
+    """Réponse absente, ou bruit OCR sans contenu (cases vides, traits...)"""
+    if _normaliser_reponse(reponse) == REPONSE_ABSENTE.lower():
+        return True
+    return len(re.findall(r"\w", reponse or "")) < CORRECTION_REPONSE_MIN_CARACTERES
+
+
+def _resultat_reponse_vide() -> dict:
+    """Correction déterministe d'une réponse vide"""
+    return {
+        "points_obtenus": 0.0,
+        "categorie": "RATEE",
+        "annotation_courte": "Aucune réponse fournie",
+        "feedback_detaille": "Aucune réponse exploitable n'a été trouvée pour cette question.",
+        "conseil_revision": "Traitez chaque question, même partiellement : une ébauche peut rapporter des points.",
+        "elements_corrects": [],
+        "elements_manquants": ["Réponse absente"],
+        "erreurs_detectees": []
+    }
+
+
+def _trier_reponses(bareme: dict, reponses: dict, corrections: dict,
+                    memo: dict, appels_evites: dict, reprises: dict = None) -> tuple:
+    """
+    Sépare les questions d'une copie avant correction.
+    
+    - Réponse vide : 0 point, sans appel IA
+    - Question déjà corrigée lors d'une exécution précédente (journal de reprise)
+    - (question, réponse normalisée) déjà corrigée dans la session : résultat réutilisé
+    
+    Returns:
+        (résultats déjà connus, questions à corriger par l'IA)
+    """
+    connus = {}
+    a_corriger = {}
+    
+    for num_question, points_max in bareme.items():
+        reponse = reponses.get(num_question, REPONSE_ABSENTE)
+        
+        if _est_reponse_vide(reponse):
+            connus[num_question] = _resultat_reponse_vide()
+            appels_evites["reponses_vides"] += 1
+            continue
+        
+        if reprises and num_question in reprises:
+            connus[num_question] = copy.deepcopy(reprises[num_question])
+            memo.setdefault((num_question, _normaliser_reponse(reponse)), copy.deepcopy(reprises[num_question]))
+            appels_evites["reprises"] += 1
+            continue
+        
+        deja_corrigee = memo.get((num_question, _normaliser_reponse(reponse)))
+        if deja_corrigee is not None:
+            connus[num_question] = copy.deepcopy(deja_corrigee)
+            appels_evites["doublons"] += 1
+            continue
+        
+        a_corriger[num_question] = {
+            "points_max": float(points_max),
+            "reponse_etudiant": reponse,
+            "correction_prof": corrections.get(num_question, CORRECTION_ABSENTE)
+        }
+    
+    return connus, a_corriger
+
+
+# ====================================
+# PRÉPARATION DE L'EXAMEN (BARÈME + CORRECTION)
+# ====================================
+
+def _reprendre_ou_produire(journal: JournalSession, type_entree: str, cle: str, produire,
+                           annoncer: bool = True):
+    """Valeur du journal de reprise, sinon produite puis enregistrée aussitôt"""
+    valeur = journal.get(type_entree, cle)
+    if valeur is not None:
+        if annoncer:
+            print(f"  💾 Reprise : {type_entree} relu(e) dans le journal")
+        return valeur
+    
+    valeur = produire()
+    if valeur:
+        journal.ecrire(type_entree, cle, valeur)
+    return valeur
+
+
+def _extraire_document(session: dict, document: str) -> str:
+    """OCR de l'épreuve ou de la correction ; statistiques gardées dans session["ocr"]"""
+    texte, stats = extract_text_from_pdf_with_stats(session[document]["path"], force_mode=None)
+    session.setdefault("ocr", {})[document] = stats
+    return texte
+
+
+def _preparer_examen(session: dict, suivi: SuiviCorrection, journal: JournalSession) -> tuple:
+    """
+    Étapes 1 à 4 : barème et correction de référence découpée par question.
+    
+    Textes OCR, barème brut et correction découpée sont journalisés dès
+    qu'ils sont produits (clés : hash des documents).
+    
+    Returns:
+        (barème final, {question: correction du prof})
+    """
+    # ============================================================
+    # ÉTAPE 1 : EXTRAIRE LE TEXTE DE L'ÉPREUVE
+    # ============================================================
+    suivi.etape("epreuve")
+    print(f"\n{'='*70}")
+    print("📄 ÉTAPE 1/5 : Extraction de l'épreuve")
+    print(f"{'='*70}")
+    
+    hash_epreuve = session["epreuve"].get("hash") or session["epreuve"]["path"]
+    hash_correction = session["correction"].get("hash") or session["correction"]["path"]
+    
+    texte_epreuve = _reprendre_ou_produire(
+        journal, "texte_epreuve", journal.cle(hash_epreuve),
+        lambda: _extraire_document(session, "epreuve")
+    )
+    
+    if not texte_epreuve:
+        raise ValueError("Impossible d'extraire le texte de l'épreuve.")
+    
+    print(f"  ✅ Épreuve extraite : {len(texte_epreuve)} caractères")
+    
+    # ============================================================
+    # ÉTAPE 2 : EXTRACTION BARÈME + FILTRAGE INTELLIGENT V2
+    # ============================================================
+    suivi.etape("bareme")
+    print(f"\n{'='*70}")
+    print("🤖 ÉTAPE 2/5 : Extraction du barème avec filtrage intelligent V2")
+    print(f"{'='*70}")
+    
+    bareme_brut = _reprendre_ou_produire(
+        journal, "bareme", journal.cle(hash_epreuve),
+        lambda: extraire_bareme_de_epreuve(texte_epreuve)
+    )
+    
+    if not bareme_brut or len(bareme_brut) == 0:
+        raise ValueError("Impossible d'extraire un barème de l'épreuve.")
+    
+    print(f"  📊 Barème brut : {bareme_brut}")
+    
+    # ✅ FILTRAGE INTELLIGENT VERSION 2.0
+    print(f"\n🔍 Analyse du barème...")
+    
+    nb_exercices = sum(1 for k in bareme_brut.keys() if "Exercice" in k or "Exo" in k)
+    nb_questions = sum(1 for k in bareme_brut.keys() if "Question" in k and "Exercice" not in k)
+    
+    print(f"   📊 Détection : {nb_exercices} Exercice(s), {nb_questions} Question(s)")
+    
+    # Calculer le total
+    total_questions = len(bareme_brut)
+    total_points = sum(bareme_brut.values())
+    
+    print(f"   📊 Total : {total_questions} question(s), {total_points} points")
+    
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # LOGIQUE DE FILTRAGE INTELLIGENTE
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    
+    # CAS 1 : Total proche de 20 points (18-22) → Probablement correct
+    if 18 <= total_points <= 22:
+        print(f"   ✅ Total proche de 20 points → Barème probablement correct")
+        print(f"   ✅ Conservation de TOUT le barème")
+        bareme = bareme_brut
+    
+    # CAS 2 : Total proche de 10/15 points → Probablement correct
+    elif 8 <= total_points <= 16:
+        print(f"   ✅ Total {total_points} points → Barème court, probablement correct")
+        print(f"   ✅ Conservation de TOUT le barème")
+        bareme = bareme_brut
+    
+    # CAS 3 : Total anormalement élevé (>25 points) → Filtrage nécessaire
+    elif total_points > 25:
+        print(f"   ⚠️ Total anormalement élevé ({total_points} pts) → Filtrage nécessaire")
+    
+        # Si mélange Exercices + Questions
+        if nb_exercices > 0 and nb_questions > 0:
+            print(f"   🔧 Mélange détecté → Hypothèse : Questions de la correction")
+            print(f"   ✅ Conservation des Exercices uniquement")
+    
+            bareme = {k: v for k, v in bareme_brut.items() if "Exercice" in k or "Exo" in k}
+    
+            if not bareme:
+                print(f"   ⚠️ Aucun Exercice trouvé, conservation de tout")
+                bareme = bareme_brut
+            else:
+                questions_retirees = [k for k in bareme_brut.keys() if k not in bareme.keys()]
+                print(f"   ❌ Questions retirées : {questions_retirees}")
+        else:
+            print(f"   ✅ Pas de mélange détecté, conservation de tout")
+            bareme = bareme_brut
+    
+    # CAS 4 : Total normal → Garder tout
+    else:
+        print(f"   ✅ Total {total_points} points → Conservation de tout le barème")
+        bareme = bareme_brut
+    
+    print(f"\n  ✅ Barème final : {bareme}")
+    print(f"  📊 Total points : {sum(bareme.values())}")
+    
+    # ============================================================
+    # ÉTAPE 3 : EXTRAIRE LA CORRECTION DU PROF
+    # ============================================================
+    suivi.etape("correction_prof")
+    print(f"\n{'='*70}")
+    print("📄 ÉTAPE 3/5 : Extraction de la correction du professeur")
+    print(f"{'='*70}")
+    
+    texte_correction_prof = _reprendre_ou_produire(
+        journal, "texte_correction", journal.cle(hash_correction),
+        lambda: _extraire_document(session, "correction")
+    )
+    
+    if not texte_correction_prof:
+        raise ValueError("Impossible d'extraire le texte de la correction.")
+    
+    print(f"  ✅ Correction extraite : {len(texte_correction_prof)} caractères")
+    
+    # ============================================================
+    # ÉTAPE 4 : DÉCOUPER LA CORRECTION PAR QUESTION AVEC IA
+    # ============================================================
+    suivi.etape("decoupage_correction")
+    print(f"\n{'='*70}")
+    print("🤖 ÉTAPE 4/5 : Découpage de la correction")
+    print(f"{'='*70}")
+    
+    corrections_prof_par_question = _reprendre_ou_produire(
+        journal, "corrections", journal.cle(hash_correction, bareme),
+        lambda: decouper_questions_avec_ia(texte_correction_prof, bareme)
+    )
+    
+    print(f"  ✅ Questions détectées : {list(corrections_prof_par_question.keys())}")
+    
+    return bareme, corrections_prof_par_question
+
+
+# ====================================
+# CORRECTION DES COPIES (GRAPHE DE TÂCHES)
+# ====================================
+
+def _resultat_erreur(message: str = "Erreur technique lors de la correction.") -> dict:
+    return {
+        "points_obtenus": 0,
+        "categorie": "ERREUR",
+        "annotation_courte": "Erreur technique",
+        "feedback_detaille": message,
+        "conseil_revision": "Contactez le professeur."
+    }
+
+
+def _corriger_copies(copies: list, bareme: dict, corrections_prof_par_question: dict,
+                     suivi: SuiviCorrection, journal: JournalSession) -> tuple:
+    """
+    Corrige toutes les copies avec UN ordonnanceur pour la session.
+    
+    Graphe de tâches :
+    - "decoupage" (une par copie) : découpe, pré-tri, puis soumet ses corrections
+    - "correction" (une par question, ou une par copie en mode lot)
+    
+    Une réponse identique déjà en cours de correction pour une autre copie
+    n'est pas renvoyée à l'IA : elle attend le résultat (doublon).
+    Chaque copie est assemblée dans l'ordre du barème dès sa dernière question.
+    
+    Journal de reprise : les réponses découpées de chaque copie et chaque
+    résultat (copie, question) sont écrits dès qu'ils sont obtenus, et relus
+    à l'exécution suivante (clés : hash du texte de la copie, question,
+    réponse, correction du prof, points). Les erreurs ne sont pas journalisées.
+    
+    Raises:
+        CorrectionAnnulee si le suivi demande l'annulation (copies terminées
+        conservées dans le suivi)
+    
+    Returns:
+        (résultats dans l'ordre des copies, appels IA évités, résumé de l'ordonnanceur)
+    """
+    total_copies = len(copies)
+    nb_questions = len(bareme)
+    total_points = sum(bareme.values())
+    
+    resultats_finaux = [None] * total_copies
+    etats = [None] * total_copies
+    # Résultats déjà obtenus pour (question, réponse normalisée) dans cette session
+    memo_reponses = {}
+    # (question, réponse normalisée) en cours de correction → copies qui attendent le résultat
+    en_vol = {}
+    appels_evites = {"reponses_vides": 0, "doublons": 0, "reprises": 0}
+    verrou = threading.Lock()
+    empreintes = [journal.cle(copie.get("texte_complet", "")) for copie in copies]
+    
+    def cle_resultat(idx, num_question, question):
+        return journal.cle(empreintes[idx], num_question, question["points_max"],
+                           question["reponse_etudiant"], question["correction_prof"])
+    
+    def assembler(idx):
+        """Note finale d'une copie, questions dans l'ordre du barème"""
+        copie_etudiant, etat = copies[idx], etats[idx]
+        nom_eleve = copie_etudiant.get("nom_eleve", "Élève Inconnu")
+        classe_eleve = copie_etudiant.get("classe", "Classe Inconnue")
+        
+        lignes = [f"\n{'─'*70}", f"👤 Copie {idx + 1}/{total_copies} : {nom_eleve} ({classe_eleve})", f"{'─'*70}"]
+        resultats_par_question = []
+        note_totale_copie = 0.0
+        
+        for i, (num_question, points_max) in enumerate(bareme.items(), 1):
+            resultat_ia = etat["resultats"][num_question]
+            points_obtenus = resultat_ia.get("points_obtenus", 0.0)
+            
+            lignes.append(f"  ✅ [{i}/{nb_questions}] {num_question} : {points_obtenus}/{points_max} pts "
+                          f"({resultat_ia.get('categorie', 'ERREUR')})")
+            if resultat_ia.get("annotation_courte"):
+                lignes.append(f"     💬 {resultat_ia['annotation_courte']}")
+            
+            resultats_par_question.append({num_question: resultat_ia})
+            note_totale_copie += points_obtenus
+        
+        lignes.append(f"  ⏱️  Terminée en {time.time() - etat['debut']:.2f}s  |  "
+                      f"📊 Note finale : {round(note_totale_copie, 2)} / {total_points}")
+        print("\n".join(lignes))
+        
+        resultats_finaux[idx] = {
+            "nom_eleve": nom_eleve,
+            "classe": classe_eleve,
+            "note_finale": round(note_totale_copie, 2),
+            "details": resultats_par_question
+        }
+        suivi.copie_terminee(idx, resultats_finaux[idx])
+    
+    def terminer_question(idx, num_question, resultat):
+        with verrou:
+            etat = etats[idx]
+            etat["resultats"][num_question] = resultat
+            etat["restantes"] -= 1
+            complete = etat["restantes"] == 0
+        suivi.questions_terminees(idx, 1)
+        if complete:
+            assembler(idx)
+    
+    def journaliser(idx, num_question, question, resultat):
+        try:
+            journal.ecrire("resultat", cle_resultat(idx, num_question, question), resultat)
+        except OSError as e:
+            # Résultat valable : seule la reprise de cette question est perdue
+            print(f"  ⚠️ Journal de reprise non écrit (copie {idx + 1}, {num_question}) : {e}")
+    
+    def completer(idx):
+        """Copie restée incomplète (tâche en échec) : questions manquantes en erreur"""
+        if etats[idx] is None:
+            etats[idx] = {"resultats": {}, "restantes": 0, "debut": time.time()}
+        manquantes = [q for q in bareme if q not in etats[idx]["resultats"]]
+        for num_question in manquantes:
+            etats[idx]["resultats"][num_question] = _resultat_erreur()
+        etats[idx]["restantes"] = 0
+        print(f"  ⚠️ Copie {idx + 1} incomplète : {len(manquantes)} question(s) notée(s) en erreur")
+        suivi.questions_terminees(idx, len(manquantes))
+        assembler(idx)
+    
+    def publier(idx, num_question, question, resultat):
+        """Résultat d'une question : copie concernée + copies en attente de la même réponse"""
+        cle = (num_question, _normaliser_reponse(question["reponse_etudiant"]))
+        reussi = resultat.get("categorie") != "ERREUR"
+        with verrou:
+            en_attente = en_vol.pop(cle, [])
+            if reussi:
+                memo_reponses[cle] = copy.deepcopy(resultat)
+            else:
+                appels_evites["doublons"] -= len(en_attente)
+        
+        try:
+            if reussi:
+                journaliser(idx, num_question, question, resultat)
+                for idx_attente, question_attente in en_attente:
+                    journaliser(idx_attente, num_question, question_attente, resultat)
+            
+            terminer_question(idx, num_question, resultat)
+        finally:
+            # Les copies en attente de cette réponse sont toujours libérées
+            for idx_attente, question_attente in en_attente:
+                if reussi:
+                    terminer_question(idx_attente, num_question, copy.deepcopy(resultat))
+                else:
+                    # Pas de résultat à partager : la copie en attente est corrigée pour elle-même
+                    ordonnanceur.soumettre("correction", corriger_une, idx_attente, num_question, question_attente)
+    
+    def corriger_une(idx, num_question, question):
+        try:
+            resultat = corriger_question(
+                f"Évaluation de la {num_question}",
+                question["reponse_etudiant"],
+                question["correction_prof"],
+                question["points_max"],
+                num_question
+            )
+        except Exception as e:
+            print(f"  ❌ Erreur {num_question} : {e}")
+            resultat = _resultat_erreur()
+        publier(idx, num_question, question, resultat)
+    
+    def corriger_lot(idx, a_corriger):
+        try:
+            resultats = corriger_copie(a_corriger)
+        except Exception as e:
+            print(f"  ❌ Erreur copie {idx + 1} : {e}")
+            resultats = {}
+        for num_question, question in a_corriger.items():
+            publier(idx, num_question, question, resultats.get(num_question) or _resultat_erreur())
+    
+    def decouper(idx):
+        copie_etudiant = copies[idx]
+        debut = time.time()
+        try:
+            reponses_etudiant_par_question = _reprendre_ou_produire(
+                journal, "reponses", journal.cle(empreintes[idx], bareme),
+                lambda: decouper_questions_avec_ia(copie_etudiant["texte_complet"], bareme),
+                annoncer=False
+            )
+        except Exception as e:
+            print(f"\n  ❌ Erreur copie {idx + 1} : {e}")
+            traceback.print_exc()
+            resultats_finaux[idx] = {
+                "nom_eleve": copie_etudiant.get("nom_eleve", "Élève Inconnu"),
+                "classe": copie_etudiant.get("classe", "Classe Inconnue"),
+                "erreur": str(e)
+            }
+            suivi.questions_terminees(idx, nb_questions)
+            suivi.copie_terminee(idx, resultats_finaux[idx])
+            return
+        
+        # Questions déjà corrigées lors d'une exécution précédente
+        reprises = {}
+        for num_question, points_max in bareme.items():
+            question = {
+                "points_max": float(points_max),
+                "reponse_etudiant": reponses_etudiant_par_question.get(num_question, REPONSE_ABSENTE),
+                "correction_prof": corrections_prof_par_question.get(num_question, CORRECTION_ABSENTE)
+            }
+            resultat = journal.get("resultat", cle_resultat(idx, num_question, question))
+            if resultat is not None:
+                reprises[num_question] = resultat
+        
+        with verrou:
+            # PRÉ-TRI : réponses vides, reprises et doublons déjà corrigés (sans appel IA)
+            connus, a_corriger = _trier_reponses(
+                bareme,
+                reponses_etudiant_par_question,
+                corrections_prof_par_question,
+                memo_reponses,
+                appels_evites,
+                reprises
+            )
+            # Doublons en cours de correction pour une autre copie : attendre leur résultat
+            for num_question in list(a_corriger):
+                cle = (num_question, _normaliser_reponse(a_corriger[num_question]["reponse_etudiant"]))
+                if cle in en_vol:
+                    en_vol[cle].append((idx, a_corriger.pop(num_question)))
+                    appels_evites["doublons"] += 1
+                else:
+                    en_vol[cle] = []
+            
+            etats[idx] = {"resultats": connus, "restantes": nb_questions - len(connus), "debut": debut}
+            complete = etats[idx]["restantes"] == 0
+        
+        suivi.questions_terminees(idx, len(connus))
+        if complete:
+            assembler(idx)
+        elif a_corriger and CORRECTION_BATCH_ENABLED:
+            ordonnanceur.soumettre("correction", corriger_lot, idx, a_corriger)
+        else:
+            for num_question, question in a_corriger.items():
+                ordonnanceur.soumettre("correction", corriger_une, idx, num_question, question)
+    
+    print(f"  ⚡ {total_copies} copie(s), {CORRECTION_CONCURRENCE} tâche(s) simultanée(s) au maximum "
+          f"({'une requête par copie' if CORRECTION_BATCH_ENABLED else 'une requête par question'})")
+    
+    suivi.debut_copies(copies, nb_questions)
+    annulee = False
+    with Ordonnanceur(["decoupage", "correction"], CORRECTION_CONCURRENCE) as ordonnanceur:
+        for idx in range(total_copies):
+            ordonnanceur.soumettre("decoupage", decouper, idx)
+        while not ordonnanceur.attendre(timeout=0.5):
+            if not annulee and suivi.annulee():
+                annulee = True
+                print(f"  🛑 Annulation : {ordonnanceur.annuler()} tâche(s) abandonnée(s), "
+                      f"fin des tâches en cours...")
+    
+    if annulee:
+        raise CorrectionAnnulee(f"Correction annulée : "
+                                f"{sum(r is not None for r in resultats_finaux)}/{total_copies} copie(s) terminée(s)")
+    
+    # Une tâche qui lève une exception (hors appels IA, déjà rattrapés) laisse
+    # sa copie incomplète : jamais de copie sans résultat dans la session
+    for idx in range(total_copies):
+        if resultats_finaux[idx] is None:
+            completer(idx)
+    
+    return resultats_finaux, appels_evites, ordonnanceur.resume()
+
+
+def lancer_correction_automatique(session_id: str, suivi: SuiviCorrection = None):
+    """
+    Lance la correction automatique d'une session (voir _lancer_correction).
+    
+    Les appels IA de la correction sont rattachés à la session pour
+    les métriques (tokens, latence, retries, cache IA).
+    
+    Args:
+        session_id: ID de la session
+        suivi: avancement / annulation (tâche de fond), optionnel
+    
+    Raises:
+        CorrectionAnnulee si le suivi demande l'annulation
+    """
+    with suivre_session(session_id):
+        return _lancer_correction(session_id, suivi or SuiviCorrection())
+
+
+def _lancer_correction(session_id: str, suivi: SuiviCorrection):
     """
     Lance la correction automatique avec gestion intelligente des erreurs.
     
-    Processus :
+    Processus (étapes 1 à 4 sautées si un modèle d'examen existe déjà
+    pour la même épreuve et la même correction ; tout ce qui a déjà été
+    produit par une exécution interrompue est relu dans le journal de reprise) :
     1. Extrait le texte de l'épreuve (OCR hybride)
     2. Extrait le barème avec l'IA + filtrage intelligent V2
     3. Extrait le texte de la correction du prof (OCR hybride)
     4. Découpe la correction par question avec l'IA (Groq)
-    5. Pour chaque copie d'élève :
-        - Découpe les réponses par question avec l'IA (Groq)
-        - Corrige TOUTES les questions EN PARALLÈLE ⚡
-        - Calcule la note finale
-    6. Affiche le résumé de l'usage des tokens Groq
-    7. Stocke les résultats dans la session
+    5. Toutes les copies à la fois, via un ordonnanceur global
+       (CORRECTION_CONCURRENCE tâches simultanées) :
+        - Découpe les réponses de chaque copie par question avec l'IA (Groq)
+        - Réponses vides et doublons d'autres copies : sans appel IA
+        - Corrige les autres questions en UNE requête par copie
+          (CORRECTION_BATCH_ENABLED) ou une requête par question ⚡
+        - Calcule la note finale (résultats dans l'ordre des copies)
+    6. Affiche le résumé de l'usage réel des tokens (par étape)
+    7. Stocke les résultats dans la session (base SQLite, une transaction)
     
     Args:
         session_id: ID de la session
@@ -46,285 +617,88 @@ def lancer_correction_automatique(session_id: str):
     print(f"📋 Session : {session_id}")
     
     start_time = time.time()
-    reset_tokens_stats()
     
-    session = sessions.get(session_id)
+    session = depot_sessions.get(session_id)
     if not session:
         raise ValueError(f"Session {session_id} introuvable.")
+    
+    # Compteurs enregistrés (upload, corrections précédentes), quel que soit
+    # le worker qui les a produits
+    charger_metriques(session_id, session.get("metriques"))
 
+    journal = JournalSession(session_id)
+    
     try:
-        # ============================================================
-        # ÉTAPE 1 : EXTRAIRE LE TEXTE DE L'ÉPREUVE
-        # ============================================================
-        print(f"\n{'='*70}")
-        print("📄 ÉTAPE 1/5 : Extraction de l'épreuve")
-        print(f"{'='*70}")
-        
-        texte_epreuve = extract_text_from_pdf(
-            session["epreuve"]["path"], 
-            force_mode=None
-        )
-        
-        if not texte_epreuve:
-            raise ValueError("Impossible d'extraire le texte de l'épreuve.")
+        modele = modele_pour_session(session)
         
-        print(f"  ✅ Épreuve extraite : {len(texte_epreuve)} caractères")
-        
-        # ============================================================
-        # ÉTAPE 2 : EXTRACTION BARÈME + FILTRAGE INTELLIGENT V2
-        # ============================================================
-        print(f"\n{'='*70}")
-        print("🤖 ÉTAPE 2/5 : Extraction du barème avec filtrage intelligent V2")
-        print(f"{'='*70}")
-        
-        bareme_brut = extraire_bareme_de_epreuve(texte_epreuve)
-        
-        if not bareme_brut or len(bareme_brut) == 0:
-            raise ValueError("Impossible d'extraire un barème de l'épreuve.")
-        
-        print(f"  📊 Barème brut : {bareme_brut}")
-        
-        # ✅ FILTRAGE INTELLIGENT VERSION 2.0
-        print(f"\n🔍 Analyse du barème...")
-        
-        nb_exercices = sum(1 for k in bareme_brut.keys() if "Exercice" in k or "Exo" in k)
-        nb_questions = sum(1 for k in bareme_brut.keys() if "Question" in k and "Exercice" not in k)
-        
-        print(f"   📊 Détection : {nb_exercices} Exercice(s), {nb_questions} Question(s)")
-        
-        # Calculer le total
-        total_questions = len(bareme_brut)
-        total_points = sum(bareme_brut.values())
-        
-        print(f"   📊 Total : {total_questions} question(s), {total_points} points")
-        
-        # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-        # LOGIQUE DE FILTRAGE INTELLIGENTE
-        # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-        
-        # CAS 1 : Total proche de 20 points (18-22) → Probablement correct
-        if 18 <= total_points <= 22:
-            print(f"   ✅ Total proche de 20 points → Barème probablement correct")
-            print(f"   ✅ Conservation de TOUT le barème")
-            bareme = bareme_brut
-        
-        # CAS 2 : Total proche de 10/15 points → Probablement correct
-        elif 8 <= total_points <= 16:
-            print(f"   ✅ Total {total_points} points → Barème court, probablement correct")
-            print(f"   ✅ Conservation de TOUT le barème")
-            bareme = bareme_brut
-        
-        # CAS 3 : Total anormalement élevé (>25 points) → Filtrage nécessaire
-        elif total_points > 25:
-            print(f"   ⚠️ Total anormalement élevé ({total_points} pts) → Filtrage nécessaire")
-            
-            # Si mélange Exercices + Questions
-            if nb_exercices > 0 and nb_questions > 0:
-                print(f"   🔧 Mélange détecté → Hypothèse : Questions de la correction")
-                print(f"   ✅ Conservation des Exercices uniquement")
-                
-                bareme = {k: v for k, v in bareme_brut.items() if "Exercice" in k or "Exo" in k}
-                
-                if not bareme:
-                    print(f"   ⚠️ Aucun Exercice trouvé, conservation de tout")
-                    bareme = bareme_brut
-                else:
-                    questions_retirees = [k for k in bareme_brut.keys() if k not in bareme.keys()]
-                    print(f"   ❌ Questions retirées : {questions_retirees}")
-            else:
-                print(f"   ✅ Pas de mélange détecté, conservation de tout")
-                bareme = bareme_brut
-        
-        # CAS 4 : Total normal → Garder tout
+        if modele:
+            print(f"\n♻️  Modèle d'examen {modele['id']} : barème et correction réutilisés "
+                  f"(étapes 1 à 4 sautées)")
+            bareme = modele["bareme"]
+            corrections_prof_par_question = modele["corrections"]
+            modeles_examen.marquer_utilisation(modele["id"])
         else:
-            print(f"   ✅ Total {total_points} points → Conservation de tout le barème")
-            bareme = bareme_brut
-        
-        print(f"\n  ✅ Barème final : {bareme}")
-        print(f"  📊 Total points : {sum(bareme.values())}")
-        
-        # ============================================================
-        # ÉTAPE 3 : EXTRAIRE LA CORRECTION DU PROF
-        # ============================================================
-        print(f"\n{'='*70}")
-        print("📄 ÉTAPE 3/5 : Extraction de la correction du professeur")
-        print(f"{'='*70}")
-        
-        texte_correction_prof = extract_text_from_pdf(
-            session["correction"]["path"], 
-            force_mode=None
-        )
-        
-        if not texte_correction_prof:
-            raise ValueError("Impossible d'extraire le texte de la correction.")
-        
-        print(f"  ✅ Correction extraite : {len(texte_correction_prof)} caractères")
-        
-        # ============================================================
-        # ÉTAPE 4 : DÉCOUPER LA CORRECTION PAR QUESTION AVEC IA
-        # ============================================================
-        print(f"\n{'='*70}")
-        print("🤖 ÉTAPE 4/5 : Découpage de la correction")
-        print(f"{'='*70}")
+            bareme, corrections_prof_par_question = _preparer_examen(session, suivi, journal)
+            
+            if session["epreuve"].get("hash") and modeles_examen.actif:
+                modele = modeles_examen.enregistrer(
+                    session["epreuve"]["hash"],
+                    session["correction"]["hash"],
+                    bareme,
+                    corrections_prof_par_question,
+                    fichiers={
+                        "epreuve": session["epreuve"].get("filename"),
+                        "correction": session["correction"].get("filename")
+                    }
+                )
+                session["modele_id"] = modele["id"]
+                print(f"  💾 Modèle d'examen {modele['id']} enregistré pour les prochaines sessions")
         
-        corrections_prof_par_question = decouper_questions_avec_ia(
-            texte_correction_prof, 
-            bareme
+        # Hash des documents, modèle rattaché et statistiques OCR
+        depot_sessions.mettre_a_jour(
+            session_id,
+            epreuve=session["epreuve"],
+            correction=session["correction"],
+            modele_id=session.get("modele_id"),
+            ocr=session.get("ocr")
         )
         
-        print(f"  ✅ Questions détectées : {list(corrections_prof_par_question.keys())}")
-        
+    except CorrectionAnnulee:
+        raise
     except Exception as e:
         print(f"\n❌ ERREUR CRITIQUE : {e}")
         traceback.print_exc()
         return {"error": str(e)}
 
     # ============================================================
-    # ÉTAPE 5 : CORRIGER CHAQUE COPIE AVEC PARALLÉLISATION
+    # ÉTAPE 5 : CORRIGER TOUTES LES COPIES (ORDONNANCEUR GLOBAL)
     # ============================================================
     print(f"\n{'='*70}")
     print("✏️  ÉTAPE 5/5 : Correction des copies")
     print(f"{'='*70}")
     
-    resultats_finaux = []
-    total_copies = len(session["copies"])
-    
-    for idx, copie_etudiant in enumerate(session["copies"], 1):
-        nom_eleve = copie_etudiant.get("nom_eleve", "Élève Inconnu")
-        classe_eleve = copie_etudiant.get("classe", "Classe Inconnue")
-
-        print(f"\n{'─'*70}")
-        print(f"👤 Copie {idx}/{total_copies} : {nom_eleve} ({classe_eleve})")
-        print(f"{'─'*70}")
-
-        try:
-            texte_copie = copie_etudiant["texte_complet"]
-            
-            print(f"  🤖 Découpage des réponses...")
-            reponses_etudiant_par_question = decouper_questions_avec_ia(
-                texte_copie, 
-                bareme
-            )
-            
-            print(f"  ✅ Réponses : {list(reponses_etudiant_par_question.keys())}")
-
-            # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-            # CALCUL INTELLIGENT DU NOMBRE DE THREADS
-            # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-            
-            nb_questions = len(bareme)
-            
-            if nb_questions <= 2:
-                max_workers = nb_questions
-            elif nb_questions <= 4:
-                max_workers = 2
-            elif nb_questions <= 10:
-                max_workers = 3
-            else:
-                max_workers = 4
-            
-            print(f"\n  ⚡ {max_workers} thread(s) pour {nb_questions} question(s)")
-            
-            correction_start = time.time()
-            resultats_par_question = []
-            note_totale_copie = 0.0
-
-            # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-            # BLOC PARALLÉLISÉ (CORRECTION DE TOUTES LES QUESTIONS)
-            # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {}
-                
-                for num_question, points_max in bareme.items():
-                    reponse_etudiant = reponses_etudiant_par_question.get(
-                        num_question, 
-                        "AUCUNE RÉPONSE FOURNIE."
-                    )
-                    
-                    correction_prof = corrections_prof_par_question.get(
-                        num_question, 
-                        "Correction de référence non trouvée."
-                    )
-                    
-                    future = executor.submit(
-                        corriger_question,
-                        f"Évaluation de la {num_question}",
-                        reponse_etudiant,
-                        correction_prof,
-                        float(points_max),
-                        num_question
-                    )
-                    
-                    futures[future] = (num_question, points_max)
-                
-                questions_completed = 0
-                
-                for future in as_completed(futures):
-                    num_question, points_max = futures[future]
-                    questions_completed += 1
-                    
-                    try:
-                        resultat_ia = future.result()
-                        
-                        points_obtenus = resultat_ia.get("points_obtenus", 0.0)
-                        categorie = resultat_ia.get("categorie", "ERREUR")
-                        annotation = resultat_ia.get("annotation_courte", "")
-                        
-                        print(f"  ✅ [{questions_completed}/{nb_questions}] {num_question} : {points_obtenus}/{points_max} pts ({categorie})")
-                        
-                        if annotation:
-                            print(f"     💬 {annotation}")
-                        
-                        resultats_par_question.append({num_question: resultat_ia})
-                        note_totale_copie += points_obtenus
-                        
-                    except Exception as e:
-                        print(f"  ❌ Erreur {num_question} : {e}")
-                        
-                        resultats_par_question.append({
-                            num_question: {
-                                "points_obtenus": 0,
-                                "categorie": "ERREUR",
-                                "annotation_courte": "Erreur technique",
-                                "feedback_detaille": "Erreur technique lors de la correction.",
-                                "conseil_revision": "Contactez le professeur."
-                            }
-                        })
-            
-            # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-            # FIN DU BLOC PARALLÉLISÉ
-            # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-            
-            correction_elapsed = time.time() - correction_start
-            acceleration = (nb_questions * 20) / correction_elapsed if correction_elapsed > 0 else 1
-            
-            print(f"\n  ⏱️  Terminé en {correction_elapsed:.2f}s (~{acceleration:.1f}x plus rapide)")
-
-            resultats_finaux.append({
-                "nom_eleve": nom_eleve,
-                "classe": classe_eleve,
-                "note_finale": round(note_totale_copie, 2),
-                "details": resultats_par_question
-            })
-            
-            print(f"  📊 Note finale : {round(note_totale_copie, 2)} / {sum(bareme.values())}")
-
-        except Exception as e:
-            print(f"\n  ❌ Erreur : {e}")
-            traceback.print_exc()
-            
-            resultats_finaux.append({
-                "nom_eleve": nom_eleve, 
-                "classe": classe_eleve, 
-                "erreur": str(e)
-            })
+    suivi.etape("copies")
+    resultats_finaux, appels_evites, ordonnancement = _corriger_copies(
+        depot_sessions.copies(session_id), bareme, corrections_prof_par_question, suivi, journal
+    )
 
     # ============================================================
     # ÉTAPE 6 : SAUVEGARDER LES RÉSULTATS
     # ============================================================
-    sessions[session_id]["results"] = resultats_finaux
-    sessions[session_id]["status"] = "corrected"
+    if not suivi.detient_session():
+        # Session reprise par un autre worker : ne pas écraser sa correction
+        raise CorrectionAnnulee("Session reprise par un autre worker : résultats non enregistrés")
+    cache_llm = get_llm_cache_stats(session_id)
+    depot_sessions.enregistrer_resultats(
+        session_id,
+        resultats_finaux,
+        status="corrected",
+        cache_llm=cache_llm,
+        appels_evites=appels_evites,
+        ordonnancement=ordonnancement,
+        reprise=dict(journal.stats),
+        metriques=get_metriques(session_id)
+    )
     
     # ============================================================
     # ÉTAPE 7 : AFFICHER LE RÉSUMÉ FINAL
@@ -341,8 +715,17 @@ def lancer_correction_automatique(session_id: str):
         vitesse_moyenne = elapsed_time / len(resultats_finaux)
         print(f"⚡ Vitesse : {vitesse_moyenne:.2f}s/copie")
     
+    print(f"🧵 Ordonnanceur : {ordonnancement['concurrence_max']}/{ordonnancement['max_concurrence']} "
+          f"tâche(s) simultanée(s) au maximum")
+    print(f"⏭️  Appels IA évités : {appels_evites['reponses_vides']} réponse(s) vide(s), "
+          f"{appels_evites['doublons']} doublon(s), {appels_evites['reprises']} reprise(s)")
+    print(f"💾 Journal de reprise : {journal.stats['relues']} entrée(s) relue(s), "
+          f"{journal.stats['ecrites']} écrite(s)")
+    
+    print(f"♻️  Cache IA : {cache_llm['hits']} réponse(s) réutilisée(s), "
+          f"{cache_llm['misses']} appel(s) ({cache_llm['taux_hit']:.0%} de hits)")
     print(f"{'='*70}")
     
-    print_tokens_summary()
+    print_resume_metriques(session_id)
     
     return resultats_finaux
\ No newline at end of file
@@ -1,80 +1,129 @@
 import re
 
+NOM_INCONNU = "Eleve inconnu"
+CLASSE_INCONNUE = "Classe inconnue"
+
+# Taille de l'en-tête analysé (le nom et la classe sont en haut de page)
+TAILLE_ENTETE = 400
+
+# ============================================================
+# PATTERNS (compilés une fois)
+# ============================================================
+
+# Nom 1 : "DUPONT Jean - Matricule" ou "IVANOV Ivan - Matricule"
+NOM_AVANT_MATRICULE = re.compile(r"([A-ZÀ-Ÿ][A-Za-zÀ-ÿ]{2,15}\s+[A-ZÀ-Ÿ][A-Za-zà-ÿ]{2,15})\s*[-–]\s*[Mm]atricule", re.IGNORECASE)
+# Nom 2 : "Nom : DUPONT Jean" ou "Nom: DuPONT jean"
+NOM_ETIQUETTE = re.compile(r"\bNom\s*[:\-]\s*([A-ZÀ-ÿ][A-Za-zÀ-ÿ'\- ]{2,30})", re.IGNORECASE)
+PRENOM_ETIQUETTE = re.compile(r"\bPr[ée]nom\s*[:\-]\s*([A-ZÀ-ÿ][A-Za-zÀ-ÿ'\-]{1,20})", re.IGNORECASE)
+# Nom 3 : 2 mots CAPITALISÉS (pas "Copie Etudiant")
+NOM_CAPITALISE = re.compile(r"\b([A-ZÀ-Ÿ][A-ZÀ-Ÿa-zà-ÿ]{2,15})\s+([A-ZÀ-Ÿ][A-Za-zà-ÿ]{2,15})\b")
+# Fin d'un nom capturé : l'étiquette suivante de l'en-tête
+FIN_NOM = re.compile(r"\s*\b(?:Pr[ée]nom|Classe|Matricule|Date|Note|Groupe|Fili[èe]re|Exercice|Question|Partie)\b.*$", re.IGNORECASE)
+
+# Classe 1 : "Classe : 3IL"
+CLASSE_ETIQUETTE = re.compile(r"\bClasse\s*[:\-]\s*([A-Za-z0-9\-_]{1,15})", re.IGNORECASE)
+# Classe 2 : "Matricule : 3IL2024001" → "3IL"
+MATRICULE = re.compile(r"[Mm]atricule\s*[:\-]\s*([A-Za-z0-9]{3,10})", re.IGNORECASE)
+CLASSE_DANS_MATRICULE = re.compile(r"^(\d[A-Za-z]{1,3}|[A-Za-z]{1,3}\d)")
+# Classe 3 : un code classe dans le texte (ex: "3IL", "L3")
+CLASSE_CODE = re.compile(r"\b([A-Z0-9]{2,4})\b")
+
+# Marques d'un en-tête d'élève (absentes des pages de suite)
+MARQUES_ENTETE = re.compile(r"\b(?:nom|pr[ée]nom|matricule|classe|copie|[ée]tudiant|[ée]l[èe]ve)\b", re.IGNORECASE)
+
+MOTS_EXCLUS_NOM = {"copie", "cope", "cople", "code", "etudiant", "étudiant", "student",
+                   "exercice", "question", "partie", "correction", "matricule", "classe"}
+CODES_EXCLUS = {"td", "tp", "sql", "mfl", "nfl"}
+
+
+def _nettoyer_nom(nom: str) -> str:
+    return FIN_NOM.sub("", nom).strip(" -'")
+
+
+def _chercher_nom(texte: str) -> tuple:
+    """(nom, score, pattern) du meilleur pattern qui trouve un nom"""
+    m = NOM_AVANT_MATRICULE.search(texte)
+    if m:
+        return m.group(1).strip(), 0.95, "avant Matricule"
+
+    m = NOM_ETIQUETTE.search(texte)
+    if m:
+        nom = _nettoyer_nom(m.group(1))
+        prenom = PRENOM_ETIQUETTE.search(texte)
+        if prenom and prenom.group(1).lower() not in nom.lower():
+            nom = f"{nom} {prenom.group(1)}"
+        if len(nom) >= 3 and not set(nom.lower().split()) & MOTS_EXCLUS_NOM:
+            return nom, 0.9, "Nom:"
+
+    for m in NOM_CAPITALISE.finditer(texte):
+        if m.group(1).lower() not in MOTS_EXCLUS_NOM and m.group(2).lower() not in MOTS_EXCLUS_NOM:
+            return f"{m.group(1)} {m.group(2)}", 0.4, "Capitalisés"
+
+    return NOM_INCONNU, 0.0, None
+
+
+def _chercher_classe(texte: str) -> tuple:
+    """(classe, score, pattern) du meilleur pattern qui trouve une classe"""
+    c = CLASSE_ETIQUETTE.search(texte)
+    if c:
+        return c.group(1).strip(), 0.95, "Classe:"
+
+    m = MATRICULE.search(texte)
+    if m:
+        code = m.group(1).strip()
+        debut = CLASSE_DANS_MATRICULE.match(code)
+        if debut:
+            return debut.group(1).upper(), 0.85, "Matricule"
+        return code[:4], 0.5, "Matricule"
+
+    for m in CLASSE_CODE.finditer(texte):
+        if m.group(1).lower() not in CODES_EXCLUS:
+            return m.group(1), 0.3, "Code"
+
+    return CLASSE_INCONNUE, 0.0, None
+
+
+def identifier_par_regex(texte: str) -> dict:
+    """
+    Nom et classe lus dans l'en-tête de la page, avec un score de confiance.
+
+    Returns:
+        {"nom", "classe", "confiance" (0-1), "entete" (bool : la page
+        porte des marques d'en-tête d'élève), "patterns"}
+    """
+    entete = texte[:TAILLE_ENTETE].replace('\n', ' ').strip()
+    nom, score_nom, pattern_nom = _chercher_nom(entete)
+    classe, score_classe, pattern_classe = _chercher_classe(entete)
+
+    return {
+        "nom": nom,
+        "classe": classe,
+        "confiance": round(0.8 * score_nom + 0.2 * score_classe, 2),
+        "entete": bool(MARQUES_ENTETE.search(entete)),
+        "patterns": (pattern_nom, pattern_classe),
+    }
+
 
 def extraire_nom_et_classe(texte: str):
     """
     Cherche le nom et la classe sur la page.
     Version améliorée pour mieux détecter les noms manuscrits.
     """
-    nom = "Eleve inconnu"
-    classe = "Classe inconnue"
-
-    # Nettoyer le texte
     texte_nettoye = texte.replace('\n', ' ').strip()
-    
+
     print(f"    🔍 Texte à analyser (100 premiers caractères) :")
     print(f"    {texte_nettoye[:100]}...")
-    
-    # ============================================================
-    # RECHERCHE DU NOM
-    # ============================================================
-    
-    # Pattern 1 : "DUPONT Jean - Matricule" ou "IVANOV Ivan - Matricule"
-    m = re.search(r"([A-ZÀ-Ÿ][A-Za-zÀ-ÿ]{2,15}\s+[A-ZÀ-Ÿ][A-Za-zà-ÿ]{2,15})\s*[-–]\s*[Mm]atricule", texte_nettoye, re.IGNORECASE)
-    if m:
-        nom = m.group(1).strip()
-        print(f"    ✅ Nom trouvé (Pattern 1 - avant Matricule) : {nom}")
-    
-    # Pattern 2 : "Nom : DUPONT Jean" ou "Nom: DuPONT jean"
-    if nom == "Eleve inconnu":
-        m = re.search(r"Nom\s*[:\-]\s*([A-ZÀ-ÿ][A-Za-zÀ-ÿ'\- ]{2,30})", texte_nettoye, re.IGNORECASE)
-        if m:
-            nom = m.group(1).strip()
-            print(f"    ✅ Nom trouvé (Pattern 2 - Nom:) : {nom}")
-    
-    # Pattern 3 : Cherche 2 mots CAPITALISÉS (pas "Copie Etudiant")
-    if nom == "Eleve inconnu":
-        m = re.search(r"\b([A-ZÀ-Ÿ][A-ZÀ-Ÿa-zà-ÿ]{2,15})\s+([A-ZÀ-Ÿ][A-Za-zà-ÿ]{2,15})\b", texte_nettoye)
-        if m:
-            # Exclure "Copie Etudiant", "Cope Etudiant", etc.
-            mot1 = m.group(1).lower()
-            mot2 = m.group(2).lower()
-            if mot1 not in ["copie", "cope", "cople", "code"] and mot2 not in ["etudiant", "student"]:
-                nom = f"{m.group(1)} {m.group(2)}"
-                print(f"    ✅ Nom trouvé (Pattern 3 - Capitalisés) : {nom}")
-    
-    # ============================================================
-    # RECHERCHE DE LA CLASSE
-    # ============================================================
-    
-    # Pattern 1 : "Matricule : 3IL2024001" → extraire "3IL"
-    m = re.search(r"[Mm]atricule\s*[:\-]\s*([A-Za-z0-9]{3,10})", texte_nettoye, re.IGNORECASE)
-    if m:
-        code = m.group(1).strip()
-        # Prendre les 2-4 premiers caractères (ex: 3IL, L3)
-        classe = code[:4] if len(code) >= 3 else code
-        print(f"    ✅ Classe trouvée (Pattern 1 - Matricule) : {classe}")
-    
-    # Pattern 2 : "Classe : 3IL"
-    if classe == "Classe inconnue":
-        c = re.search(r"Classe\s*[:\-]\s*([A-Za-z0-9\-_ ]{1,15})", texte_nettoye, re.IGNORECASE)
-        if c:
-            classe = c.group(1).strip()
-            print(f"    ✅ Classe trouvée (Pattern 2 - Classe:) : {classe}")
-    
-    # Pattern 3 : Chercher un code classe dans le texte (ex: "3IL", "L3")
-    if classe == "Classe inconnue":
-        m = re.search(r"\b([A-Z0-9]{2,4})\b", texte_nettoye)
-        if m:
-            code = m.group(1).strip()
-            # Exclure les codes non pertinents
-            if code.lower() not in ["td", "tp", "sql", "mfl", "nfl"]:
-                classe = code
-                print(f"    ✅ Classe trouvée (Pattern 3 - Code) : {classe}")
-    
-    if nom == "Eleve inconnu":
+
+    nom, _, pattern_nom = _chercher_nom(texte_nettoye)
+    classe, _, pattern_classe = _chercher_classe(texte_nettoye)
+
+    if pattern_nom:
+        print(f"    ✅ Nom trouvé (Pattern {pattern_nom}) : {nom}")
+    else:
         print(f"    ⚠️ AUCUN NOM détecté")
-    if classe == "Classe inconnue":
+    if pattern_classe:
+        print(f"    ✅ Classe trouvée (Pattern {pattern_classe}) : {classe}")
+    else:
         print(f"    ⚠️ AUCUNE CLASSE détectée")
 
-    return nom, classe
\ No newline at end of file
+    return nom, classe
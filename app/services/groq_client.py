@@ -1,11 +1,33 @@
 """
 Client Groq centralisé avec gestion automatique du rate limiting
 Version finale - Novembre 2025
+
+Cache disque des réponses devant call_groq / call_gemini :
+clé = fournisseur + modèle + température + hash du prompt normalisé
+
+Derrière le cache, le routeur (llm_router) choisit le fournisseur :
+bascule Groq ↔ Gemini en cas d'erreur, hedging optionnel
 """
+import os
+import re
+import json
 import time
+import random
+from datetime import datetime
+
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from groq import Groq
-from app.config import GEMINI_API_KEY, GROQ_API_KEY, AI_PROVIDER
+from app.config import (
+    GEMINI_API_KEY, GROQ_API_KEY, AI_PROVIDER, CACHE_FOLDER,
+    LLM_CACHE_ENABLED, LLM_CACHE_MAX_MB, LLM_CACHE_TTL,
+    LLM_FAILOVER_ENABLED, LLM_HEDGING_ENABLED, LLM_HEDGE_DELAI_DEFAUT
+)
+from app.services.cache_service import DiskCache, construire_cle
+from app.services.rate_limit_service import limiteur_groq, estimer_tokens, lire_duree
+from app.services.metrics_service import enregistrer_appel, enregistrer_cache, get_metriques
+from app.services.prompt_service import calibrer_tokens
+from app.services.llm_router import RouteurIA
 
 # Configuration des clients
 if GEMINI_API_KEY:
@@ -13,21 +35,170 @@ if GEMINI_API_KEY:
 
 client_groq = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
 
+GROQ_MODEL = "llama-3.1-8b-instant"
+GROQ_TEMPERATURE = 0.3
+GEMINI_MODEL = "gemini-1.5-flash-latest"
+GEMINI_TEMPERATURE = 0.3
+
+# Erreurs Gemini pour lesquelles un nouvel essai a du sens
+GEMINI_ERREURS_TRANSITOIRES = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+_modele_gemini = None
+
+
+# ====================================
+# CACHE DES RÉPONSES IA
+# ====================================
+
+# ⚠️ Incrémenter LLM_CACHE_VERSION si le format des réponses attendues change
+LLM_CACHE_VERSION = 2
+llm_cache = DiskCache(
+    os.path.join(CACHE_FOLDER, "llm"),
+    LLM_CACHE_MAX_MB * 1024 * 1024,
+    ttl=LLM_CACHE_TTL or None
+)
+
+def normaliser_prompt(prompt: str) -> str:
+    """Ignore les différences d'espacement qui ne changent pas le sens du prompt"""
+    lignes = (re.sub(r"[ \t]+", " ", ligne).strip() for ligne in prompt.strip().splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lignes))
+
+
+def get_llm_cache_stats(session_id=None, metriques=None) -> dict:
+    """
+    Compteurs du cache IA : globaux, ou d'une session (depuis ses métriques,
+    celles de ce processus si `metriques` n'est pas fourni)
+    """
+    if session_id is None and metriques is None:
+        return llm_cache.stats()
+    
+    total = (metriques or get_metriques(session_id))["total"]
+    return {"hits": total["cache_hits"], "misses": total["cache_misses"], "taux_hit": total["taux_hit_cache"]}
+
+
+def _reponse_json_valide(texte: str) -> bool:
+    try:
+        json.loads(texte.strip().replace("```json", "").replace("```", ""))
+        return True
+    except (ValueError, AttributeError):
+        return False
+
+
+def _avec_cache_llm(fournisseur: str, modele: str, temperature, prompt: str, appeler) -> str:
+    """
+    Exécute `appeler()` sauf si le même prompt a déjà reçu une réponse.
+    
+    Seules les réponses JSON valides sont mises en cache : une réponse
+    mal formée sera redemandée au prochain essai.
+    """
+    if not LLM_CACHE_ENABLED:
+        return appeler()
+    
+    cle = construire_cle(
+        "llm", LLM_CACHE_VERSION, fournisseur, modele, temperature,
+        construire_cle(normaliser_prompt(prompt))
+    )
+    
+    entree = llm_cache.get(cle)
+    if entree is not None:
+        enregistrer_cache(hit=True)
+        return entree["reponse"]
+    
+    enregistrer_cache(hit=False)
+    reponse = appeler()
+    
+    if reponse and _reponse_json_valide(reponse):
+        llm_cache.set(cle, {
+            "reponse": reponse,
+            "fournisseur": fournisseur,
+            "modele": modele,
+            "date": datetime.now().isoformat()
+        })
+    
+    return reponse
+
+
+# ====================================
+# APPELS AUX FOURNISSEURS
+# ====================================
+
+def _get_modele_gemini():
+    """Modèle Gemini partagé (créé une seule fois), sortie JSON"""
+    global _modele_gemini
+    if _modele_gemini is None:
+        _modele_gemini = genai.GenerativeModel(
+            GEMINI_MODEL,
+            generation_config=genai.GenerationConfig(
+                temperature=GEMINI_TEMPERATURE,
+                response_mime_type="application/json"
+            )
+        )
+    return _modele_gemini
+
 
 def call_gemini(prompt):
-    """Appelle Gemini."""
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')
-    response = model.generate_content(prompt)
-    return response.text
+    """Appelle Gemini (réponse en cache si le prompt est déjà connu)."""
+    return _avec_cache_llm(
+        "gemini", GEMINI_MODEL, GEMINI_TEMPERATURE, prompt,
+        lambda: _appeler_via_routeur("gemini", prompt)
+    )
+
+
+def _call_gemini(prompt, max_retries=3):
+    """
+    Appelle Gemini avec retries (backoff exponentiel + jitter)
+    sur les erreurs transitoires (quota, indisponibilité, timeout).
+    """
+    if not GEMINI_API_KEY:
+        raise ValueError("❌ La clé API Gemini n'est pas configurée dans .env")
+    
+    for attempt in range(max_retries):
+        try:
+            debut = time.perf_counter()
+            response = _get_modele_gemini().generate_content(prompt)
+            
+            usage = getattr(response, "usage_metadata", None)
+            enregistrer_appel(
+                getattr(usage, "prompt_token_count", 0) or 0,
+                getattr(usage, "candidates_token_count", 0) or 0,
+                time.perf_counter() - debut,
+                retries=attempt
+            )
+            return response.text
+        
+        except GEMINI_ERREURS_TRANSITOIRES as e:
+            if attempt == max_retries - 1:
+                print(f"    ❌ Gemini indisponible après {max_retries} tentative(s) : {e}")
+                raise
+            delai = random.uniform(0, min(30.0, 2.0 * (2 ** attempt)))
+            print(f"    ⏳ Gemini : {type(e).__name__}, nouvel essai dans {delai:.1f}s "
+                  f"(tentative {attempt + 1}/{max_retries})")
+            time.sleep(delai)
 
 
 def call_groq(prompt, max_retries=3):
+    """Appelle Groq (réponse en cache si le prompt est déjà connu)."""
+    return _avec_cache_llm(
+        "groq", GROQ_MODEL, GROQ_TEMPERATURE, prompt,
+        lambda: _appeler_via_routeur("groq", prompt)
+    )
+
+
+def _call_groq(prompt, max_retries=3):
     """
-    Appelle Groq avec gestion automatique du rate limiting (429).
+    Appelle Groq avec gestion automatique du rate limiting.
     
-    Si rate limit atteint :
-    - Attend le temps indiqué par l'API
-    - Réessaye automatiquement (max 3 fois)
+    - Avant l'envoi : réserve la capacité (requêtes + tokens/minute)
+      auprès du limiteur partagé, et attend si nécessaire
+    - Après la réponse : corrige l'estimation avec l'usage réel et
+      recalibre le limiteur avec les en-têtes x-ratelimit-*
+    - Si rate limit (429) malgré tout : pause du limiteur pendant le temps
+      indiqué par l'API, puis nouvel essai (max 3 fois)
     
     Args:
         prompt: Le prompt à envoyer à Groq
@@ -39,25 +210,56 @@ def call_groq(prompt, max_retries=3):
     if not client_groq:
         raise ValueError("❌ La clé API Groq n'est pas configurée dans .env")
     
+    tokens_estimes = estimer_tokens(prompt)
+    attente_totale = 0.0
+    
     for attempt in range(max_retries):
+        attente = limiteur_groq.reserver(tokens_estimes)
+        if attente > 0:
+            attente_totale += attente
+            time.sleep(attente)
+        
         try:
-            chat_completion = client_groq.chat.completions.create(
+            debut = time.perf_counter()
+            reponse_brute = client_groq.chat.completions.with_raw_response.create(
                 messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
-                temperature=0.3,
+                model=GROQ_MODEL,
+                temperature=GROQ_TEMPERATURE,
                 response_format={"type": "json_object"},
             )
+            limiteur_groq.recalibrer(reponse_brute.headers)
+            chat_completion = reponse_brute.parse()
+            
+            usage = getattr(chat_completion, "usage", None)
+            limiteur_groq.ajuster(tokens_estimes, usage.total_tokens if usage else tokens_estimes)
+            if usage:
+                calibrer_tokens(prompt, usage.prompt_tokens)
+            enregistrer_appel(
+                usage.prompt_tokens if usage else 0,
+                usage.completion_tokens if usage else 0,
+                time.perf_counter() - debut,
+                retries=attempt,
+                attente=attente_totale
+            )
+            
             return chat_completion.choices[0].message.content
             
         except Exception as e:
             error_str = str(e)
             
+            # Requête refusée : les tokens réservés n'ont pas été consommés
+            limiteur_groq.ajuster(tokens_estimes, 0)
+            headers = getattr(getattr(e, "response", None), "headers", None)
+            limiteur_groq.recalibrer(headers)
+            
             # Détecter le rate limit (429)
             if "rate_limit" in error_str.lower() or "429" in error_str:
                 # Extraire le temps d'attente suggéré
                 wait_time = 12  # Par défaut 12 secondes
                 
-                if "try again in" in error_str:
+                if headers and headers.get("retry-after"):
+                    wait_time = lire_duree(headers.get("retry-after")) + 1
+                elif "try again in" in error_str:
                     try:
                         # Extraire "try again in 10.44s"
                         parts = error_str.split("try again in ")[1].split("s")[0]
@@ -65,12 +267,52 @@ def call_groq(prompt, max_retries=3):
                     except:
                         pass
                 
+                # Tous les threads attendent la fin de la pause dans reserver()
+                limiteur_groq.penaliser(wait_time)
+                
                 if attempt < max_retries - 1:
                     print(f"    ⏳ Rate limit atteint, attente de {wait_time:.0f}s... (tentative {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
                 else:
                     print(f"    ❌ Rate limit persistant après {max_retries} tentatives")
                     raise
             else:
                 print(f"❌ Erreur Groq : {e}")
-                raise
\ No newline at end of file
+                raise
+
+
+# ====================================
+# ROUTEUR DES FOURNISSEURS
+# ====================================
+
+def _fournisseurs_configures() -> dict:
+    """Fournisseurs dont la clé API est présente"""
+    fournisseurs = {}
+    if client_groq:
+        fournisseurs["groq"] = _call_groq
+    if GEMINI_API_KEY:
+        fournisseurs["gemini"] = _call_gemini
+    return fournisseurs
+
+
+routeur = RouteurIA(
+    _fournisseurs_configures(),
+    failover=LLM_FAILOVER_ENABLED,
+    hedging=LLM_HEDGING_ENABLED,
+    delai_hedge_defaut=LLM_HEDGE_DELAI_DEFAUT
+)
+
+
+def _appeler_via_routeur(primaire: str, prompt: str) -> str:
+    """
+    Appelle `primaire` (ou un autre fournisseur si besoin) via le routeur.
+    
+    La réponse est mise en cache sous la clé du fournisseur demandé,
+    même si c'est l'autre fournisseur qui a répondu.
+    """
+    if primaire not in routeur.fournisseurs:
+        if not routeur.fournisseurs:
+            raise ValueError("❌ Aucune clé API d'IA (Groq ou Gemini) n'est configurée dans .env")
+        primaire = next(iter(routeur.fournisseurs))
+    
+    texte, _ = routeur.appeler(prompt, primaire)
+    return texte
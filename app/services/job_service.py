@@ -0,0 +1,378 @@
+"""
+Corrections en tâche de fond
+- POST /corriger rend la main tout de suite avec l'identifiant de la tâche
+- Progression par copie et par question, ETA, résultats partiels
+- Annulation : les corrections en file sont abandonnées, celles en cours
+  se terminent
+- Une seule tâche active par session : une nouvelle demande (rechargement
+  de page, double clic) est rattachée à la tâche existante
+- Plusieurs workers : un bail par session (un seul worker la corrige),
+  état des tâches publié dans l'état partagé, métriques IA comprises
+  (n'importe quel worker répond à GET /taches/{id} et relaie l'annulation)
+"""
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.config import CORRECTION_TACHES_PARALLELES, SESSION_BAIL_SECONDES, TACHES_RETENTION_SECONDES
+from app.database import depot_sessions
+from app.services.correction_service import lancer_correction_automatique, SuiviCorrection, CorrectionAnnulee
+from app.services.groq_client import get_llm_cache_stats
+from app.services.metrics_service import get_metriques
+from app.services.state_service import etat_partage, WORKER_ID
+
+STATUTS_ACTIFS = ("en_attente", "en_cours", "annulation")
+
+# Intervalle minimal (s) entre deux publications de la progression, ou deux
+# lectures de la demande d'annulation, dans l'état partagé
+INTERVALLE_PARTAGE = 1.0
+
+
+def _bail_session(session_id: str) -> str:
+    return f"correction:{session_id}"
+
+
+class TacheCorrection(SuiviCorrection):
+    """Correction d'une session exécutée en arrière-plan"""
+
+    def __init__(self, session_id: str):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.worker = WORKER_ID
+        self.statut = "en_attente"
+        self.etape_courante = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.erreur = None
+        self.resultats = None
+        self._annulation = threading.Event()
+        self._verrou = threading.Lock()
+        self._copies = []
+        self._resultats_partiels = {}
+        self._debut_copies = None
+        self._derniere_publication = 0.0
+        self._derniere_verification = 0.0
+
+    @property
+    def proprietaire(self) -> str:
+        """Propriétaire du bail de la session"""
+        return f"{self.worker}:{self.id}"
+
+    # ------------------------------------------------------------------
+    # SuiviCorrection (appelé depuis les threads de la correction)
+    # ------------------------------------------------------------------
+
+    def annulee(self) -> bool:
+        if self._annulation.is_set():
+            return True
+        # Annulation demandée à un autre worker
+        maintenant = time.monotonic()
+        if maintenant - self._derniere_verification >= INTERVALLE_PARTAGE:
+            self._derniere_verification = maintenant
+            if etat_partage.get(f"annulation:{self.id}"):
+                self.demander_annulation()
+                return True
+        return False
+
+    def etape(self, nom: str) -> None:
+        with self._verrou:
+            self.etape_courante = nom
+        self.publier()
+        super().etape(nom)
+
+    def debut_copies(self, copies: list, nb_questions: int) -> None:
+        with self._verrou:
+            self._debut_copies = time.monotonic()
+            self._copies = [
+                {
+                    "nom_eleve": copie.get("nom_eleve", "Élève Inconnu"),
+                    "questions_total": nb_questions,
+                    "questions_terminees": 0,
+                    "statut": "en_cours",
+                }
+                for copie in copies
+            ]
+        self.publier()
+
+    def questions_terminees(self, idx: int, nombre: int) -> None:
+        with self._verrou:
+            copie = self._copies[idx]
+            copie["questions_terminees"] = min(copie["questions_total"], copie["questions_terminees"] + nombre)
+        self.publier(forcer=False)
+
+    def copie_terminee(self, idx: int, resultat: dict) -> None:
+        with self._verrou:
+            self._copies[idx]["statut"] = "erreur" if "erreur" in resultat else "terminee"
+            self._resultats_partiels[idx] = resultat
+        self.publier(forcer=False)
+
+    def detient_session(self) -> bool:
+        return etat_partage.proprietaire_bail(_bail_session(self.session_id)) == self.proprietaire
+
+    # ------------------------------------------------------------------
+    # Pilotage
+    # ------------------------------------------------------------------
+
+    def demander_annulation(self) -> None:
+        self._annulation.set()
+        with self._verrou:
+            if self.statut in ("en_attente", "en_cours"):
+                self.statut = "annulation"
+        self.publier()
+
+    def active(self) -> bool:
+        return self.statut in STATUTS_ACTIFS
+
+    def publier(self, forcer: bool = True) -> None:
+        """État courant dans l'état partagé (au plus une fois par seconde si forcer=False)"""
+        maintenant = time.monotonic()
+        if not forcer and maintenant - self._derniere_publication < INTERVALLE_PARTAGE:
+            return
+        self._derniere_publication = maintenant
+        etat_partage.set(f"tache:{self.id}", self.statut_detaille(), ttl=TACHES_RETENTION_SECONDES)
+
+    def _eta(self):
+        """Temps restant estimé (s) d'après le rythme des questions déjà traitées"""
+        if self._debut_copies is None:
+            return None
+        faites = sum(c["questions_terminees"] for c in self._copies)
+        total = sum(c["questions_total"] for c in self._copies)
+        if not faites or faites >= total:
+            return 0.0 if total and faites >= total else None
+        ecoule = time.monotonic() - self._debut_copies
+        return round(ecoule * (total - faites) / faites, 1)
+
+    def statut_detaille(self, avec_resultats: bool = True) -> dict:
+        metriques = get_metriques(self.session_id)
+        with self._verrou:
+            questions_faites = sum(c["questions_terminees"] for c in self._copies)
+            questions_total = sum(c["questions_total"] for c in self._copies)
+            etat = {
+                "job_id": self.id,
+                "session_id": self.session_id,
+                "worker": self.worker,
+                "statut": self.statut,
+                "etape": self.etape_courante,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "progression": {
+                    "copies_total": len(self._copies),
+                    "copies_terminees": len(self._resultats_partiels),
+                    "questions_total": questions_total,
+                    "questions_terminees": questions_faites,
+                    "pourcentage": round(100 * questions_faites / questions_total, 1) if questions_total else 0.0,
+                },
+                "eta_s": self._eta() if self.statut == "en_cours" else None,
+                "erreur": self.erreur,
+                "metriques": metriques,
+            }
+            if avec_resultats:
+                etat["copies"] = [dict(c) for c in self._copies]
+                etat["resultats"] = self.resultats if self.resultats is not None else [
+                    self._resultats_partiels[i] for i in sorted(self._resultats_partiels)
+                ]
+            return etat
+
+
+def _sans_resultats(etat: dict) -> dict:
+    return {cle: valeur for cle, valeur in etat.items() if cle not in ("copies", "resultats")}
+
+
+class GestionnaireTaches:
+    """
+    Tâches de correction de ce worker (CORRECTION_TACHES_PARALLELES à la fois)
+    et vue sur celles des autres workers via l'état partagé.
+
+    Les méthodes de consultation retournent l'état publié (dict).
+    """
+
+    def __init__(self, max_paralleles: int):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_paralleles), thread_name_prefix="correction")
+        self._verrou = threading.Lock()
+        # Tâches actives de ce worker (les terminées restent consultables dans l'état partagé)
+        self.taches = {}
+        self._entretien = None
+        self._verrou_entretien = threading.Lock()
+
+    def soumettre(self, session_id: str) -> tuple:
+        """
+        Lance la correction de la session en arrière-plan.
+
+        Returns:
+            (état de la tâche, True si une tâche active existait déjà pour
+            la session, sur ce worker ou un autre)
+        """
+        with self._verrou:
+            existante = self.tache_de_session(session_id, avec_resultats=False)
+            if existante and existante["statut"] in STATUTS_ACTIFS:
+                return existante, True
+
+            tache = TacheCorrection(session_id)
+            if not etat_partage.acquerir_bail(_bail_session(session_id), tache.proprietaire, SESSION_BAIL_SECONDES):
+                # Un autre worker vient de prendre la session
+                existante = self.tache_de_session(session_id, avec_resultats=False)
+                if existante:
+                    return existante, True
+                raise RuntimeError("Session en cours de correction sur un autre worker.")
+
+            self.taches[tache.id] = tache
+            etat_partage.set(f"session_tache:{session_id}", tache.id, ttl=TACHES_RETENTION_SECONDES)
+            tache.publier()
+            depot_sessions.changer_statut(session_id, "correcting")
+            self._demarrer_entretien()
+
+        self._executor.submit(self._executer, tache)
+        return tache.statut_detaille(avec_resultats=False), False
+
+    def _executer(self, tache: TacheCorrection) -> None:
+        if tache.annulee() or not depot_sessions.existe(tache.session_id):
+            self._terminer(tache, "annulee", statut_session="ready_to_correct")
+            return
+
+        with tache._verrou:
+            if tache.statut == "en_attente":
+                tache.statut = "en_cours"
+            tache.started_at = datetime.now().isoformat()
+        tache.publier()
+
+        try:
+            resultats = lancer_correction_automatique(tache.session_id, tache)
+        except CorrectionAnnulee as e:
+            print(f"🛑 {e}")
+            self._terminer(tache, "annulee", statut_session="ready_to_correct")
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self._terminer(tache, "erreur", erreur=str(e), statut_session="ready_to_correct")
+            return
+
+        if isinstance(resultats, dict) and "error" in resultats:
+            self._terminer(tache, "erreur", erreur=resultats["error"], statut_session="ready_to_correct")
+        else:
+            tache.resultats = resultats
+            self._terminer(tache, "terminee")
+
+    def _terminer(self, tache: TacheCorrection, statut: str, erreur: str = None, statut_session: str = None):
+        with tache._verrou:
+            tache.statut = statut
+            tache.erreur = erreur
+            tache.finished_at = datetime.now().isoformat()
+        # Bail perdu (worker figé, volume partagé indisponible) : la session
+        # appartient peut-être déjà à la correction d'un autre worker
+        detient_session = tache.detient_session()
+        if statut_session and detient_session:
+            # Seulement si la correction n'a pas déjà enregistré un autre statut
+            depot_sessions.changer_statut(tache.session_id, statut_session, depuis=("correcting",))
+            # Appels IA déjà faits (et payés) : gardés pour la prochaine correction
+            metriques = get_metriques(tache.session_id)
+            depot_sessions.mettre_a_jour(tache.session_id, metriques=metriques,
+                                         cache_llm=get_llm_cache_stats(metriques=metriques))
+        elif statut_session:
+            print(f"⚠️ Bail de la session {tache.session_id} perdu : session laissée à son nouveau propriétaire")
+        tache.publier()
+        etat_partage.supprimer(f"annulation:{tache.id}")
+        if detient_session:
+            etat_partage.liberer_bail(_bail_session(tache.session_id), tache.proprietaire)
+        with self._verrou:
+            self.taches.pop(tache.id, None)
+
+    # ------------------------------------------------------------------
+    # Baux des sessions
+    # ------------------------------------------------------------------
+
+    def _demarrer_entretien(self) -> None:
+        """Thread de renouvellement des baux, (re)lancé s'il n'est pas vivant"""
+        with self._verrou_entretien:
+            if self._entretien is None or not self._entretien.is_alive():
+                self._entretien = threading.Thread(target=self._entretenir_baux, name="baux-sessions", daemon=True)
+                self._entretien.start()
+
+    def _entretenir_baux(self) -> None:
+        # Une erreur passagère (volume partagé indisponible, timeout du verrou
+        # fichier...) ne doit pas arrêter le thread : les baux expireraient et
+        # un autre worker reprendrait des sessions encore en cours ici
+        while True:
+            time.sleep(SESSION_BAIL_SECONDES / 3)
+            with self._verrou:
+                taches = list(self.taches.values())
+            for tache in taches:
+                if not tache.active():
+                    continue
+                try:
+                    if not etat_partage.renouveler_bail(_bail_session(tache.session_id), tache.proprietaire,
+                                                        SESSION_BAIL_SECONDES):
+                        print(f"⚠️ Bail de la session {tache.session_id} perdu : correction annulée sur ce worker")
+                        tache.demander_annulation()
+                except Exception as e:
+                    print(f"⚠️ Bail de la session {tache.session_id} non renouvelé : {e}")
+                    traceback.print_exc()
+            try:
+                etat_partage.purger()
+            except Exception as e:
+                print(f"⚠️ Purge de l'état partagé impossible : {e}")
+
+    def reprendre_interrompues(self) -> int:
+        """
+        Sessions restées "correcting" sans bail actif (worker arrêté en pleine
+        correction) : remises à ready_to_correct, relançables (journal de reprise).
+        """
+        reprises = 0
+        for session in depot_sessions.lister(status="correcting", limite=10000):
+            if etat_partage.proprietaire_bail(_bail_session(session["id"])) is None:
+                reprises += depot_sessions.changer_statut(
+                    session["id"], "ready_to_correct", depuis=("correcting",)) is not None
+        return reprises
+
+    # ------------------------------------------------------------------
+    # Consultation (toutes les tâches, quel que soit le worker)
+    # ------------------------------------------------------------------
+
+    def statut(self, job_id: str, avec_resultats: bool = True):
+        """État de la tâche, ou None si inconnue"""
+        if self.taches:
+            # Filet de sécurité : thread des baux arrêté alors que des tâches tournent
+            self._demarrer_entretien()
+        tache = self.taches.get(job_id)
+        if tache:
+            return tache.statut_detaille(avec_resultats)
+
+        etat = etat_partage.get(f"tache:{job_id}")
+        if etat is None:
+            return None
+        if etat["statut"] in STATUTS_ACTIFS and etat_partage.proprietaire_bail(_bail_session(etat["session_id"])) is None:
+            # Le worker qui la portait s'est arrêté sans la terminer. Lecture
+            # seule : la session est remise à ready_to_correct par
+            # reprendre_interrompues, ou par une nouvelle demande de correction
+            etat["statut"] = "interrompue"
+        return etat if avec_resultats else _sans_resultats(etat)
+
+    def tache_de_session(self, session_id: str, avec_resultats: bool = True):
+        job_id = etat_partage.get(f"session_tache:{session_id}")
+        return self.statut(job_id, avec_resultats) if job_id else None
+
+    def annuler(self, job_id: str):
+        """Demande l'annulation (relayée au worker qui porte la tâche) ; None si inconnue"""
+        tache = self.taches.get(job_id)
+        if tache:
+            if tache.active():
+                tache.demander_annulation()
+            return tache.statut_detaille(avec_resultats=False)
+
+        etat = self.statut(job_id, avec_resultats=False)
+        if etat and etat["statut"] in STATUTS_ACTIFS:
+            etat_partage.set(f"annulation:{job_id}", True, ttl=TACHES_RETENTION_SECONDES)
+        return etat
+
+    def lister(self) -> list:
+        return sorted(
+            (_sans_resultats(etat) for etat in etat_partage.lister("tache:").values()),
+            key=lambda etat: etat["created_at"], reverse=True
+        )
+
+
+gestionnaire_taches = GestionnaireTaches(CORRECTION_TACHES_PARALLELES)
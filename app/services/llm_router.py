@@ -0,0 +1,218 @@
+"""
+Routeur des fournisseurs d'IA (Groq, Gemini)
+- Santé et latences suivies par fournisseur (p95 glissant)
+- Bascule (failover) sur l'autre fournisseur en cas d'erreur ou de rate limit
+- Requêtes « couvertes » (hedging, optionnel) : si le fournisseur principal
+  n'a pas répondu au bout de son p95 observé, un doublon part vers le
+  secondaire et la première réponse l'emporte
+- Un fournisseur en échec répété ou rate-limité passe en dernier
+  pendant une pause, au lieu de bloquer toute la correction
+"""
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class AucunFournisseurError(Exception):
+    """Aucun fournisseur d'IA n'a pu répondre"""
+
+
+def est_rate_limit(erreur: Exception) -> bool:
+    """429 Groq (RateLimitError) ou quota Gemini (ResourceExhausted)"""
+    texte = f"{type(erreur).__name__} {erreur}".lower()
+    return any(marque in texte for marque in ("rate_limit", "ratelimit", "429", "resourceexhausted", "quota"))
+
+
+class SanteFournisseur:
+    """Statistiques glissantes d'un fournisseur"""
+
+    def __init__(self, nom: str, taille_fenetre: int = 100):
+        self.nom = nom
+        self.latences = deque(maxlen=taille_fenetre)
+        self.succes = 0
+        self.echecs = 0
+        self.rate_limits = 0
+        self.echecs_consecutifs = 0
+        self.pause_jusqua = 0.0
+        self.victoires_hedge = 0
+
+    def p95(self, minimum_echantillons: int = 5):
+        """95e percentile des latences réussies, None si trop peu de mesures"""
+        if len(self.latences) < minimum_echantillons:
+            return None
+        triees = sorted(self.latences)
+        return triees[min(len(triees) - 1, int(len(triees) * 0.95))]
+
+    def disponible(self) -> bool:
+        return time.monotonic() >= self.pause_jusqua
+
+    def statut(self) -> dict:
+        p95 = self.p95()
+        return {
+            "succes": self.succes,
+            "echecs": self.echecs,
+            "rate_limits": self.rate_limits,
+            "echecs_consecutifs": self.echecs_consecutifs,
+            "disponible": self.disponible(),
+            "pause_restante_s": round(max(0.0, self.pause_jusqua - time.monotonic()), 1),
+            "latence_moyenne_s": round(sum(self.latences) / len(self.latences), 3) if self.latences else None,
+            "latence_p95_s": round(p95, 3) if p95 is not None else None,
+            "victoires_hedge": self.victoires_hedge,
+        }
+
+
+class RouteurIA:
+    """
+    Choisit le fournisseur de chaque appel et gère bascule + hedging.
+
+    Args:
+        fournisseurs: {nom: fonction(prompt, max_retries) -> texte}
+        failover: essayer les autres fournisseurs si le principal échoue
+        hedging: doubler la requête vers le secondaire au-delà du p95
+        delai_hedge_defaut: délai de hedging tant que le p95 n'est pas connu (s)
+        pause_rate_limit: pause d'un fournisseur après un rate limit (s)
+        max_echecs / pause_echecs: pause après N échecs consécutifs (s)
+    """
+
+    def __init__(self, fournisseurs: dict, failover: bool = True, hedging: bool = False,
+                 delai_hedge_defaut: float = 10.0, pause_rate_limit: float = 15.0,
+                 max_echecs: int = 3, pause_echecs: float = 30.0, max_workers: int = 16):
+        self.fournisseurs = fournisseurs
+        self.failover = failover
+        self.hedging = hedging
+        self.delai_hedge_defaut = delai_hedge_defaut
+        self.pause_rate_limit = pause_rate_limit
+        self.max_echecs = max_echecs
+        self.pause_echecs = pause_echecs
+        self.sante = {nom: SanteFournisseur(nom) for nom in fournisseurs}
+        self._verrou = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="routeur-ia")
+        self.stats = {"appels": 0, "bascules": 0, "hedges": 0}
+
+    # ------------------------------------------------------------------
+    # Santé
+    # ------------------------------------------------------------------
+
+    def _ordre(self, primaire: str) -> list:
+        """Principal d'abord, fournisseurs en pause en dernier"""
+        noms = [primaire] + [nom for nom in self.fournisseurs if nom != primaire]
+        if not self.failover:
+            return noms[:1]
+        with self._verrou:
+            return sorted(noms, key=lambda nom: not self.sante[nom].disponible())
+
+    def _succes(self, nom: str, latence: float) -> None:
+        with self._verrou:
+            sante = self.sante[nom]
+            sante.succes += 1
+            sante.echecs_consecutifs = 0
+            sante.latences.append(latence)
+
+    def _echec(self, nom: str, erreur: Exception) -> None:
+        with self._verrou:
+            sante = self.sante[nom]
+            sante.echecs += 1
+            sante.echecs_consecutifs += 1
+            if est_rate_limit(erreur):
+                sante.rate_limits += 1
+                sante.pause_jusqua = time.monotonic() + self.pause_rate_limit
+            elif sante.echecs_consecutifs >= self.max_echecs:
+                sante.pause_jusqua = time.monotonic() + self.pause_echecs
+
+    def _delai_hedge(self, nom: str) -> float:
+        with self._verrou:
+            p95 = self.sante[nom].p95()
+        return p95 if p95 is not None else self.delai_hedge_defaut
+
+    # ------------------------------------------------------------------
+    # Appels
+    # ------------------------------------------------------------------
+
+    def _executer(self, nom: str, prompt: str, max_retries: int) -> str:
+        """Appel mesuré d'un fournisseur (exécuté dans le pool du routeur)"""
+        debut = time.perf_counter()
+        try:
+            texte = self.fournisseurs[nom](prompt, max_retries)
+        except Exception as e:
+            self._echec(nom, e)
+            raise
+        self._succes(nom, time.perf_counter() - debut)
+        return texte
+
+    def _soumettre(self, nom: str, prompt: str, max_retries: int):
+        # Copie du contexte : session et étape suivent l'appel (métriques)
+        return self._executor.submit(contextvars.copy_context().run, self._executer, nom, prompt, max_retries)
+
+    def _appel_couvert(self, principal: str, secondaire: str, prompt: str, max_retries: int):
+        """Principal, puis doublon vers le secondaire s'il dépasse son p95"""
+        futures = {self._soumettre(principal, prompt, max_retries): principal}
+        termines, _ = wait(futures, timeout=self._delai_hedge(principal))
+
+        if not termines:
+            with self._verrou:
+                self.stats["hedges"] += 1
+            print(f"    🏁 {principal} lent (> p95), doublon vers {secondaire}")
+            futures[self._soumettre(secondaire, prompt, 1)] = secondaire
+
+        derniere_erreur = None
+        en_attente = set(futures)
+        while en_attente:
+            termines, en_attente = wait(en_attente, return_when=FIRST_COMPLETED)
+            for future in termines:
+                try:
+                    texte = future.result()
+                except Exception as e:
+                    derniere_erreur = e
+                    continue
+                if len(futures) > 1:
+                    with self._verrou:
+                        self.sante[futures[future]].victoires_hedge += 1
+                # La requête perdante continue en arrière-plan, sa réponse est ignorée
+                return texte, futures[future]
+
+        raise derniere_erreur
+
+    def appeler(self, prompt: str, primaire: str) -> tuple:
+        """
+        Envoie le prompt au meilleur fournisseur disponible.
+
+        Chaque fournisseur n'a droit qu'à une tentative tant qu'il reste
+        une alternative ; le dernier de la liste garde tous ses retries.
+
+        Returns:
+            (texte, nom du fournisseur qui a répondu)
+
+        Raises:
+            AucunFournisseurError si tous les fournisseurs ont échoué
+        """
+        with self._verrou:
+            self.stats["appels"] += 1
+        ordre = self._ordre(primaire)
+        erreurs = []
+
+        for i, nom in enumerate(ordre):
+            dernier = i == len(ordre) - 1
+            max_retries = 3 if dernier else 1
+            try:
+                if self.hedging and not dernier:
+                    return self._appel_couvert(nom, ordre[i + 1], prompt, max_retries)
+                return self._soumettre(nom, prompt, max_retries).result(), nom
+            except Exception as e:
+                erreurs.append(f"{nom} : {e}")
+                if not dernier:
+                    with self._verrou:
+                        self.stats["bascules"] += 1
+                    print(f"    🔀 {nom} indisponible ({e}), bascule vers {ordre[i + 1]}")
+
+        raise AucunFournisseurError(" | ".join(erreurs))
+
+    def statut(self) -> dict:
+        with self._verrou:
+            return {
+                **self.stats,
+                "failover": self.failover,
+                "hedging": self.hedging,
+                "fournisseurs": {nom: sante.statut() for nom, sante in self.sante.items()},
+            }
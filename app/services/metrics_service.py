@@ -0,0 +1,170 @@
+"""
+Métriques des appels IA par session et par étape
+- Tokens RÉELS (usage renvoyé par Groq / Gemini), pas une estimation
+- Latence, retries, attente du limiteur, hits du cache IA
+- Sûr entre threads : un verrou protège tout le registre
+- Registre propre au processus : les métriques sont enregistrées avec la
+  session (upload, fin de correction) et publiées avec l'état de la tâche
+  pour les autres workers ; charger_metriques reprend les compteurs enregistrés
+
+La session et l'étape courantes sont portées par des ContextVar :
+les services IA n'ont rien à transmettre, il suffit d'entourer les
+appels de `suivre_session(...)` et `etape(...)`. Pour un pool de
+threads, soumettre via contextvars.copy_context().run.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+ETAPES = {
+    "extraction_nom": "🔍 Extraction nom/classe",
+    "decoupage_questions": "✂️  Découpage questions ",
+    "bareme": "📋 Extraction barème    ",
+    "correction": "✅ Correction copies    ",
+    "autre": "❔ Autre                 ",
+}
+
+session_courante = ContextVar("session_courante", default=None)
+etape_courante = ContextVar("etape_courante", default="autre")
+
+_metriques = {}
+_verrou = threading.Lock()
+
+
+def _compteurs_vides() -> dict:
+    return {
+        "appels": 0,
+        "tokens_prompt": 0,
+        "tokens_completion": 0,
+        "tokens_total": 0,
+        "latence_totale_s": 0.0,
+        "latence_max_s": 0.0,
+        "retries": 0,
+        "attente_limiteur_s": 0.0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+    }
+
+
+@contextmanager
+def suivre_session(session_id: str):
+    """Rattache les appels IA du bloc à une session"""
+    jeton = session_courante.set(session_id)
+    try:
+        yield
+    finally:
+        session_courante.reset(jeton)
+
+
+@contextmanager
+def etape(nom: str):
+    """Rattache les appels IA du bloc à une étape (clé de ETAPES)"""
+    jeton = etape_courante.set(nom)
+    try:
+        yield
+    finally:
+        etape_courante.reset(jeton)
+
+
+def _compteurs_courants():
+    """Compteurs de (session, étape) courantes, None hors session (appelé sous verrou)"""
+    session_id = session_courante.get()
+    if session_id is None:
+        return None
+    etapes = _metriques.setdefault(session_id, {})
+    return etapes.setdefault(etape_courante.get(), _compteurs_vides())
+
+
+def enregistrer_appel(tokens_prompt: int, tokens_completion: int, latence: float,
+                      retries: int = 0, attente: float = 0.0) -> None:
+    """Enregistre un appel fournisseur terminé (usage réel de la réponse)"""
+    with _verrou:
+        compteurs = _compteurs_courants()
+        if compteurs is None:
+            return
+        compteurs["appels"] += 1
+        compteurs["tokens_prompt"] += tokens_prompt
+        compteurs["tokens_completion"] += tokens_completion
+        compteurs["tokens_total"] += tokens_prompt + tokens_completion
+        compteurs["latence_totale_s"] += latence
+        compteurs["latence_max_s"] = max(compteurs["latence_max_s"], latence)
+        compteurs["retries"] += retries
+        compteurs["attente_limiteur_s"] += attente
+
+
+def enregistrer_cache(hit: bool) -> None:
+    """Enregistre un accès au cache IA"""
+    with _verrou:
+        compteurs = _compteurs_courants()
+        if compteurs is not None:
+            compteurs["cache_hits" if hit else "cache_misses"] += 1
+
+
+def _arrondir(compteurs: dict) -> dict:
+    resultat = {cle: round(v, 3) if isinstance(v, float) else v for cle, v in compteurs.items()}
+    resultat["latence_moyenne_s"] = round(compteurs["latence_totale_s"] / compteurs["appels"], 3) \
+        if compteurs["appels"] else 0.0
+    acces_cache = compteurs["cache_hits"] + compteurs["cache_misses"]
+    resultat["taux_hit_cache"] = round(compteurs["cache_hits"] / acces_cache, 3) if acces_cache else 0.0
+    return resultat
+
+
+def get_metriques(session_id: str) -> dict:
+    """Métriques d'une session : par étape et total"""
+    with _verrou:
+        etapes = {nom: dict(c) for nom, c in _metriques.get(session_id, {}).items()}
+
+    total = _compteurs_vides()
+    for compteurs in etapes.values():
+        for cle, valeur in compteurs.items():
+            total[cle] = max(total[cle], valeur) if cle == "latence_max_s" else total[cle] + valeur
+
+    return {
+        "par_etape": {nom: _arrondir(c) for nom, c in etapes.items()},
+        "total": _arrondir(total),
+    }
+
+
+def charger_metriques(session_id: str, metriques) -> None:
+    """
+    Remplace les compteurs de la session par ceux enregistrés (résultat de
+    get_metriques, ex. upload traité par un autre worker) : les appels
+    suivants s'y ajoutent.
+    """
+    etapes = {}
+    for nom, compteurs in ((metriques or {}).get("par_etape") or {}).items():
+        etapes[nom] = {cle: compteurs.get(cle, valeur) for cle, valeur in _compteurs_vides().items()}
+    with _verrou:
+        _metriques[session_id] = etapes
+
+
+def supprimer_metriques(session_id: str) -> None:
+    with _verrou:
+        _metriques.pop(session_id, None)
+
+
+def print_resume_metriques(session_id: str) -> None:
+    """Affiche le résumé de l'usage des tokens d'une session."""
+    metriques = get_metriques(session_id)
+    total = metriques["total"]
+
+    if total["appels"] == 0 and total["cache_hits"] == 0:
+        print("\n📊 Aucun appel IA")
+        return
+
+    print("\n" + "=" * 60)
+    print("📊 RÉSUMÉ DE L'USAGE DES TOKENS (usage réel fournisseur)")
+    print("=" * 60)
+    for nom, libelle in ETAPES.items():
+        c = metriques["par_etape"].get(nom)
+        if not c:
+            continue
+        part = c["tokens_total"] / total["tokens_total"] * 100 if total["tokens_total"] else 0.0
+        print(f"  {libelle}: {c['tokens_total']:>8,} tokens ({part:>5.1f}%)  "
+              f"{c['appels']} appel(s), {c['latence_moyenne_s']:.2f}s moy., {c['cache_hits']} en cache")
+    print(f"  {'─'*58}")
+    print(f"  📈 TOTAL                 : {total['tokens_total']:>8,} tokens "
+          f"({total['tokens_prompt']:,} prompt + {total['tokens_completion']:,} réponse)")
+    print(f"  🔁 Retries : {total['retries']}  |  ⏳ Attente limiteur : {total['attente_limiteur_s']:.1f}s")
+    print(f"  💰 Coût estimé Groq      : ${total['tokens_total'] * 0.0000001:.6f}")
+    print("=" * 60 + "\n")
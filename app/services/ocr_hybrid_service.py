@@ -6,26 +6,88 @@ Service OCR HYBRIDE INTELLIGENT
 - Support PDF + IMAGES (JPG, PNG)
 """
 import os
+import time
+import io
+import sys
 import cv2
 import numpy as np
-import pytesseract
-import requests
 from PIL import Image
 from pdf2image import convert_from_path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from dotenv import load_dotenv
 
+from app.config import (
+    OCR_WORKERS, PDF_RASTER_WINDOW, OCRSPACE_MAX_PAGES, OCRSPACE_MAX_FILE_KB,
+    OCR_DETECTION_MODE, OCR_DETECTION_DPI, OCR_DETECTION_SEUIL_CV, OCRSPACE_MONTHLY_LIMIT,
+    TESSERACT_ENGINE, PDF_TEXT_LAYER_ENABLED, PDF_RASTER_ENGINE,
+    CACHE_FOLDER, OCR_CACHE_ENABLED, OCR_CACHE_MAX_MB
+)
+from app.services.cache_service import DiskCache, hash_fichier, construire_cle
+from app.services.quota_service import ledger
+from app.services.tesseract_engine import get_moteur
+from app.services.pdfium_service import extraire_pages_texte_natif, compter_pages, rendre_page, iter_rendus
+from app.services.ocrspace_client import ocrspace_parse, ocrspace_parse_many, OCRSpaceError
+
 load_dotenv()
 
 # ====================================
 # CONFIGURATION
 # ====================================
 
-USAGE_FILE = "ocr_usage.txt"
-API_KEY = os.getenv("OCRSPACE_API_KEY", "K87899142388957")
-MONTHLY_LIMIT = 25000
-TESSERACT_PATH = os.getenv("TESSERACT_PATH", "tesseract")
-pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+MONTHLY_LIMIT = OCRSPACE_MONTHLY_LIMIT
+
+# Cache persistant des résultats OCR
+# ⚠️ Incrémenter OCR_CACHE_VERSION si le pipeline OCR change de résultat
+OCR_CACHE_VERSION = 4
+ocr_cache = DiskCache(os.path.join(CACHE_FOLDER, "ocr"), OCR_CACHE_MAX_MB * 1024 * 1024)
+
+
+def get_ocr_cache_stats():
+    """Retourne les compteurs du cache OCR."""
+    return ocr_cache.stats()
+
+
+def _avec_cache_ocr(file_path: str, force_mode, extraire, **parametres) -> tuple:
+    """
+    Exécute `extraire()` → (texte, stats) sauf si le même fichier a déjà
+    été traité avec le même mode et les mêmes paramètres OCR.
+    
+    Un résultat vide (échec) n'est jamais mis en cache, ni un résultat
+    dont des pages ont échoué (stats["pages_en_echec"] : quota, réseau,
+    erreur Tesseract...) : le prochain essai les refera.
+    
+    Returns:
+        (texte, statistiques de CET appel, "cache": True si aucun OCR)
+    """
+    if not OCR_CACHE_ENABLED:
+        texte, stats = extraire()
+        return texte, {"cache": False, **stats}
+    
+    cle = construire_cle(
+        "ocr", OCR_CACHE_VERSION, hash_fichier(file_path),
+        force_mode or "auto", "fra", parametres
+    )
+    
+    entree = ocr_cache.get(cle)
+    if entree is not None:
+        print(f"  ♻️  Résultat OCR en cache (aucun OCR, aucun quota)")
+        return entree["texte"], {"cache": True}
+    
+    texte, stats = extraire()
+    
+    if stats.get("pages_en_echec"):
+        print(f"  ⚠️ Page(s) {stats['pages_en_echec']} en échec : résultat OCR non mis en cache")
+    elif texte:
+        ocr_cache.set(cle, {
+            "texte": texte,
+            "fichier": os.path.basename(file_path),
+            "date": datetime.now().isoformat()
+        })
+    
+    return texte, {"cache": False, **stats}
 
 
 # ====================================
@@ -34,42 +96,23 @@ pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
 def get_usage_count():
     """Lit le compteur d'usage du mois en cours"""
-    if not os.path.exists(USAGE_FILE):
-        return 0, datetime.now().strftime("%Y-%m")
-    
-    try:
-        with open(USAGE_FILE, 'r') as f:
-            lines = f.readlines()
-            if len(lines) < 2:
-                return 0, datetime.now().strftime("%Y-%m")
-            count = int(lines[0].strip())
-            month = lines[1].strip()
-            return count, month
-    except:
-        return 0, datetime.now().strftime("%Y-%m")
+    statut = ledger.statut()
+    return statut["utilisees"], statut["mois"]
 
 
 def update_usage():
-    """Incrémente le compteur OCR.space"""
-    current_month = datetime.now().strftime("%Y-%m")
-    count, saved_month = get_usage_count()
-    
-    if current_month != saved_month:
-        count = 0
-    
-    count += 1
-    
-    with open(USAGE_FILE, 'w') as f:
-        f.write(f"{count}\n")
-        f.write(f"{current_month}\n")
-    
-    return count
+    """Incrémente le compteur OCR.space (atomique, sûr entre processus)"""
+    return ledger.incrementer()
 
 
 def get_remaining_quota():
     """Retourne le nombre de requêtes restantes ce mois"""
-    count, _ = get_usage_count()
-    return MONTHLY_LIMIT - count
+    return ledger.statut()["restantes"]
+
+
+def get_quota_status():
+    """Usage, budget restant et attente du limiteur OCR.space"""
+    return ledger.statut()
 
 
 def print_quota_status():
@@ -100,56 +143,204 @@ def print_quota_status():
 # DÉTECTION TYPE DE DOCUMENT
 # ====================================
 
-def detect_document_type(image: Image.Image) -> str:
+def _texte_depuis_donnees(data: dict) -> str:
+    """Reconstruit le texte (lignes et paragraphes) depuis image_to_data"""
+    lignes = []
+    ligne_precedente = None
+    
+    for i, mot in enumerate(data['text']):
+        if not mot or not mot.strip():
+            continue
+        
+        ligne = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        
+        if ligne == ligne_precedente:
+            lignes[-1] += " " + mot
+        else:
+            # Nouveau paragraphe → ligne vide, comme image_to_string
+            if ligne_precedente is not None and ligne[:2] != ligne_precedente[:2]:
+                lignes.append("")
+            lignes.append(mot)
+        
+        ligne_precedente = ligne
+    
+    return "\n".join(lignes)
+
+
+def _en_tableau(image) -> np.ndarray:
+    """Page PIL ou tableau NumPy (rendu pdfium) → tableau NumPy"""
+    if isinstance(image, np.ndarray):
+        return image
+    return np.array(image if image.mode == 'L' else image.convert('RGB'))
+
+
+def _en_image(image) -> Image.Image:
+    """Page PIL ou tableau NumPy (rendu pdfium) → image PIL"""
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return image
+
+
+def analyser_page_tesseract(image: Image.Image) -> dict:
     """
-    Détecte si une image contient du texte MANUSCRIT ou IMPRIMÉ.
+    Analyse une page avec UNE SEULE passe Tesseract.
+    
+    La même passe fournit le verdict imprimé/manuscrit, le texte reconnu
+    et les mots (boîtes + confiances) : une page imprimée n'a pas besoin
+    d'un second OCR.
     
     Returns:
-        "printed" ou "handwritten"
+        {"type": "printed" | "handwritten", "confiance": float,
+         "texte": str, "mots": [{"texte", "conf", "box"}]}
     """
+    analyse = {"type": "handwritten", "confiance": 0.0, "texte": "", "mots": []}
+    
     try:
-        open_cv_image = np.array(image.convert('RGB'))
-        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_RGB2GRAY)
+        preprocessed = preprocess_array_for_tesseract(_en_tableau(image))
+        data = get_moteur().donnees(preprocessed, lang='fra')
         
-        data = pytesseract.image_to_data(gray, lang='fra', output_type=pytesseract.Output.DICT)
+        for i, mot in enumerate(data['text']):
+            conf = float(data['conf'][i])
+            if conf > 0 and mot.strip():
+                analyse["mots"].append({
+                    "texte": mot,
+                    "conf": conf,
+                    "box": (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+                })
         
-        confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
+        analyse["texte"] = _texte_depuis_donnees(data)
         
-        if not confidences:
-            return "handwritten"
+        if not analyse["mots"]:
+            return analyse
         
-        avg_confidence = sum(confidences) / len(confidences)
+        avg_confidence = sum(m["conf"] for m in analyse["mots"]) / len(analyse["mots"])
+        analyse["confiance"] = avg_confidence
         
         print(f"    📊 Confiance Tesseract : {avg_confidence:.1f}%")
         
         if avg_confidence > 75:
-            return "printed"
-        else:
-            return "handwritten"
+            analyse["type"] = "printed"
+        
+        return analyse
     
     except Exception as e:
         print(f"    ⚠️ Erreur détection : {e}. Défaut : manuscrit")
-        return "handwritten"
+        return analyse
+
+
+def detect_document_type(image: Image.Image) -> str:
+    """
+    Détecte si une image contient du texte MANUSCRIT ou IMPRIMÉ.
+    
+    Returns:
+        "printed" ou "handwritten"
+    """
+    return analyser_page_tesseract(image)["type"]
+
+
+# ====================================
+# DÉTECTION SUR VIGNETTE (BASSE RÉSOLUTION)
+# ====================================
+
+def _dpi_estime(image: Image.Image) -> float:
+    """DPI d'une image : métadonnées, sinon estimé sur une largeur A4"""
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0] > 1:
+        return float(dpi[0])
+    return max(image.width, 1) / 8.27
+
+
+def creer_vignette(image: Image.Image, dpi_source=None, dpi_cible=None) -> Image.Image:
+    """Réduit une page en vignette niveaux de gris pour la détection"""
+    image = _en_image(image)
+    dpi_source = dpi_source or _dpi_estime(image)
+    dpi_cible = dpi_cible or OCR_DETECTION_DPI
+    vignette = image.convert('L')
+    
+    ratio = dpi_cible / dpi_source
+    if ratio < 1:
+        taille = (max(1, int(vignette.width * ratio)), max(1, int(vignette.height * ratio)))
+        vignette = vignette.resize(taille, Image.BILINEAR)
+    
+    return vignette
+
+
+def detecter_type_vignette_cv(vignette: Image.Image) -> dict:
+    """
+    Détection imprimé/manuscrit par statistiques OpenCV (sans OCR).
+    
+    Les caractères imprimés donnent des composantes connexes petites et de
+    hauteur régulière ; l'écriture manuscrite donne des mots liés, larges et
+    de hauteur variable. Le score combine la dispersion des hauteurs et la
+    part de composantes « larges ».
+    """
+    gray = np.array(_en_image(vignette).convert('L'))
+    _, encre = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(encre, connectivity=8)
+    
+    hauteur_max = gray.shape[0] * 0.1
+    composantes = [
+        (s[cv2.CC_STAT_WIDTH], s[cv2.CC_STAT_HEIGHT])
+        for s in stats[1:]
+        if s[cv2.CC_STAT_AREA] >= 4 and 2 <= s[cv2.CC_STAT_HEIGHT] <= hauteur_max
+    ]
+    
+    # Page (quasi) vide : rien à lire, Tesseract local suffit
+    if len(composantes) < 20:
+        return {"type": "printed", "score": 0.0, "composantes": len(composantes)}
+    
+    largeurs = np.array([c[0] for c in composantes], dtype=float)
+    hauteurs = np.array([c[1] for c in composantes], dtype=float)
+    
+    dispersion_hauteurs = float(hauteurs.std() / hauteurs.mean())
+    part_larges = float(np.mean(largeurs > 2.5 * hauteurs))
+    score = dispersion_hauteurs + part_larges
+    
+    return {
+        "type": "printed" if score < OCR_DETECTION_SEUIL_CV else "handwritten",
+        "score": round(score, 3),
+        "composantes": len(composantes)
+    }
+
+
+def detecter_type_vignette_tesseract(vignette: Image.Image) -> dict:
+    """Détection par confiance Tesseract sur la vignette (texte ignoré)"""
+    analyse = analyser_page_tesseract(vignette)
+    return {"type": analyse["type"], "score": round(analyse["confiance"], 1)}
+
+
+def detecter_type_vignette(vignette: Image.Image, mode=None) -> dict:
+    """Détection sur vignette selon OCR_DETECTION_MODE ("vignette_cv" ou "vignette_tesseract")"""
+    mode = mode or OCR_DETECTION_MODE
+    if mode == "vignette_tesseract":
+        return detecter_type_vignette_tesseract(vignette)
+    return detecter_type_vignette_cv(vignette)
 
 
 # ====================================
 # OCR AVEC TESSERACT (GRATUIT)
 # ====================================
 
-def preprocess_image_for_tesseract(image: Image.Image) -> Image.Image:
-    """Pré-traite une image pour Tesseract"""
+def preprocess_array_for_tesseract(image: Image.Image) -> np.ndarray:
+    """Pré-traite une image pour Tesseract (tableau NumPy niveaux de gris binarisé)"""
     open_cv_image = np.array(image)
-    gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
+    if open_cv_image.ndim == 2:
+        gray = open_cv_image
+    else:
+        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
     _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-    final_image = cv2.bitwise_not(thresh)
-    return Image.fromarray(final_image)
+    return cv2.bitwise_not(thresh)
+
+
+def preprocess_image_for_tesseract(image: Image.Image) -> Image.Image:
+    """Pré-traite une image pour Tesseract"""
+    return Image.fromarray(preprocess_array_for_tesseract(image))
 
 
 def ocr_with_tesseract(image: Image.Image) -> str:
     """Extrait le texte avec Tesseract (GRATUIT, illimité)"""
     try:
-        preprocessed_img = preprocess_image_for_tesseract(image)
-        texte = pytesseract.image_to_string(preprocessed_img, lang="fra")
+        texte = get_moteur().texte(preprocess_array_for_tesseract(image), lang="fra")
         return texte.strip()
     except Exception as e:
         print(f"    ❌ Erreur Tesseract : {e}")
@@ -160,43 +351,108 @@ def ocr_with_tesseract(image: Image.Image) -> str:
 # OCR AVEC OCR.SPACE (API)
 # ====================================
 
+def _ocrspace_requete(contenu: bytes, filename: str, **options):
+    """
+    Envoie un fichier (image ou PDF) à OCR.space via le client partagé
+    (pool de connexions, retries, deadline).
+    
+    Returns:
+        La liste des textes (1 par page) ou None en cas d'erreur
+    """
+    try:
+        textes = ocrspace_parse(contenu, filename, **options)
+    except OCRSpaceError as e:
+        print(f"    ❌ Erreur OCR.space ({filename}) : {e}")
+        return None
+    
+    return textes
+
+
 def ocr_with_ocrspace(image_path: str) -> str:
     """Extrait le texte avec OCR.space (manuscrit)"""
     try:
         with open(image_path, 'rb') as f:
-            response = requests.post(
-                'https://api.ocr.space/parse/image',
-                files={'filename': f},
-                data={
-                    'apikey': API_KEY,
-                    'language': 'fre',
-                    'isOverlayRequired': False,
-                    'detectOrientation': True,
-                    'scale': True,
-                    'OCREngine': 2
-                },
-                timeout=30
-            )
-        
-        result = response.json()
-        
-        if result.get('IsErroredOnProcessing'):
-            error_msg = result.get('ErrorMessage', 'Erreur inconnue')
-            print(f"    ❌ Erreur OCR.space : {error_msg}")
-            return ""
-        
-        texte = result['ParsedResults'][0]['ParsedText']
-        
-        # Incrémenter le compteur
-        usage = update_usage()
-        remaining = get_remaining_quota()
-        print(f"    📊 OCR.space : {usage}/{MONTHLY_LIMIT} ({remaining} restantes)")
-        
-        return texte
-    
-    except Exception as e:
+            contenu = f.read()
+    except OSError as e:
         print(f"    ❌ Erreur OCR.space : {e}")
         return ""
+    
+    textes = _ocrspace_requete(contenu, os.path.basename(image_path))
+    return textes[0] if textes else ""
+
+
+def _encoder_page_ocrspace(image: Image.Image) -> bytes:
+    """
+    Encode une page en JPEG niveaux de gris compact pour OCR.space.
+    
+    ~150 dpi suffisent à OCR.space : la page est réduite puis la qualité
+    est baissée jusqu'à tenir dans la limite par requête.
+    """
+    page = _en_image(image).convert('L')
+    # A4 à ~150 dpi : 1754 px sur le grand côté
+    page.thumbnail((1754, 1754))
+    
+    limite = OCRSPACE_MAX_FILE_KB * 1024 // max(1, OCRSPACE_MAX_PAGES)
+    for qualite in (75, 60, 45, 30):
+        buffer = io.BytesIO()
+        page.save(buffer, format='JPEG', quality=qualite, optimize=True)
+        if buffer.tell() <= limite:
+            break
+    
+    return buffer.getvalue()
+
+
+def _regrouper_pages_ocrspace(pages: list) -> list:
+    """
+    Regroupe les pages manuscrites en lots pour OCR.space.
+    
+    Chaque lot respecte OCRSPACE_MAX_PAGES pages et OCRSPACE_MAX_FILE_KB :
+    le moins de requêtes (donc de quota) possible.
+    """
+    limite = OCRSPACE_MAX_FILE_KB * 1024 * 0.95  # marge pour l'enveloppe PDF
+    lots = []
+    lot, taille = [], 0
+    
+    for page in pages:
+        taille_page = len(page["jpeg"])
+        if lot and (len(lot) >= OCRSPACE_MAX_PAGES or taille + taille_page > limite):
+            lots.append(lot)
+            lot, taille = [], 0
+        lot.append(page)
+        taille += taille_page
+    
+    if lot:
+        lots.append(lot)
+    
+    return lots
+
+
+def _construire_pdf_lot(jpegs: list) -> bytes:
+    """Assemble des pages JPEG en un PDF multi-pages"""
+    images = [Image.open(io.BytesIO(jpeg)) for jpeg in jpegs]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='PDF', save_all=True, append_images=images[1:], resolution=150)
+    return buffer.getvalue()
+
+
+def _ocr_lots_ocrspace(lots: list) -> list:
+    """
+    OCR des lots de pages (JPEG), UNE requête OCR.space par lot.
+    
+    Les lots partent en parallèle (OCRSPACE_CONCURRENCY). Une page absente
+    de la réponse ou un lot en échec → None, l'ordre est conservé.
+    """
+    fichiers = [(_construire_pdf_lot(jpegs), f"pages_{i + 1}.pdf", {}) for i, jpegs in enumerate(lots)]
+    reponses = ocrspace_parse_many(fichiers)
+    
+    textes_par_lot = []
+    for (_, filename, _), jpegs, reponse in zip(fichiers, lots, reponses):
+        if isinstance(reponse, Exception):
+            print(f"    ❌ Erreur OCR.space ({filename}) : {reponse}")
+            reponse = []
+        textes_par_lot.append([reponse[i] if i < len(reponse) else None for i in range(len(jpegs))])
+    
+    return textes_par_lot
 
 
 # ====================================
@@ -214,6 +470,20 @@ def extract_text_from_image(image_path: str, force_mode=None) -> str:
     Returns:
         Texte extrait
     """
+    return extract_text_from_image_with_stats(image_path, force_mode)[0]
+
+
+def extract_text_from_image_with_stats(image_path: str, force_mode=None) -> tuple:
+    """Comme extract_text_from_image, retourne (texte, statistiques de l'appel)"""
+    return _avec_cache_ocr(
+        image_path, force_mode,
+        lambda: (_extract_text_from_image(image_path, force_mode), {}),
+        detection=OCR_DETECTION_MODE, moteur=TESSERACT_ENGINE
+    )
+
+
+def _extract_text_from_image(image_path: str, force_mode=None) -> str:
+    """Extraction d'une image (sans cache)"""
     try:
         image = Image.open(image_path)
         
@@ -226,16 +496,28 @@ def extract_text_from_image(image_path: str, force_mode=None) -> str:
             print(f"  ✍️  Mode forcé : OCR.space")
             return ocr_with_ocrspace(image_path)
         
-        # Auto-détection
-        else:
-            doc_type = detect_document_type(image)
+        # Auto-détection sur vignette : l'image pleine résolution ne sert qu'à l'OCR
+        elif OCR_DETECTION_MODE != "tesseract":
+            detection = detecter_type_vignette(creer_vignette(image))
             
-            if doc_type == "printed":
+            if detection["type"] == "printed":
                 print(f"  🖨️  Détecté : IMPRIMÉ → Tesseract (GRATUIT)")
                 return ocr_with_tesseract(image)
             else:
                 print(f"  ✍️  Détecté : MANUSCRIT → OCR.space (API)")
                 return ocr_with_ocrspace(image_path)
+        
+        # Auto-détection Tesseract pleine page
+        else:
+            analyse = analyser_page_tesseract(image)
+            
+            if analyse["type"] == "printed":
+                # Texte déjà reconnu pendant la détection : pas de 2e passe
+                print(f"  🖨️  Détecté : IMPRIMÉ → Tesseract (GRATUIT)")
+                return analyse["texte"].strip()
+            else:
+                print(f"  ✍️  Détecté : MANUSCRIT → OCR.space (API)")
+                return ocr_with_ocrspace(image_path)
     
     except Exception as e:
         print(f"  ❌ Erreur extraction : {e}")
@@ -246,99 +528,516 @@ def extract_text_from_image(image_path: str, force_mode=None) -> str:
 # EXTRACTION DE PDF
 # ====================================
 
-def extract_text_from_pdf(pdf_path: str, force_mode=None) -> str:
+def extract_text_from_pdf(pdf_path: str, force_mode=None, workers=None) -> str:
     """
     Extrait le texte d'un PDF avec détection automatique.
     
+    Les pages sont rastérisées au fil de l'eau (voir iter_pdf_pages) :
+    la mémoire reste bornée quel que soit le nombre de pages.
+    
     Args:
         pdf_path: Chemin vers le PDF
         force_mode: "tesseract" (imprimé), "ocrspace" (manuscrit), None (auto)
+        workers: Nombre de processus Tesseract (None = OCR_WORKERS)
         
     Returns:
         Texte extrait de toutes les pages
     """
+    return extract_text_from_pdf_with_stats(pdf_path, force_mode, workers)[0]
+
+
+def extract_text_from_pdf_with_stats(pdf_path: str, force_mode=None, workers=None) -> tuple:
+    """
+    Comme extract_text_from_pdf, retourne (texte, statistiques de l'appel) :
+    processus, temps par page, pic mémoire raster et pic RSS des processus
+    du pool pour CE document, routage imprimé/manuscrit.
+    """
+    return _avec_cache_ocr(
+        pdf_path, force_mode,
+        lambda: _extract_text_from_pdf(pdf_path, force_mode, workers),
+        dpi=300, detection=OCR_DETECTION_MODE, moteur=TESSERACT_ENGINE,
+        texte_natif=PDF_TEXT_LAYER_ENABLED, raster=PDF_RASTER_ENGINE
+    )
+
+
+def _extract_text_from_pdf(pdf_path: str, force_mode=None, workers=None) -> tuple:
+    """Extraction d'un PDF (sans cache) → (texte, stats)"""
+    stats = {}
     try:
-        # Convertir PDF en images
-        images = convert_from_path(pdf_path, dpi=300)
+        # Mode forcé OCR.space : envoyer le PDF directement
+        if force_mode == "ocrspace":
+            print(f"  ✍️  Mode forcé : OCR.space")
+            return _extract_pdf_with_ocrspace(pdf_path), stats
         
-        # Détection sur la première page si mode auto
-        if force_mode is None and images:
-            doc_type = detect_document_type(images[0])
-            
-            if doc_type == "printed":
-                print(f"  🖨️  Document IMPRIMÉ détecté → Tesseract (GRATUIT)")
-                force_mode = "tesseract"
-            else:
-                print(f"  ✍️  Document MANUSCRIT détecté → OCR.space (API)")
-                force_mode = "ocrspace"
+        nb_pages = compter_pages_pdf(pdf_path)
+        textes = {}
         
-        # Si OCR.space, envoyer le PDF directement (1 seule requête)
-        if force_mode == "ocrspace":
-            return _extract_pdf_with_ocrspace(pdf_path)
+        # Mode auto : couche texte native d'abord (PDF issus de Word, LaTeX...)
+        if force_mode is None and PDF_TEXT_LAYER_ENABLED:
+            textes = extraire_pages_texte_natif(pdf_path)
+            if textes:
+                print(f"  📝 Couche texte native : {len(textes)}/{nb_pages} page(s), sans OCR")
         
-        # Si Tesseract, traiter page par page
-        elif force_mode == "tesseract":
-            return _extract_pdf_with_tesseract(images)
+        stats["pages_texte_natif"] = sorted(textes)
+        numeros = [n for n in range(1, nb_pages + 1) if n not in textes]
         
-        else:
-            return _extract_pdf_with_tesseract(images)
+        if numeros:
+            # Mode auto sur vignettes : chaque processus rastérise lui-même
+            # la page à la résolution dont le moteur choisi a besoin
+            if force_mode is None and OCR_DETECTION_MODE != "tesseract":
+                textes_ocr, stats_ocr = _extract_pdf_mixte(
+                    numeros, workers, numeros,
+                    traitement=partial(_router_page_vignette, pdf_path)
+                )
+            
+            # Mode forcé Tesseract : toutes les pages en local
+            elif force_mode == "tesseract":
+                print(f"  🖨️  Mode forcé : Tesseract")
+                pages = iter_pdf_pages(pdf_path, dpi=300, numeros=numeros, grayscale=True)
+                textes_ocr, stats_ocr = _extract_pdf_with_tesseract(pages, workers, numeros)
+            
+            # Mode auto : routage page par page
+            else:
+                pages = iter_pdf_pages(pdf_path, dpi=300, numeros=numeros, grayscale=True)
+                textes_ocr, stats_ocr = _extract_pdf_mixte(pages, workers, numeros)
+            
+            textes.update(textes_ocr)
+            stats.update(stats_ocr)
+        
+        return "\n\n--- PAGE SUIVANTE ---\n\n".join(textes[n] for n in range(1, nb_pages + 1)), stats
     
     except Exception as e:
         print(f"  ❌ Erreur extraction PDF : {e}")
-        return ""
+        return "", stats
+
+
+# ====================================
+# RASTÉRISATION EN FLUX (MÉMOIRE BORNÉE)
+# ====================================
+
+def compter_pages_pdf(pdf_path: str) -> int:
+    """Retourne le nombre de pages d'un PDF sans le rastériser"""
+    return compter_pages(pdf_path)
 
 
-def _extract_pdf_with_tesseract(images: list) -> str:
-    """Extrait le texte d'un PDF avec Tesseract (page par page)"""
-    textes = []
-    for i, img in enumerate(images):
-        print(f"    - Page {i + 1}/{len(images)}...")
-        texte = ocr_with_tesseract(img)
-        textes.append(texte)
+def rasteriser_page(pdf_path: str, numero: int, dpi: int = 300, grayscale: bool = False, moteur=None):
+    """
+    Rastérise UNE page d'un PDF (numéro à partir de 1).
     
-    return "\n\n--- PAGE SUIVANTE ---\n\n".join(textes)
+    Returns:
+        Tableau NumPy avec le moteur "pdfium", image PIL avec "pdf2image"
+    """
+    if (moteur or PDF_RASTER_ENGINE) == "pdfium":
+        return rendre_page(pdf_path, numero, dpi=dpi, grayscale=grayscale)
+    return convert_from_path(pdf_path, dpi=dpi, first_page=numero, last_page=numero, grayscale=grayscale)[0]
 
 
-def _extract_pdf_with_ocrspace(pdf_path: str) -> str:
-    """Extrait le texte d'un PDF avec OCR.space (1 seule requête)"""
+def _fenetres(numeros: list, window: int) -> list:
+    """Découpe des numéros de page en plages consécutives d'au plus `window` pages"""
+    fenetres = []
+    for numero in numeros:
+        if fenetres and numero == fenetres[-1][1] + 1 and numero - fenetres[-1][0] < window:
+            fenetres[-1][1] = numero
+        else:
+            fenetres.append([numero, numero])
+    return fenetres
+
+
+def iter_pdf_pages(pdf_path: str, dpi: int = 300, window=None, numeros=None,
+                   grayscale: bool = False, moteur=None):
+    """
+    Génère les pages d'un PDF une par une.
+    
+    - "pdfium" : rendu en processus page par page (une seule page en mémoire) ;
+      `dpi` peut aussi être un dict {numéro: dpi} ou une fonction numéro → dpi
+    - "pdf2image" : rastérisation par fenêtres de `window` pages
+      (PDF_RASTER_WINDOW par défaut), jamais le document entier
+    
+    numeros : pages à rastériser (à partir de 1), toutes par défaut
+    """
+    if (moteur or PDF_RASTER_ENGINE) == "pdfium":
+        yield from iter_rendus(pdf_path, numeros, dpi=dpi, grayscale=grayscale)
+        return
+    
+    if window is None:
+        window = PDF_RASTER_WINDOW
+    window = max(1, window)
+    if numeros is None:
+        numeros = range(1, compter_pages_pdf(pdf_path) + 1)
+    
+    for premiere, derniere in _fenetres(list(numeros), window):
+        fenetre = convert_from_path(pdf_path, dpi=dpi, first_page=premiere, last_page=derniere,
+                                    grayscale=grayscale)
+        
+        # Libérer chaque page dès qu'elle a été consommée
+        while fenetre:
+            yield fenetre.pop(0)
+
+
+def _taille_image(image) -> int:
+    """Taille en octets du raster d'une page (0 pour une simple référence de page)"""
+    if isinstance(image, np.ndarray):
+        return image.nbytes
+    if not isinstance(image, Image.Image):
+        return 0
+    return image.width * image.height * len(image.getbands())
+
+
+def _rss_pic_mo():
+    """
+    Pic de mémoire résidente du processus courant (Mo), None hors Unix
+    (module resource absent sous Windows)
+    """
     try:
-        with open(pdf_path, 'rb') as f:
-            response = requests.post(
-                'https://api.ocr.space/parse/image',
-                files={'filename': f},
-                data={
-                    'apikey': API_KEY,
-                    'language': 'fre',
-                    'isOverlayRequired': False,
-                    'detectOrientation': True,
-                    'scale': True,
-                    'OCREngine': 2,
-                    'isTable': True
-                },
-                timeout=60
-            )
+        import resource
+    except ImportError:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss : Ko sous Linux, octets sous macOS
+    return pic / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _dans_worker(traitement, index: int, image) -> dict:
+    """
+    Exécute `traitement` dans un processus du pool et y relève le pic RSS.
+    
+    Le pool est créé pour un seul document : le pic d'un processus du
+    pool est donc celui de ce document.
+    """
+    resultat = traitement(index, image)
+    resultat["rss_pic_mo"] = _rss_pic_mo()
+    return resultat
+
+
+# ====================================
+# TRAITEMENT PARALLÈLE DES PAGES
+# ====================================
+
+def _resoudre_nb_workers(workers, nb_pages: int) -> int:
+    """Calcule le nombre de processus à utiliser (jamais plus que de pages)"""
+    if workers is None:
+        workers = OCR_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, nb_pages))
+
+
+def _init_worker_tesseract():
+    """Initialise un processus du pool OCR"""
+    # Un seul thread OpenMP par Tesseract : le parallélisme vient du pool
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _nouveau_pool(nb_workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=nb_workers, initializer=_init_worker_tesseract)
+
+
+def _resultat_page_echec(index: int, erreur) -> dict:
+    return {"page": index + 1, "type": None, "texte": "", "duree": 0.0, "erreur": str(erreur) or type(erreur).__name__}
+
+
+def _ocr_page_tesseract(index: int, image: Image.Image) -> dict:
+    """
+    Pré-traite et OCR une page (exécuté dans un processus du pool).
+    
+    Les erreurs restent isolées à la page : elles sont renvoyées
+    dans le résultat au lieu d'être levées.
+    """
+    debut = time.perf_counter()
+    try:
+        # Moteur chaud par processus si TESSERACT_ENGINE="api"
+        texte = get_moteur().texte(preprocess_array_for_tesseract(image), lang="fra").strip()
+        erreur = None
+    except Exception as e:
+        texte = ""
+        erreur = str(e)
+    
+    return {
+        "page": index + 1,
+        "type": "printed",
+        "texte": texte,
+        "duree": time.perf_counter() - debut,
+        "erreur": erreur
+    }
+
+
+def _router_page(index: int, image: Image.Image) -> dict:
+    """
+    Classe une page et la traite selon son type (exécuté dans le pool).
+    
+    - Imprimée : le texte de la passe de détection est gardé tel quel
+    - Manuscrite : la page est encodée en JPEG compact pour OCR.space
+    """
+    debut = time.perf_counter()
+    resultat = {"page": index + 1, "type": "handwritten", "texte": "", "jpeg": None, "erreur": None}
+    
+    try:
+        analyse = analyser_page_tesseract(image)
+        resultat["type"] = analyse["type"]
         
-        result = response.json()
+        if analyse["type"] == "printed":
+            resultat["texte"] = analyse["texte"].strip()
+        else:
+            resultat["jpeg"] = _encoder_page_ocrspace(image)
+    except Exception as e:
+        resultat["erreur"] = str(e)
+    
+    resultat["duree"] = time.perf_counter() - debut
+    return resultat
+
+
+def _router_page_vignette(pdf_path: str, index: int, numero: int) -> dict:
+    """
+    Classe une page sur vignette puis la rastérise pour le bon moteur
+    (exécuté dans le pool).
+    
+    - Imprimée : rastérisation 300 dpi + Tesseract
+    - Manuscrite : rastérisation 150 dpi + JPEG pour OCR.space
+    """
+    debut = time.perf_counter()
+    resultat = {"page": numero, "type": "handwritten", "texte": "", "jpeg": None, "erreur": None}
+    
+    try:
+        vignette = rasteriser_page(pdf_path, numero, dpi=OCR_DETECTION_DPI, grayscale=True)
+        detection = detecter_type_vignette(vignette, OCR_DETECTION_MODE)
+        resultat["type"] = detection["type"]
         
-        if result.get('IsErroredOnProcessing'):
-            error_msg = result.get('ErrorMessage', 'Erreur inconnue')
-            print(f"    ❌ Erreur OCR.space : {error_msg}")
-            return ""
+        if detection["type"] == "printed":
+            image = rasteriser_page(pdf_path, numero, dpi=300, grayscale=True)
+            texte = get_moteur().texte(preprocess_array_for_tesseract(image), lang="fra")
+            resultat["texte"] = texte.strip()
+        else:
+            image = rasteriser_page(pdf_path, numero, dpi=150, grayscale=True)
+            resultat["jpeg"] = _encoder_page_ocrspace(image)
+    except Exception as e:
+        resultat["erreur"] = str(e)
+    
+    resultat["duree"] = time.perf_counter() - debut
+    return resultat
+
+
+def _traiter_pages(pages, traitement, workers=None, numeros=None) -> tuple:
+    """
+    Applique `traitement(index, image)` à chaque page dans un pool de processus.
+    
+    Les pages (liste ou itérateur) sont soumises au fil de l'eau : au plus
+    2 pages par processus sont en vol, la mémoire reste bornée.
+    
+    Si un processus meurt (mémoire, signal...), le pool est recréé et les
+    pages qui étaient en vol sont rejouées une par une : seule la page
+    fautive est perdue.
+    
+    numeros : numéro de page réel de chaque élément (1..N par défaut)
+    
+    Returns:
+        (résultats dans l'ordre des pages, statistiques de cet appel)
+    """
+    debut = time.perf_counter()
+    if numeros is None:
+        pages = list(pages)
+        numeros = list(range(1, len(pages) + 1))
+    nb_pages = len(numeros)
+    nb_workers = _resoudre_nb_workers(workers, nb_pages)
+    max_en_vol = nb_workers * 2
+    
+    print(f"    ⚡ {nb_workers} processus pour {nb_pages} page(s)")
+    
+    resultats = {}
+    memoire = {"courante": 0, "pic": 0}
+    relances = {"pools_recrees": 0, "pages_relancees": 0}
+    
+    def _page_chargee(image):
+        memoire["courante"] += _taille_image(image)
+        memoire["pic"] = max(memoire["pic"], memoire["courante"])
+    
+    if nb_workers <= 1:
+        for i, img in enumerate(pages):
+            _page_chargee(img)
+            print(f"    - Page {i + 1}/{nb_pages}...")
+            resultats[i] = traitement(i, img)
+            memoire["courante"] -= _taille_image(img)
+            del img
+    else:
+        pool = {"executor": _nouveau_pool(nb_workers)}
+        en_vol = {}
+        suspects = []
+        
+        def _remplacer_pool(casse):
+            # Toutes les pages en vol d'un pool cassé échouent : ne le remplacer qu'une fois
+            if pool["executor"] is casse:
+                casse.shutdown(wait=False, cancel_futures=True)
+                pool["executor"] = _nouveau_pool(nb_workers)
+                relances["pools_recrees"] += 1
+                print("    ♻️  Processus OCR tué : pool recréé, pages en vol rejouées une par une")
+        
+        def _echec_pool(i, img, isolee, executor, erreur):
+            _remplacer_pool(executor)
+            if isolee:
+                # Seule en vol : c'est elle qui tue le processus
+                memoire["courante"] -= _taille_image(img)
+                resultats[i] = _resultat_page_echec(i, erreur)
+            else:
+                suspects.append((i, img))
         
-        texte_complet = ""
-        for page_result in result.get('ParsedResults', []):
-            texte_complet += page_result.get('ParsedText', '') + "\n\n--- PAGE SUIVANTE ---\n\n"
+        def _soumettre(i, img, isolee=False):
+            executor = pool["executor"]
+            try:
+                en_vol[executor.submit(_dans_worker, traitement, i, img)] = (i, img, isolee, executor)
+            except BrokenProcessPool as e:
+                _echec_pool(i, img, isolee, executor, e)
         
-        usage = update_usage()
-        remaining = get_remaining_quota()
-        print(f"    ✅ {len(texte_complet)} caractères")
-        print(f"    📊 OCR.space : {usage}/{MONTHLY_LIMIT} ({remaining} restantes)")
+        def _collecter(tout):
+            termines, _ = wait(list(en_vol), return_when=ALL_COMPLETED if tout else FIRST_COMPLETED)
+            for future in termines:
+                i, img, isolee, executor = en_vol.pop(future)
+                try:
+                    resultats[i] = future.result()
+                except BrokenProcessPool as e:
+                    # Un processus est mort (mémoire, signal...) : le pool est inutilisable
+                    # et TOUTES ses pages en vol échouent, pas seulement la fautive
+                    _echec_pool(i, img, isolee, executor, e)
+                    continue
+                except Exception as e:
+                    resultats[i] = _resultat_page_echec(i, e)
+                memoire["courante"] -= _taille_image(img)
         
-        return texte_complet.strip()
+        def _rejouer_suspects():
+            # Pages en vol lors du crash : rejouées une par une dans le nouveau
+            # pool, seule la page fautive finit en erreur
+            while en_vol:
+                _collecter(tout=True)
+            while suspects:
+                i, img = suspects.pop(0)
+                relances["pages_relancees"] += 1
+                _soumettre(i, img, isolee=True)
+                while en_vol:
+                    _collecter(tout=True)
+        
+        try:
+            for i, img in enumerate(pages):
+                _page_chargee(img)
+                _soumettre(i, img)
+                del img
+                
+                if len(en_vol) >= max_en_vol:
+                    _collecter(tout=False)
+                if suspects:
+                    _rejouer_suspects()
+            
+            _rejouer_suspects()
+        finally:
+            pool["executor"].shutdown(wait=True, cancel_futures=True)
     
-    except Exception as e:
+    resultats = [resultats[i] for i in sorted(resultats)]
+    for i, resultat in enumerate(resultats):
+        resultat["page"] = numeros[i]
+    
+    for resultat in resultats:
+        if resultat["erreur"]:
+            print(f"    ❌ Page {resultat['page']} : {resultat['erreur']}")
+        else:
+            print(f"    - Page {resultat['page']} : {resultat['duree']:.2f}s")
+    
+    duree_totale = time.perf_counter() - debut
+    duree_cumulee = sum(r["duree"] for r in resultats)
+    memoire_pic_mo = memoire["pic"] / (1024 * 1024)
+    print(f"    ⏱️  {duree_totale:.2f}s au total ({duree_cumulee:.2f}s cumulées sur {nb_workers} processus)")
+    print(f"    💾 Pic mémoire raster : {memoire_pic_mo:.0f} Mo")
+    if relances["pools_recrees"]:
+        print(f"    ♻️  {relances['pools_recrees']} pool(s) recréé(s), {relances['pages_relancees']} page(s) relancée(s)")
+    
+    # Pic RSS d'un processus du pool (en séquentiel, le processus serveur
+    # tourne depuis longtemps : son pic ne dit rien de ce document)
+    pics_workers = [pic for pic in (r.pop("rss_pic_mo", None) for r in resultats) if pic is not None]
+    stats = {
+        "workers": nb_workers,
+        "pages": [{k: r.get(k) for k in ("page", "type", "duree", "erreur")} for r in resultats],
+        "duree_totale": round(duree_totale, 3),
+        "memoire_raster_pic_mo": round(memoire_pic_mo, 1),
+        "rss_pic_worker_mo": round(max(pics_workers), 1) if pics_workers else None,
+        **relances
+    }
+    
+    return resultats, stats
+
+
+def _extract_pdf_with_tesseract(pages, workers=None, numeros=None) -> tuple:
+    """
+    Extrait le texte d'un PDF avec Tesseract.
+    
+    Les pages sont OCRisées en parallèle (OCR_WORKERS processus).
+    
+    Returns:
+        ({numéro de page: texte}, stats)
+    """
+    resultats, stats = _traiter_pages(pages, _ocr_page_tesseract, workers, numeros)
+    stats["routage"] = None
+    stats["pages_en_echec"] = [r["page"] for r in resultats if r["erreur"]]
+    return {r["page"]: r["texte"] for r in resultats}, stats
+
+
+def _extract_pdf_mixte(pages, workers=None, numeros=None, traitement=_router_page) -> tuple:
+    """
+    Extrait le texte d'un PDF en routant CHAQUE page vers le bon moteur.
+    
+    - Pages imprimées → Tesseract local (texte de la passe de détection)
+    - Pages manuscrites → OCR.space, regroupées dans le moins de requêtes
+      possible (OCRSPACE_MAX_PAGES par PDF, OCRSPACE_MAX_FILE_KB)
+    
+    Returns:
+        ({numéro de page: texte}, stats)
+    """
+    resultats, stats = _traiter_pages(pages, traitement, workers, numeros)
+    
+    imprimees = [r["page"] for r in resultats if r["type"] == "printed"]
+    manuscrites = [r for r in resultats if r["type"] == "handwritten" and r.get("jpeg")]
+    
+    print(f"  🖨️  {len(imprimees)} page(s) IMPRIMÉE(S) → Tesseract (GRATUIT)")
+    print(f"  ✍️  {len(manuscrites)} page(s) MANUSCRITE(S) → OCR.space (API)")
+    
+    lots = _regrouper_pages_ocrspace(manuscrites)
+    textes_par_lot = _ocr_lots_ocrspace([[r["jpeg"] for r in lot] for lot in lots]) if lots else []
+    for lot, textes in zip(lots, textes_par_lot):
+        for resultat, texte in zip(lot, textes):
+            if texte is None:
+                resultat["erreur"] = "OCR.space : page non reconnue (lot en échec ou réponse incomplète)"
+            resultat["texte"] = (texte or "").strip()
+            resultat["jpeg"] = None
+    
+    routage = {
+        "pages_imprimees": imprimees,
+        "pages_manuscrites": [r["page"] for r in manuscrites],
+        "requetes_ocrspace": len(lots),
+        # Par rapport à une requête par page manuscrite (les pages imprimées
+        # n'auraient de toute façon pas été envoyées : pas de quota compté)
+        "requetes_evitees_par_regroupement": len(manuscrites) - len(lots)
+    }
+    stats["routage"] = routage
+    stats["pages_en_echec"] = [r["page"] for r in resultats if r["erreur"]]
+    print(f"  📊 Routage : {routage['requetes_ocrspace']} requête(s) OCR.space pour "
+          f"{len(manuscrites)} page(s) manuscrite(s), "
+          f"{routage['requetes_evitees_par_regroupement']} évitée(s) par regroupement")
+    
+    return {r["page"]: r["texte"] for r in resultats}, stats
+
+
+def _extract_pdf_with_ocrspace(pdf_path: str) -> str:
+    """Extrait le texte d'un PDF avec OCR.space (1 seule requête)"""
+    try:
+        with open(pdf_path, 'rb') as f:
+            contenu = f.read()
+    except OSError as e:
         print(f"    ❌ Erreur OCR.space : {e}")
         return ""
+    
+    textes = _ocrspace_requete(contenu, os.path.basename(pdf_path), isTable=True)
+    if textes is None:
+        return ""
+    
+    texte_complet = "\n\n--- PAGE SUIVANTE ---\n\n".join(textes)
+    print(f"    ✅ {len(texte_complet)} caractères")
+    
+    return texte_complet.strip()
 
 
 # ====================================
@@ -356,6 +1055,11 @@ def extract_text_from_file(file_path: str, force_mode=None) -> str:
     Returns:
         Texte extrait
     """
+    return extract_text_from_file_with_stats(file_path, force_mode)[0]
+
+
+def extract_text_from_file_with_stats(file_path: str, force_mode=None) -> tuple:
+    """Comme extract_text_from_file, retourne (texte, statistiques de l'appel)"""
     file_ext = os.path.splitext(file_path)[1].lower()
     
     print(f"📄 Traitement : {os.path.basename(file_path)}")
@@ -363,12 +1067,12 @@ def extract_text_from_file(file_path: str, force_mode=None) -> str:
     
     # IMAGE
     if file_ext in ['.jpg', '.jpeg', '.png']:
-        return extract_text_from_image(file_path, force_mode)
+        return extract_text_from_image_with_stats(file_path, force_mode)
     
     # PDF
     elif file_ext == '.pdf':
-        return extract_text_from_pdf(file_path, force_mode)
+        return extract_text_from_pdf_with_stats(file_path, force_mode)
     
     else:
         print(f"  ❌ Format non supporté : {file_ext}")
-        return ""
\ No newline at end of file
+        return "", {}
@@ -0,0 +1,218 @@
+"""
+Client OCR.space asynchrone (httpx)
+- Pool de connexions partagé (keep-alive) pour toute l'application
+- Limite de requêtes simultanées
+- Retry avec backoff exponentiel + jitter sur les erreurs transitoires
+- Deadline globale par requête (retries compris)
+- Quota mensuel et limite par minute vérifiés AVANT chaque envoi, chaque
+  tentative (retries compris) comptée à la réservation (quota_service)
+"""
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+
+from app.services.quota_service import ledger as ledger_defaut, QuotaEpuiseError
+from app.config import (
+    OCRSPACE_API_KEY, OCRSPACE_URL, OCRSPACE_CONCURRENCY,
+    OCRSPACE_MAX_RETRIES, OCRSPACE_TIMEOUT, OCRSPACE_DEADLINE
+)
+
+# Codes HTTP pour lesquels un nouvel essai a du sens
+STATUTS_TRANSITOIRES = {408, 429, 500, 502, 503, 504}
+
+
+class OCRSpaceError(Exception):
+    """Échec définitif d'une requête OCR.space"""
+
+    def __init__(self, message: str, transitoire: bool = False):
+        super().__init__(message)
+        self.transitoire = transitoire
+
+
+class OCRSpaceClient:
+    """
+    Client asynchrone OCR.space.
+
+    Une seule instance partage son pool de connexions ; le sémaphore
+    limite le nombre de requêtes en vol.
+    """
+
+    def __init__(self, url=OCRSPACE_URL, api_key=OCRSPACE_API_KEY,
+                 max_concurrence=OCRSPACE_CONCURRENCY, max_tentatives=OCRSPACE_MAX_RETRIES,
+                 timeout=OCRSPACE_TIMEOUT, deadline=OCRSPACE_DEADLINE,
+                 backoff_base=1.0, backoff_max=30.0, ledger=ledger_defaut):
+        self.url = url
+        self.api_key = api_key
+        self.max_tentatives = max(1, max_tentatives)
+        self.timeout = timeout
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.ledger = ledger
+        self._semaphore = asyncio.Semaphore(max_concurrence)
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrence, max_keepalive_connections=max_concurrence)
+        )
+        self.stats = {"requetes": 0, "tentatives": 0, "retries": 0, "echecs": 0, "attente_quota_s": 0.0}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _delai_backoff(self, tentative: int) -> float:
+        """Backoff exponentiel avec « full jitter »"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** tentative)))
+
+    async def _envoyer(self, contenu: bytes, filename: str, options: dict, timeout: float) -> list:
+        """Une tentative : renvoie les textes ou lève OCRSpaceError"""
+        data = {
+            'apikey': self.api_key,
+            'language': 'fre',
+            'isOverlayRequired': 'false',
+            'detectOrientation': 'true',
+            'scale': 'true',
+            'OCREngine': '2',
+        }
+        for cle, valeur in options.items():
+            data[cle] = str(valeur).lower() if isinstance(valeur, bool) else str(valeur)
+
+        try:
+            response = await self._client.post(
+                self.url,
+                data=data,
+                files={'filename': (filename, contenu)},
+                timeout=timeout
+            )
+        except httpx.TimeoutException as e:
+            raise OCRSpaceError(f"Timeout : {e}", transitoire=True)
+        except httpx.TransportError as e:
+            raise OCRSpaceError(f"Erreur réseau : {e}", transitoire=True)
+
+        if response.status_code in STATUTS_TRANSITOIRES:
+            raise OCRSpaceError(f"HTTP {response.status_code}", transitoire=True)
+        if response.status_code >= 400:
+            raise OCRSpaceError(f"HTTP {response.status_code} : {response.text[:200]}")
+
+        try:
+            result = response.json()
+        except ValueError:
+            raise OCRSpaceError(f"Réponse non JSON : {response.text[:200]}", transitoire=True)
+
+        if result.get('IsErroredOnProcessing'):
+            error_msg = result.get('ErrorMessage', 'Erreur inconnue')
+            if isinstance(error_msg, list):
+                error_msg = " ".join(error_msg)
+            raise OCRSpaceError(str(error_msg))
+
+        return [page_result.get('ParsedText', '') for page_result in result.get('ParsedResults', [])]
+
+    async def parse(self, contenu: bytes, filename: str, **options) -> list:
+        """
+        OCR d'un fichier (image ou PDF) avec retries.
+
+        Returns:
+            La liste des textes (1 par page)
+
+        Raises:
+            OCRSpaceError si la deadline est dépassée ou l'erreur est définitive
+        """
+        fin = time.monotonic() + self.deadline
+        self.stats["requetes"] += 1
+        derniere_erreur = OCRSpaceError("Aucune tentative effectuée")
+
+        async with self._semaphore:
+            for tentative in range(self.max_tentatives):
+                restant = fin - time.monotonic()
+                if restant <= 0:
+                    break
+
+                if self.ledger is not None:
+                    try:
+                        attente = await asyncio.to_thread(self.ledger.reserver)
+                    except QuotaEpuiseError as e:
+                        derniere_erreur = OCRSpaceError(str(e))
+                        break
+                    if time.monotonic() + attente >= fin:
+                        await asyncio.to_thread(self.ledger.annuler_reservation)
+                        break
+                    if attente > 0:
+                        self.stats["attente_quota_s"] += attente
+                        await asyncio.sleep(attente)
+                    restant = fin - time.monotonic()
+
+                self.stats["tentatives"] += 1
+                try:
+                    return await self._envoyer(contenu, filename, options, min(self.timeout, restant))
+                except OCRSpaceError as e:
+                    derniere_erreur = e
+                    if not e.transitoire or tentative == self.max_tentatives - 1:
+                        break
+
+                    delai = self._delai_backoff(tentative)
+                    if time.monotonic() + delai >= fin:
+                        break
+
+                    self.stats["retries"] += 1
+                    print(f"    ⏳ OCR.space : {e}, nouvel essai dans {delai:.1f}s "
+                          f"(tentative {tentative + 1}/{self.max_tentatives})")
+                    await asyncio.sleep(delai)
+
+        self.stats["echecs"] += 1
+        if time.monotonic() >= fin:
+            raise OCRSpaceError(f"Deadline de {self.deadline}s dépassée ({derniere_erreur})")
+        raise derniere_erreur
+
+    async def parse_many(self, fichiers: list) -> list:
+        """
+        OCR de plusieurs fichiers en parallèle (dans la limite de concurrence).
+
+        Args:
+            fichiers: liste de (contenu, filename, options)
+
+        Returns:
+            Pour chaque fichier : la liste des textes ou l'OCRSpaceError
+        """
+        taches = [self.parse(contenu, filename, **options) for contenu, filename, options in fichiers]
+        return await asyncio.gather(*taches, return_exceptions=True)
+
+
+# ====================================
+# PONT SYNCHRONE (BOUCLE D'ARRIÈRE-PLAN)
+# ====================================
+
+_boucle = None
+_client = None
+_verrou = threading.Lock()
+
+
+def get_client() -> OCRSpaceClient:
+    """Client partagé, créé à la demande dans une boucle asyncio dédiée"""
+    global _boucle, _client
+    with _verrou:
+        if _client is None:
+            _boucle = asyncio.new_event_loop()
+            threading.Thread(target=_boucle.run_forever, name="ocrspace-client", daemon=True).start()
+            _client = asyncio.run_coroutine_threadsafe(_creer_client(), _boucle).result()
+        return _client
+
+
+async def _creer_client() -> OCRSpaceClient:
+    # Le client (et son sémaphore) doit être créé dans sa propre boucle
+    return OCRSpaceClient()
+
+
+def _executer(coroutine):
+    get_client()
+    return asyncio.run_coroutine_threadsafe(coroutine, _boucle).result()
+
+
+def ocrspace_parse(contenu: bytes, filename: str, **options) -> list:
+    """Version synchrone de OCRSpaceClient.parse (pool partagé)"""
+    return _executer(get_client().parse(contenu, filename, **options))
+
+
+def ocrspace_parse_many(fichiers: list) -> list:
+    """Version synchrone de OCRSpaceClient.parse_many (pool partagé)"""
+    return _executer(get_client().parse_many(fichiers))
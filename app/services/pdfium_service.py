@@ -0,0 +1,185 @@
+"""
+Service PDF natif (pypdfium2, sans sous-processus)
+- Lecture de la couche texte des PDF numériques (Word, LaTeX...)
+- Contrôle de qualité : une couche vide ou illisible renvoie vers l'OCR
+- Rastérisation en mémoire vers des tableaux NumPy (pas de pdftoppm,
+  pas de fichiers PPM temporaires)
+- pdfium n'est pas thread-safe (même sur des documents différents) : tous
+  les appels d'un processus passent par un même verrou
+"""
+import os
+import re
+import threading
+
+import numpy as np
+import pypdfium2 as pdfium
+
+from app.config import PDF_TEXT_MIN_CHARS
+
+# Caractères de contrôle (hors retours à la ligne / tabulations)
+_CONTROLE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffd]")
+
+# Un seul appel pdfium à la fois dans le processus (tâches de correction,
+# uploads). Réentrant : iter_rendus le reprend pour chaque page.
+_verrou_pdfium = threading.RLock()
+
+
+def _reinitialiser_verrou():
+    # Processus du pool OCR créé par fork pendant qu'un autre thread tenait
+    # le verrou : la copie serait verrouillée pour toujours
+    global _verrou_pdfium
+    _verrou_pdfium = threading.RLock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reinitialiser_verrou)
+
+
+def couche_texte_exploitable(texte: str) -> bool:
+    """
+    Vérifie qu'une couche texte est utilisable telle quelle.
+
+    Rejette les pages scannées (texte vide ou quasi vide), les polices
+    mal encodées (caractères de contrôle / de remplacement) et le texte
+    sans lettres ou fait de « mots » aberrants.
+    """
+    contenu = texte.strip()
+    if len(contenu) < PDF_TEXT_MIN_CHARS:
+        return False
+
+    visibles = [c for c in contenu if not c.isspace()]
+    if not visibles:
+        return False
+
+    if len(_CONTROLE.findall(contenu)) / len(visibles) > 0.02:
+        return False
+
+    if sum(c.isalpha() for c in visibles) / len(visibles) < 0.5:
+        return False
+
+    mots = contenu.split()
+    longueur_moyenne = sum(len(m) for m in mots) / len(mots)
+    return 2 <= longueur_moyenne <= 15
+
+
+def compter_pages(pdf_path: str) -> int:
+    """Nombre de pages (lecture directe, sans pdfinfo)"""
+    with _verrou_pdfium:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+def extraire_couches_texte(pdf_path: str) -> list:
+    """Texte natif de chaque page (chaîne vide si la page n'en a pas)"""
+    textes = []
+    with _verrou_pdfium:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            for i in range(len(pdf)):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    textes.append(textpage.get_text_bounded().replace("\r\n", "\n"))
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+    return textes
+
+
+def extraire_pages_texte_natif(pdf_path: str) -> dict:
+    """
+    Pages dont la couche texte est exploitable.
+
+    Returns:
+        {numéro de page (à partir de 1): texte} ; les pages absentes
+        doivent passer par l'OCR
+    """
+    try:
+        textes = extraire_couches_texte(pdf_path)
+    except Exception as e:
+        print(f"    ⚠️ Lecture de la couche texte impossible : {e}")
+        return {}
+
+    return {
+        i + 1: texte.strip()
+        for i, texte in enumerate(textes)
+        if couche_texte_exploitable(texte)
+    }
+
+
+# ====================================
+# RASTÉRISATION (EN PROCESSUS)
+# ====================================
+
+def _dpi_page(dpi, numero: int) -> int:
+    """DPI d'une page : valeur unique, dict {numéro: dpi} ou fonction numéro → dpi"""
+    if callable(dpi):
+        return dpi(numero)
+    if isinstance(dpi, dict):
+        return dpi.get(numero, 300)
+    return dpi
+
+
+def _rendre(pdf, numero: int, dpi: int, grayscale: bool) -> np.ndarray:
+    page = pdf[numero - 1]
+    try:
+        bitmap = page.render(scale=dpi / 72, grayscale=grayscale)
+        try:
+            # Copie : le tableau ne doit pas survivre au bitmap pdfium
+            tableau = np.array(bitmap.to_numpy(), copy=True)
+        finally:
+            bitmap.close()
+    finally:
+        page.close()
+
+    if tableau.ndim == 3 and tableau.shape[2] == 1:
+        tableau = tableau[:, :, 0]
+    elif tableau.ndim == 3:
+        # pdfium rend en BGR(A) : même ordre que OpenCV
+        tableau = tableau[:, :, :3]
+    return tableau
+
+
+def rendre_page(pdf_path: str, numero: int, dpi: int = 300, grayscale: bool = True) -> np.ndarray:
+    """
+    Rastérise UNE page (numéro à partir de 1).
+
+    Returns:
+        Tableau uint8 (hauteur, largeur) en niveaux de gris,
+        (hauteur, largeur, 3) en BGR sinon
+    """
+    with _verrou_pdfium:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return _rendre(pdf, numero, dpi, grayscale)
+        finally:
+            pdf.close()
+
+
+def iter_rendus(pdf_path: str, numeros=None, dpi=300, grayscale: bool = True):
+    """
+    Génère les pages demandées une par une (document ouvert une seule fois).
+
+    numeros : pages à rendre (à partir de 1), toutes par défaut
+    dpi : valeur unique, dict {numéro: dpi} ou fonction numéro → dpi
+
+    Le verrou pdfium est pris pour chaque page, pas pendant les yield :
+    un autre thread peut rendre ses pages pendant que celles-ci sont OCRisées.
+    """
+    with _verrou_pdfium:
+        pdf = pdfium.PdfDocument(pdf_path)
+        if numeros is None:
+            numeros = range(1, len(pdf) + 1)
+    try:
+        for numero in numeros:
+            with _verrou_pdfium:
+                tableau = _rendre(pdf, numero, _dpi_page(dpi, numero), grayscale)
+            yield tableau
+    finally:
+        with _verrou_pdfium:
+            pdf.close()
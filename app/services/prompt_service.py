@@ -0,0 +1,164 @@
+"""
+Construction des prompts sous budget de tokens
+- Tokens comptés avec le ratio caractères/token RÉEL du modèle, recalé
+  à chaque réponse Groq sur l'usage renvoyé (prompt_tokens)
+- Textes compactés (espaces et lignes vides de l'OCR) avant envoi
+- Texte trop long pour le budget : découpé en morceaux qui se
+  chevauchent, traités en parallèle (map), puis fusionnés (reduce)
+  au lieu d'être tronqués
+"""
+import re
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import PROMPT_BUDGET_TOKENS, PROMPT_CHEVAUCHEMENT_TOKENS, PROMPT_MAX_PARALLELE
+
+# Ratio de départ (français, tokenizer Llama 3) avant la première mesure
+CARACTERES_PAR_TOKEN_INITIAL = 3.5
+
+_verrou = threading.Lock()
+_calibrage = {"caracteres_par_token": CARACTERES_PAR_TOKEN_INITIAL, "mesures": 0}
+
+
+# ====================================
+# COMPTAGE DES TOKENS
+# ====================================
+
+def caracteres_par_token() -> float:
+    with _verrou:
+        return _calibrage["caracteres_par_token"]
+
+
+def compter_tokens(texte: str) -> int:
+    """Nombre de tokens du texte pour le modèle (ratio calibré)"""
+    return int(len(texte) / caracteres_par_token()) + 1
+
+
+def calibrer_tokens(prompt: str, tokens_reels: int) -> None:
+    """
+    Recale le ratio caractères/token sur l'usage réel d'une réponse.
+
+    Moyenne mobile : quelques prompts atypiques (code, tableaux)
+    ne font pas dériver le comptage.
+    """
+    if not tokens_reels or len(prompt) < 200:
+        return
+    ratio = len(prompt) / tokens_reels
+    with _verrou:
+        poids = 1.0 if _calibrage["mesures"] == 0 else 0.1
+        _calibrage["caracteres_par_token"] += poids * (ratio - _calibrage["caracteres_par_token"])
+        _calibrage["mesures"] += 1
+
+
+def get_calibrage_tokens() -> dict:
+    with _verrou:
+        return {
+            "caracteres_par_token": round(_calibrage["caracteres_par_token"], 3),
+            "mesures": _calibrage["mesures"],
+        }
+
+
+# ====================================
+# DÉCOUPAGE EN MORCEAUX
+# ====================================
+
+_ESPACE = re.compile(r"\s+")
+
+
+def compacter(texte: str) -> str:
+    """Supprime les espaces superflus de l'OCR (tokens payés pour rien)"""
+    texte = re.sub(r"[ \t\u00a0]+", " ", texte)
+    texte = re.sub(r" *\n *", "\n", texte)
+    texte = re.sub(r"\n{3,}", "\n\n", texte)
+    return texte.strip()
+
+
+def _coupure(texte: str, debut: int, fin: int) -> int:
+    """Dernière fin de ligne (ou à défaut espace) dans la 2e moitié de [debut, fin]"""
+    milieu = debut + (fin - debut) // 2
+    for separateur in ("\n", " "):
+        position = texte.rfind(separateur, milieu, fin)
+        if position != -1:
+            return position + 1
+    return fin
+
+
+def decouper_en_morceaux(texte: str, budget_tokens: int = None, chevauchement_tokens: int = None) -> list:
+    """
+    Découpe le texte en morceaux d'au plus `budget_tokens` tokens.
+
+    Chaque morceau reprend les `chevauchement_tokens` derniers tokens du
+    précédent : une réponse coupée à la frontière reste lisible dans l'un
+    des deux. Les coupures tombent sur une fin de ligne si possible.
+
+    Returns:
+        [(position de début dans le texte, morceau)]
+    """
+    budget_tokens = budget_tokens or PROMPT_BUDGET_TOKENS
+    chevauchement_tokens = PROMPT_CHEVAUCHEMENT_TOKENS if chevauchement_tokens is None else chevauchement_tokens
+
+    if compter_tokens(texte) <= budget_tokens:
+        return [(0, texte)]
+
+    ratio = caracteres_par_token()
+    taille = max(100, int(budget_tokens * ratio))
+    recouvrement = min(int(chevauchement_tokens * ratio), taille // 4)
+
+    morceaux = []
+    debut = 0
+    while True:
+        fin = len(texte) if debut + taille >= len(texte) else _coupure(texte, debut, debut + taille)
+        morceaux.append((debut, texte[debut:fin]))
+        if fin >= len(texte):
+            return morceaux
+
+        # Le suivant repart `recouvrement` caractères plus tôt, en début de mot
+        suivant = fin - recouvrement
+        espace = _ESPACE.search(texte, suivant, fin) if recouvrement else None
+        if espace:
+            suivant = espace.end()
+        debut = max(debut + 1, suivant)
+
+
+def traiter_morceaux(morceaux: list, traitement, max_workers: int = None) -> list:
+    """
+    Applique `traitement(index, morceau)` à chaque morceau, en parallèle.
+
+    Le contexte (session, étape des métriques) suit chaque appel.
+    Les résultats sont rendus dans l'ordre des morceaux ; la première
+    exception est relancée.
+    """
+    if len(morceaux) == 1:
+        return [traitement(0, morceaux[0])]
+
+    workers = min(len(morceaux), max_workers or PROMPT_MAX_PARALLELE)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, traitement, i, morceau)
+            for i, morceau in enumerate(morceaux)
+        ]
+        return [future.result() for future in futures]
+
+
+# ====================================
+# FUSION DES SEGMENTS
+# ====================================
+
+def fusionner_segments(premier: str, second: str, min_commun: int = 15, max_commun: int = 4000) -> str:
+    """
+    Recolle deux segments consécutifs d'une même réponse.
+
+    La partie commune due au chevauchement (fin du premier = début du
+    second) n'est gardée qu'une fois.
+    """
+    premier, second = compacter(premier), compacter(second)
+    if not premier or premier in second:
+        return second
+    if not second or second in premier:
+        return premier
+
+    for k in range(min(len(premier), len(second), max_commun), min_commun - 1, -1):
+        if premier.endswith(second[:k]):
+            return premier + second[k:]
+    return f"{premier}\n{second}"
@@ -0,0 +1,167 @@
+"""
+Registre de quota OCR.space
+- Sûr entre threads ET entre processus (workers uvicorn) : verrou fichier
+- Incréments atomiques (écriture temporaire + os.replace)
+- Chaque tentative est comptée au moment de la réservation (échecs, timeouts
+  et retries compris) : des requêtes simultanées ne dépassent pas le quota
+- Remise à zéro automatique chaque mois
+- Token bucket : limite par minute appliquée AVANT l'envoi de la requête
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from filelock import FileLock
+
+from app.config import OCR_USAGE_FILE, OCRSPACE_MONTHLY_LIMIT, OCRSPACE_RATE_PER_MINUTE
+
+
+class QuotaEpuiseError(Exception):
+    """Le quota mensuel OCR.space est atteint"""
+
+
+def _mois_courant() -> str:
+    return datetime.now().strftime("%Y-%m")
+
+
+class QuotaLedger:
+    """
+    Compteur mensuel + limiteur par minute partagés via un fichier JSON.
+
+    Le token bucket accepte les réservations « à crédit » : reserver()
+    prend un jeton tout de suite et renvoie le temps à attendre avant
+    d'envoyer la requête. L'appelant dort (time.sleep ou asyncio.sleep)
+    sans garder le verrou.
+    """
+
+    def __init__(self, chemin: str, limite_mensuelle: int, limite_minute: int):
+        self.chemin = chemin
+        self.limite_mensuelle = limite_mensuelle
+        self.limite_minute = max(1, limite_minute)
+        self._verrou = threading.Lock()
+        self._verrou_fichier = FileLock(f"{chemin}.lock")
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture
+    # ------------------------------------------------------------------
+
+    def _etat_initial(self) -> dict:
+        etat = {
+            "mois": _mois_courant(),
+            "utilisees": 0,
+            "jetons": float(self.limite_minute),
+            "maj_jetons": time.time(),
+            "attente_totale_s": 0.0
+        }
+
+        # Reprise de l'ancien compteur texte (ocr_usage.txt : compteur puis mois)
+        ancien = os.path.splitext(self.chemin)[0] + ".txt"
+        if os.path.exists(ancien):
+            try:
+                with open(ancien, 'r') as f:
+                    lignes = f.read().split()
+                if len(lignes) >= 2 and lignes[1] == etat["mois"]:
+                    etat["utilisees"] = int(lignes[0])
+            except (OSError, ValueError):
+                pass
+
+        return etat
+
+    def _lire(self) -> dict:
+        try:
+            with open(self.chemin, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self._etat_initial()
+
+    def _ecrire(self, etat: dict) -> None:
+        tmp = f"{self.chemin}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(etat, f)
+        os.replace(tmp, self.chemin)
+
+    @contextmanager
+    def _transaction(self):
+        """Lecture-modification-écriture exclusive (threads + processus)"""
+        with self._verrou, self._verrou_fichier:
+            etat = self._lire()
+
+            if etat.get("mois") != _mois_courant():
+                etat["mois"] = _mois_courant()
+                etat["utilisees"] = 0
+
+            yield etat
+            self._ecrire(etat)
+
+    def _remplir(self, etat: dict) -> None:
+        """Ajoute les jetons gagnés depuis la dernière mise à jour"""
+        maintenant = time.time()
+        debit = self.limite_minute / 60.0
+        ecoule = max(0.0, maintenant - etat.get("maj_jetons", maintenant))
+        etat["jetons"] = min(float(self.limite_minute), etat.get("jetons", 0.0) + ecoule * debit)
+        etat["maj_jetons"] = maintenant
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def reserver(self) -> float:
+        """
+        Réserve une requête : vérifie le quota mensuel, la compte et prend
+        un jeton, dans la même transaction.
+
+        OCR.space décompte aussi les requêtes en échec : une tentative
+        réservée est comptée, qu'elle réussisse ou non.
+
+        Returns:
+            Le temps (s) à attendre avant d'envoyer la requête
+
+        Raises:
+            QuotaEpuiseError si le quota du mois est atteint
+        """
+        with self._transaction() as etat:
+            if etat["utilisees"] >= self.limite_mensuelle:
+                raise QuotaEpuiseError(
+                    f"Quota OCR.space atteint ({etat['utilisees']}/{self.limite_mensuelle} ce mois)"
+                )
+
+            etat["utilisees"] += 1
+            self._remplir(etat)
+            etat["jetons"] -= 1
+            attente = max(0.0, -etat["jetons"] / (self.limite_minute / 60.0))
+            etat["attente_totale_s"] = etat.get("attente_totale_s", 0.0) + attente
+            return attente
+
+    def annuler_reservation(self) -> None:
+        """Rend une réservation dont la requête n'a finalement pas été envoyée"""
+        with self._transaction() as etat:
+            etat["utilisees"] = max(0, etat["utilisees"] - 1)
+            etat["jetons"] = min(float(self.limite_minute), etat.get("jetons", 0.0) + 1)
+
+    def incrementer(self, n: int = 1) -> int:
+        """Compte n requêtes effectuées, retourne le total du mois"""
+        with self._transaction() as etat:
+            etat["utilisees"] += n
+            return etat["utilisees"]
+
+    def statut(self) -> dict:
+        """Usage courant, budget restant et attente du limiteur"""
+        with self._transaction() as etat:
+            self._remplir(etat)
+            jetons = etat["jetons"]
+            return {
+                "mois": etat["mois"],
+                "utilisees": etat["utilisees"],
+                "restantes": max(0, self.limite_mensuelle - etat["utilisees"]),
+                "limite_mensuelle": self.limite_mensuelle,
+                "limite_par_minute": self.limite_minute,
+                "jetons_disponibles": round(max(0.0, jetons), 2),
+                "attente_prochaine_requete_s": round(max(0.0, (1 - jetons) / (self.limite_minute / 60.0)), 2),
+                "attente_totale_s": round(etat.get("attente_totale_s", 0.0), 2)
+            }
+
+
+ledger = QuotaLedger(OCR_USAGE_FILE, OCRSPACE_MONTHLY_LIMIT, OCRSPACE_RATE_PER_MINUTE)
@@ -0,0 +1,140 @@
+"""
+Limiteur de débit Groq (requêtes/minute et tokens/minute)
+- Partagé par tous les threads du processus
+- Capacité réservée AVANT l'envoi : les threads sont espacés au lieu de
+  partir ensemble puis de dormir ensemble sur un 429
+- Recalibré avec les en-têtes x-ratelimit-* renvoyés par Groq
+"""
+import re
+import time
+import threading
+
+from app.config import GROQ_RPM, GROQ_TPM, GROQ_TOKENS_REPONSE_ESTIMES
+from app.services.prompt_service import compter_tokens
+
+
+def estimer_tokens(prompt: str) -> int:
+    """Tokens du prompt (ratio calibré sur l'usage réel) + réponse attendue"""
+    return compter_tokens(prompt) + GROQ_TOKENS_REPONSE_ESTIMES
+
+
+def lire_duree(valeur) -> float:
+    """Convertit une durée Groq ("7.66s", "2m59.56s", "120ms") en secondes"""
+    if valeur is None:
+        return 0.0
+    try:
+        return float(valeur)
+    except (TypeError, ValueError):
+        pass
+
+    total = 0.0
+    for nombre, unite in re.findall(r"([\d.]+)(ms|h|m|s)", str(valeur)):
+        total += float(nombre) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unite]
+    return total
+
+
+class LimiteurDebit:
+    """
+    Double token bucket (requêtes + tokens) avec réservation « à crédit ».
+
+    reserver() prend la capacité tout de suite (le seau peut devenir
+    négatif) et renvoie le temps à attendre : les appels concurrents sont
+    ainsi servis dans l'ordre, juste sous la limite. L'appelant dort
+    sans garder le verrou.
+    """
+
+    def __init__(self, requetes_par_minute: int, tokens_par_minute: int):
+        self.rpm = max(1, requetes_par_minute)
+        self.tpm = max(1, tokens_par_minute)
+        self._verrou = threading.Lock()
+        self._requetes = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._maj = time.monotonic()
+        self._pause_jusqua = 0.0
+        self.stats = {"requetes": 0, "attente_totale_s": 0.0, "recalibrages": 0, "rate_limits": 0}
+
+    def _remplir(self) -> None:
+        """Ajoute la capacité regagnée depuis la dernière mise à jour (appelé sous verrou)"""
+        maintenant = time.monotonic()
+        ecoule = maintenant - self._maj
+        self._requetes = min(float(self.rpm), self._requetes + ecoule * self.rpm / 60.0)
+        self._tokens = min(float(self.tpm), self._tokens + ecoule * self.tpm / 60.0)
+        self._maj = maintenant
+
+    def reserver(self, tokens: int) -> float:
+        """
+        Réserve une requête de `tokens` tokens estimés.
+
+        Returns:
+            Le temps (s) à attendre avant d'envoyer la requête
+        """
+        tokens = min(tokens, self.tpm)
+        with self._verrou:
+            self._remplir()
+            self._requetes -= 1
+            self._tokens -= tokens
+
+            attente = max(
+                0.0,
+                -self._requetes * 60.0 / self.rpm,
+                -self._tokens * 60.0 / self.tpm,
+                self._pause_jusqua - time.monotonic()
+            )
+            self.stats["requetes"] += 1
+            self.stats["attente_totale_s"] += attente
+            return attente
+
+    def ajuster(self, tokens_estimes: int, tokens_reels: int) -> None:
+        """Corrige la réservation avec l'usage réel (rend ou reprend la différence)"""
+        with self._verrou:
+            self._tokens += min(tokens_estimes, self.tpm) - tokens_reels
+
+    def recalibrer(self, headers) -> None:
+        """
+        Aligne le seau de tokens sur l'état annoncé par Groq.
+
+        x-ratelimit-limit-tokens : limite TPM réelle du compte
+        x-ratelimit-remaining-tokens : tokens encore disponibles
+        x-ratelimit-remaining-requests / reset-requests : quota JOURNALIER
+        """
+        if not headers:
+            return
+
+        with self._verrou:
+            self._remplir()
+
+            limite = headers.get("x-ratelimit-limit-tokens")
+            if limite and limite.isdigit() and int(limite) != self.tpm:
+                self.tpm = int(limite)
+                self._tokens = min(self._tokens, float(self.tpm))
+                self.stats["recalibrages"] += 1
+
+            restants = headers.get("x-ratelimit-remaining-tokens")
+            if restants and restants.isdigit():
+                self._tokens = min(self._tokens, float(restants))
+
+            # Quota du jour épuisé : plus rien avant la remise à zéro
+            if headers.get("x-ratelimit-remaining-requests") == "0":
+                reprise = time.monotonic() + lire_duree(headers.get("x-ratelimit-reset-requests"))
+                self._pause_jusqua = max(self._pause_jusqua, reprise)
+
+    def penaliser(self, attente: float) -> None:
+        """Après un 429 : aucune requête avant `attente` secondes"""
+        with self._verrou:
+            self._pause_jusqua = max(self._pause_jusqua, time.monotonic() + attente)
+            self.stats["rate_limits"] += 1
+
+    def statut(self) -> dict:
+        with self._verrou:
+            self._remplir()
+            return {
+                "limite_requetes_minute": self.rpm,
+                "limite_tokens_minute": self.tpm,
+                "requetes_disponibles": round(max(0.0, self._requetes), 2),
+                "tokens_disponibles": int(max(0.0, self._tokens)),
+                "pause_restante_s": round(max(0.0, self._pause_jusqua - time.monotonic()), 2),
+                **{cle: round(v, 2) if isinstance(v, float) else v for cle, v in self.stats.items()}
+            }
+
+
+limiteur_groq = LimiteurDebit(GROQ_RPM, GROQ_TPM)
@@ -6,7 +6,7 @@ from reportlab.lib.colors import HexColor
 from datetime import datetime
 import os
 
-EXPORT_FOLDER = "exports"
+from app.config import EXPORTS_FOLDER as EXPORT_FOLDER
 
 
 def draw_wrapped_text(c, text, x, y, max_width, font_name="Helvetica", font_size=9, leading=11):
@@ -160,11 +160,12 @@ def generer_rapport_consolide_pdf(resultats_session: list, output_filename: str)
     """
     Génère UN SEUL fichier PDF contenant les rapports de tous les élèves.
     """
-    if not os.path.exists(EXPORT_FOLDER):
-        os.makedirs(EXPORT_FOLDER)
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
     file_path = os.path.join(EXPORT_FOLDER, output_filename)
-    c = canvas.Canvas(file_path, pagesize=A4)
+    # Fichier temporaire puis renommage : un autre worker ne sert jamais un PDF à moitié écrit
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    c = canvas.Canvas(tmp_path, pagesize=A4)
 
     for i, resultat_copie in enumerate(resultats_session):
         _dessiner_rapport_pour_un_eleve(c, resultat_copie)
@@ -173,4 +174,5 @@ def generer_rapport_consolide_pdf(resultats_session: list, output_filename: str)
             c.showPage()
 
     c.save()
+    os.replace(tmp_path, file_path)
     return file_path
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Ordonnanceur de tâches par étapes (graphe copie → questions)
+- UNE limite de concurrence pour toute la session
+- Une file par étape ; une tâche peut en soumettre d'autres (étape suivante)
+- Les étapes en aval passent en premier : une copie découpée est corrigée
+  avant d'en découper d'autres, les résultats arrivent au fil de l'eau
+- Le contexte (session, étape des métriques) suit chaque tâche
+- Annulable : les files sont vidées, les tâches en cours se terminent
+"""
+import time
+import threading
+import contextvars
+from collections import deque
+
+
+class Ordonnanceur:
+    """
+    Pool de `max_concurrence` threads servant des files par étape.
+
+    Usage :
+        with Ordonnanceur(["decoupage", "correction"], 8) as o:
+            o.soumettre("decoupage", fonction, arg1, ...)
+            o.attendre()
+    """
+
+    def __init__(self, etapes: list, max_concurrence: int):
+        self.etapes = list(etapes)
+        self.max_concurrence = max(1, max_concurrence)
+        self._files = {etape: deque() for etape in self.etapes}
+        self._condition = threading.Condition()
+        self._en_cours = 0
+        self._arret = False
+        self._annule = False
+        self._threads = []
+        self.stats = {
+            etape: {"soumises": 0, "terminees": 0, "erreurs": 0, "attente_max_s": 0.0, "duree_totale_s": 0.0}
+            for etape in self.etapes
+        }
+        self.stats_globales = {"concurrence_max": 0}
+
+    def __enter__(self):
+        for i in range(self.max_concurrence):
+            thread = threading.Thread(target=self._boucle, name=f"ordonnanceur-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._arret = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        return False
+
+    def soumettre(self, etape: str, fonction, *args) -> None:
+        """Ajoute une tâche à la file de son étape (appelable depuis une tâche)"""
+        contexte = contextvars.copy_context()
+        with self._condition:
+            if self._annule:
+                return
+            self._files[etape].append((contexte, fonction, args, time.perf_counter()))
+            self.stats[etape]["soumises"] += 1
+            # notify_all : attendre() partage la condition avec les threads
+            self._condition.notify_all()
+
+    def _prochaine(self):
+        """Tâche de l'étape la plus en aval disponible (appelé sous verrou)"""
+        for etape in reversed(self.etapes):
+            if self._files[etape]:
+                return etape, self._files[etape].popleft()
+        return None, None
+
+    def _boucle(self) -> None:
+        while True:
+            with self._condition:
+                etape, tache = self._prochaine()
+                while tache is None:
+                    if self._arret:
+                        return
+                    self._condition.wait()
+                    etape, tache = self._prochaine()
+                self._en_cours += 1
+                self.stats_globales["concurrence_max"] = max(self.stats_globales["concurrence_max"], self._en_cours)
+
+            contexte, fonction, args, soumise = tache
+            debut = time.perf_counter()
+            erreur = False
+            try:
+                contexte.run(fonction, *args)
+            except Exception as e:
+                erreur = True
+                print(f"  ❌ Tâche {etape} : {e}")
+
+            with self._condition:
+                self._en_cours -= 1
+                stats = self.stats[etape]
+                stats["terminees"] += 1
+                stats["erreurs"] += erreur
+                stats["attente_max_s"] = max(stats["attente_max_s"], debut - soumise)
+                stats["duree_totale_s"] += time.perf_counter() - debut
+                self._condition.notify_all()
+
+    def attendre(self, timeout: float = None) -> bool:
+        """
+        Bloque jusqu'à ce que toutes les files soient vides et les tâches finies.
+
+        Returns:
+            False si `timeout` (s) est écoulé avant la fin
+        """
+        fin = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._en_cours or any(self._files.values()):
+                restant = None if fin is None else fin - time.monotonic()
+                if restant is not None and restant <= 0:
+                    return False
+                self._condition.wait(restant)
+            return True
+
+    def annuler(self) -> int:
+        """
+        Vide les files et refuse les nouvelles tâches ; les tâches en cours
+        se terminent. Retourne le nombre de tâches abandonnées.
+        """
+        with self._condition:
+            self._annule = True
+            abandonnees = sum(len(file) for file in self._files.values())
+            for file in self._files.values():
+                file.clear()
+            self._condition.notify_all()
+            return abandonnees
+
+    def resume(self) -> dict:
+        with self._condition:
+            return {
+                "max_concurrence": self.max_concurrence,
+                **self.stats_globales,
+                "etapes": {
+                    etape: {cle: round(v, 3) if isinstance(v, float) else v for cle, v in stats.items()}
+                    for etape, stats in self.stats.items()
+                },
+            }
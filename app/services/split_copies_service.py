@@ -1,14 +1,70 @@
 import os
 from collections import defaultdict
 
-from .ocr_hybrid_service import extract_text_from_file
-from .ai_extract_service import extraire_nom_classe_avec_ia  # ✅ IA
+from app.config import IDENTIFICATION_SEUIL_CONFIANCE
+from .ocr_hybrid_service import extract_text_from_file_with_stats
+from .ai_extract_service import extraire_noms_classes_par_lot  # ✅ IA (pages ambiguës)
+from .extract_utils import identifier_par_regex, NOM_INCONNU, CLASSE_INCONNUE, TAILLE_ENTETE
 
+NIVEAUX_IDENTIFICATION = ("regex", "suite", "ia", "repli")
 
-def decouper_copies_par_eleve(file_path: str) -> dict:
+
+def identifier_eleves(textes_par_page: list) -> tuple:
+    """
+    Identifie l'élève de chaque page par niveaux :
+    - "regex" : patterns sur l'en-tête, confiance suffisante
+    - "suite" : ni marque d'en-tête ni nom candidat → page de suite de
+                l'élève précédent
+    - "ia"    : pages ambiguës (en-tête, ou nom candidat en majuscules sans
+                en-tête), envoyées ensemble en une requête groupée
+    - "repli" : l'IA n'a rien lu sur une page à en-tête → meilleure
+                proposition des regex ; un nom candidat seul que l'IA ne
+                confirme pas reste une page de suite
+    
+    Returns:
+        ([(nom, classe) ou None par page], {niveau: nombre de pages})
+    """
+    analyses = [identifier_par_regex(texte) for texte in textes_par_page]
+    
+    ambigues = {}
+    for i, analyse in enumerate(analyses):
+        if analyse["confiance"] >= IDENTIFICATION_SEUIL_CONFIANCE:
+            continue
+        # La première page doit identifier quelqu'un, même sans en-tête reconnu ;
+        # un nom candidat sans en-tête (OCR abîmé) peut être une nouvelle copie
+        if analyse["entete"] or analyse["patterns"][0] is not None or i == 0:
+            ambigues[i + 1] = textes_par_page[i][:TAILLE_ENTETE]
+    
+    lus_par_ia = extraire_noms_classes_par_lot(ambigues) if ambigues else {}
+    
+    eleves = []
+    niveaux = dict.fromkeys(NIVEAUX_IDENTIFICATION, 0)
+    for i, analyse in enumerate(analyses):
+        page_num = i + 1
+        if analyse["confiance"] >= IDENTIFICATION_SEUIL_CONFIANCE:
+            eleves.append((analyse["nom"], analyse["classe"]))
+            niveaux["regex"] += 1
+        elif page_num in lus_par_ia:
+            eleves.append(lus_par_ia[page_num])
+            niveaux["ia"] += 1
+        elif (analyse["entete"] or i == 0) and analyse["nom"] != NOM_INCONNU:
+            eleves.append((analyse["nom"], analyse["classe"]))
+            niveaux["repli"] += 1
+        else:
+            eleves.append(None)
+            niveaux["suite"] += 1
+    
+    return eleves, niveaux
+
+
+def decouper_copies_par_eleve(file_path: str) -> tuple:
     """
     Analyse un fichier (PDF ou IMAGE) et regroupe par élève.
-    Utilise OCR hybride + IA pour l'extraction du nom/classe.
+    Utilise OCR hybride + regex, et l'IA seulement pour les pages ambiguës.
+    
+    Returns:
+        ({(nom, classe): [pages]}, {niveau d'identification: nombre de pages},
+         statistiques OCR du fichier)
     """
     print(f"\n{'='*60}")
     print(f"📖 Découpage du fichier de copies")
@@ -17,11 +73,11 @@ def decouper_copies_par_eleve(file_path: str) -> dict:
     
     # ÉTAPE 1 : OCR
     print(f"🔍 Extraction du texte avec OCR hybride...")
-    texte_complet = extract_text_from_file(file_path, force_mode=None)
+    texte_complet, stats_ocr = extract_text_from_file_with_stats(file_path, force_mode=None)
     
     if not texte_complet:
         print("❌ Aucun texte extrait.")
-        return {}
+        return {}, {}, stats_ocr
 
     print(f"  ✅ Texte extrait : {len(texte_complet)} caractères")
     
@@ -34,40 +90,35 @@ def decouper_copies_par_eleve(file_path: str) -> dict:
     
     print(f"  ✅ {len(textes_par_page)} page(s) détectée(s)")
 
-    # ÉTAPE 3 : Identifier élèves avec IA
-    print(f"\n🤖 Identification des élèves avec IA...")
+    # ÉTAPE 3 : Identifier élèves (regex, puis IA groupée pour les pages ambiguës)
+    print(f"\n🔍 Identification des élèves...")
+    eleves, niveaux = identifier_eleves(textes_par_page)
     
     groupes = defaultdict(list)
     dernier_eleve_identifie = None
 
-    for i, texte_page in enumerate(textes_par_page):
+    for i, (texte_page, eleve) in enumerate(zip(textes_par_page, eleves)):
         page_num = i + 1
-        print(f"\n  📄 Page {page_num} :")
         
-        # ✅ IA pour extraire nom/classe
-        nom, classe = extraire_nom_classe_avec_ia(texte_page)
+        if eleve:
+            dernier_eleve_identifie = eleve
+            print(f"  📄 Page {page_num} : ✅ {eleve[0]} ({eleve[1]})")
         
-        if nom != "Eleve inconnu":
-            dernier_eleve_identifie = (nom, classe)
-            print(f"     ✅ Nouvel élève → {nom} ({classe})")
+        if not dernier_eleve_identifie:
+            dernier_eleve_identifie = (f"Eleve_{page_num}", CLASSE_INCONNUE)
         
-        if dernier_eleve_identifie:
-            groupes[dernier_eleve_identifie].append({
-                "page_num": page_num,
-                "texte": texte_page
-            })
-        else:
-            dernier_eleve_identifie = (f"Eleve_{page_num}", "Classe inconnue")
-            groupes[dernier_eleve_identifie].append({
-                "page_num": page_num,
-                "texte": texte_page
-            })
+        groupes[dernier_eleve_identifie].append({
+            "page_num": page_num,
+            "texte": texte_page
+        })
 
     # RÉSUMÉ
     print(f"\n{'='*60}")
     print(f"✅ Découpage terminé - {len(groupes)} élève(s)")
+    print(f"  🔎 Pages : {niveaux['regex']} regex, {niveaux['suite']} suite, "
+          f"{niveaux['ia']} IA, {niveaux['repli']} repli regex")
     for (nom, classe), pages in groupes.items():
         print(f"  - {nom} ({classe}) : {len(pages)} page(s)")
     print(f"{'='*60}\n")
     
-    return dict(groupes)
+    return dict(groupes), niveaux, stats_ocr
@@ -0,0 +1,219 @@
+"""
+État partagé entre workers (uvicorn --workers N, plusieurs conteneurs)
+- Petites valeurs JSON par clé, avec expiration optionnelle
+- Baux (leases) : un seul propriétaire à la fois, repris automatiquement
+  à l'expiration si le propriétaire meurt sans libérer
+- EtatLocal : un seul processus (dict + verrou)
+- EtatFichier : un fichier JSON par clé dans un dossier partagé, verrou
+  fichier (même principe que le registre de quota OCR) → plusieurs
+  processus ou conteneurs sur un même volume
+- Interface volontairement proche de Redis (GET / SET EX / SET NX PX / DEL) :
+  une implémentation Redis n'a que _modifier / _lire / _cles à fournir
+"""
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+
+from filelock import FileLock
+
+from app.config import STATE_BACKEND, STATE_FOLDER
+from app.services.cache_service import construire_cle
+
+# Identifiant de ce processus (propriétaire des baux)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class EtatPartage:
+    """
+    Base commune : get / set / supprimer / lister + baux, construits sur
+    une lecture-modification-écriture atomique (_modifier).
+
+    Les entrées sont stockées sous la forme {"cle", "valeur", "expire"}.
+    """
+
+    def _modifier(self, cle: str, fonction):
+        """
+        Applique `fonction(entrée actuelle ou None)` sous verrou exclusif.
+        fonction retourne (nouvelle entrée ou None pour supprimer, résultat).
+        """
+        raise NotImplementedError
+
+    def _lire(self, cle: str):
+        raise NotImplementedError
+
+    def _cles(self) -> list:
+        raise NotImplementedError
+
+    @staticmethod
+    def _valide(entree) -> bool:
+        return entree is not None and (entree.get("expire") is None or entree["expire"] > time.time())
+
+    @staticmethod
+    def _entree(cle: str, valeur, ttl: float = None) -> dict:
+        return {"cle": cle, "valeur": valeur, "expire": time.time() + ttl if ttl else None}
+
+    # ------------------------------------------------------------------
+    # Clé → valeur
+    # ------------------------------------------------------------------
+
+    def get(self, cle: str, defaut=None):
+        entree = self._lire(cle)
+        return entree["valeur"] if self._valide(entree) else defaut
+
+    def set(self, cle: str, valeur, ttl: float = None) -> None:
+        self._modifier(cle, lambda _: (self._entree(cle, valeur, ttl), None))
+
+    def supprimer(self, cle: str) -> None:
+        self._modifier(cle, lambda _: (None, None))
+
+    def lister(self, prefixe: str) -> dict:
+        """{clé: valeur} des entrées valides dont la clé commence par `prefixe`"""
+        valeurs = {}
+        for cle in self._cles():
+            if cle.startswith(prefixe):
+                entree = self._lire(cle)
+                if self._valide(entree):
+                    valeurs[cle] = entree["valeur"]
+        return valeurs
+
+    def purger(self) -> int:
+        """Supprime les entrées expirées, retourne leur nombre"""
+        supprimees = 0
+        for cle in self._cles():
+            supprimees += self._modifier(
+                cle, lambda entree: (None, 1) if entree and not self._valide(entree) else (entree, 0)
+            )
+        return supprimees
+
+    # ------------------------------------------------------------------
+    # Baux
+    # ------------------------------------------------------------------
+
+    def acquerir_bail(self, nom: str, proprietaire: str, duree_s: float) -> bool:
+        """Prend le bail s'il est libre, expiré, ou déjà à `proprietaire`"""
+        cle = f"bail:{nom}"
+
+        def prendre(entree):
+            if self._valide(entree) and entree["valeur"] != proprietaire:
+                return entree, False
+            return self._entree(cle, proprietaire, duree_s), True
+
+        return self._modifier(cle, prendre)
+
+    def renouveler_bail(self, nom: str, proprietaire: str, duree_s: float) -> bool:
+        """Prolonge le bail ; False s'il a été perdu (expiré puis repris)"""
+        cle = f"bail:{nom}"
+
+        def prolonger(entree):
+            if entree is None or entree["valeur"] != proprietaire:
+                return entree, False
+            return self._entree(cle, proprietaire, duree_s), True
+
+        return self._modifier(cle, prolonger)
+
+    def liberer_bail(self, nom: str, proprietaire: str) -> None:
+        self._modifier(f"bail:{nom}",
+                       lambda entree: (None, None) if entree and entree["valeur"] == proprietaire else (entree, None))
+
+    def proprietaire_bail(self, nom: str):
+        """Propriétaire actuel du bail, ou None s'il est libre"""
+        return self.get(f"bail:{nom}")
+
+
+class EtatLocal(EtatPartage):
+    """État d'un seul processus"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._entrees = {}
+
+    def _modifier(self, cle: str, fonction):
+        with self._verrou:
+            nouvelle, resultat = fonction(self._entrees.get(cle))
+            if nouvelle is None:
+                self._entrees.pop(cle, None)
+            else:
+                self._entrees[cle] = nouvelle
+            return resultat
+
+    def _lire(self, cle: str):
+        with self._verrou:
+            return self._entrees.get(cle)
+
+    def _cles(self) -> list:
+        with self._verrou:
+            return list(self._entrees)
+
+
+class EtatFichier(EtatPartage):
+    """
+    État partagé via un dossier : <dossier>/<hash de la clé>.json,
+    écriture atomique, un verrou fichier pour toutes les modifications
+    (opérations courtes, peu de contention).
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._verrou = threading.Lock()
+        self._verrou_fichier = FileLock(os.path.join(folder, "etat.lock"))
+
+    def _chemin(self, cle: str) -> str:
+        return os.path.join(self.folder, f"{construire_cle(cle)[:32]}.json")
+
+    @contextmanager
+    def _exclusif(self):
+        with self._verrou, self._verrou_fichier:
+            yield
+
+    @staticmethod
+    def _lire_fichier(chemin: str):
+        try:
+            with open(chemin, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _modifier(self, cle: str, fonction):
+        chemin = self._chemin(cle)
+        with self._exclusif():
+            nouvelle, resultat = fonction(self._lire_fichier(chemin))
+            if nouvelle is None:
+                try:
+                    os.remove(chemin)
+                except OSError:
+                    pass
+            else:
+                tmp = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(nouvelle, f, ensure_ascii=False)
+                os.replace(tmp, chemin)
+            return resultat
+
+    def _lire(self, cle: str):
+        # os.replace est atomique : lecture sans verrou
+        return self._lire_fichier(self._chemin(cle))
+
+    def _cles(self) -> list:
+        cles = []
+        for nom in os.listdir(self.folder):
+            if nom.endswith(".json"):
+                entree = self._lire_fichier(os.path.join(self.folder, nom))
+                if entree:
+                    cles.append(entree["cle"])
+        return cles
+
+
+def creer_etat(backend: str = STATE_BACKEND, folder: str = STATE_FOLDER) -> EtatPartage:
+    if backend == "fichier":
+        print(f"🔗 État partagé entre workers : {folder}")
+        return EtatFichier(folder)
+    if backend != "local":
+        print(f"⚠️ STATE_BACKEND={backend} inconnu, état local utilisé")
+    return EtatLocal()
+
+
+etat_partage = creer_etat()
@@ -0,0 +1,161 @@
+"""
+Modèles d'examen réutilisables entre sessions
+- Clé = hash du contenu de l'épreuve + hash du contenu de la correction
+- Contenu : barème final (après filtrage) + correction de référence
+  découpée par question
+- Plusieurs classes passent le même examen : seule la première session
+  paie l'OCR de l'épreuve/correction et les appels IA de préparation
+"""
+import os
+import json
+import threading
+from datetime import datetime
+
+from app.config import EXAM_TEMPLATES_ENABLED, EXAM_TEMPLATES_FOLDER
+from app.services.cache_service import hash_fichier, construire_cle
+
+# ⚠️ Incrémenter MODELE_VERSION si l'extraction du barème ou le découpage
+# de la correction change : les anciens modèles ne seront plus trouvés
+MODELE_VERSION = 1
+
+
+class ModelesExamen:
+    """
+    Stock de modèles d'examen : un fichier JSON par modèle
+    (<dossier>/<id>.json, écriture atomique).
+    """
+
+    def __init__(self, folder: str, actif: bool = True):
+        self.folder = folder
+        self.actif = actif
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "enregistrements": 0}
+
+    def _chemin(self, modele_id: str) -> str:
+        return os.path.join(self.folder, f"{modele_id}.json")
+
+    @staticmethod
+    def identifiant(hash_epreuve: str, hash_correction: str) -> str:
+        return construire_cle("modele_examen", MODELE_VERSION, hash_epreuve, hash_correction)[:16]
+
+    def _lire(self, modele_id: str):
+        try:
+            with open(self._chemin(modele_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _ecrire(self, modele: dict) -> None:
+        os.makedirs(self.folder, exist_ok=True)
+        chemin = self._chemin(modele["id"])
+        tmp = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(modele, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, chemin)
+
+    def get(self, modele_id: str):
+        """Modèle par identifiant, ou None"""
+        if not self.actif or not modele_id:
+            return None
+        return self._lire(modele_id)
+
+    def trouver(self, hash_epreuve: str, hash_correction: str):
+        """Modèle correspondant aux deux documents, ou None"""
+        if not self.actif:
+            return None
+        modele = self._lire(self.identifiant(hash_epreuve, hash_correction))
+        with self._lock:
+            self._stats["hits" if modele else "misses"] += 1
+        return modele
+
+    def enregistrer(self, hash_epreuve: str, hash_correction: str, bareme: dict,
+                    corrections: dict, fichiers: dict = None) -> dict:
+        """Enregistre (ou remplace) le modèle des deux documents"""
+        modele = {
+            "id": self.identifiant(hash_epreuve, hash_correction),
+            "version": MODELE_VERSION,
+            "hash_epreuve": hash_epreuve,
+            "hash_correction": hash_correction,
+            "fichiers": fichiers or {},
+            "bareme": bareme,
+            "corrections": corrections,
+            "created_at": datetime.now().isoformat(),
+            "utilisations": 0,
+        }
+        if self.actif:
+            with self._lock:
+                self._ecrire(modele)
+                self._stats["enregistrements"] += 1
+        return modele
+
+    def marquer_utilisation(self, modele_id: str) -> None:
+        with self._lock:
+            modele = self._lire(modele_id)
+            if modele:
+                modele["utilisations"] = modele.get("utilisations", 0) + 1
+                modele["derniere_utilisation"] = datetime.now().isoformat()
+                self._ecrire(modele)
+
+    def lister(self) -> list:
+        """Résumé de tous les modèles (le plus récent d'abord)"""
+        if not os.path.isdir(self.folder):
+            return []
+
+        modeles = []
+        for nom in os.listdir(self.folder):
+            if not nom.endswith(".json"):
+                continue
+            modele = self._lire(nom[:-len(".json")])
+            if modele:
+                modeles.append({
+                    "id": modele["id"],
+                    "fichiers": modele.get("fichiers", {}),
+                    "bareme": modele.get("bareme", {}),
+                    "total_points": sum(modele.get("bareme", {}).values()),
+                    "created_at": modele.get("created_at"),
+                    "utilisations": modele.get("utilisations", 0),
+                    "derniere_utilisation": modele.get("derniere_utilisation"),
+                })
+        return sorted(modeles, key=lambda m: m["created_at"] or "", reverse=True)
+
+    def supprimer(self, modele_id: str) -> bool:
+        """Invalide un modèle, retourne False s'il n'existait pas"""
+        with self._lock:
+            try:
+                os.remove(self._chemin(modele_id))
+                return True
+            except OSError:
+                return False
+
+    def clear(self) -> int:
+        """Invalide tous les modèles, retourne le nombre supprimé"""
+        return sum(self.supprimer(m["id"]) for m in self.lister())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+modeles_examen = ModelesExamen(EXAM_TEMPLATES_FOLDER, actif=EXAM_TEMPLATES_ENABLED)
+
+
+def modele_pour_session(session: dict):
+    """
+    Rattache la session au modèle de ses documents s'il existe déjà.
+
+    Les hash des fichiers sont calculés une fois et gardés dans la session.
+
+    Returns:
+        Le modèle trouvé, ou None (documents manquants ou examen inconnu)
+    """
+    epreuve, correction = session.get("epreuve"), session.get("correction")
+    if not epreuve or not correction:
+        return None
+
+    for document in (epreuve, correction):
+        if not document.get("hash"):
+            document["hash"] = hash_fichier(document["path"])
+
+    modele = modeles_examen.trouver(epreuve["hash"], correction["hash"])
+    session["modele_id"] = modele["id"] if modele else None
+    return modele
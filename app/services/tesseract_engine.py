@@ -0,0 +1,132 @@
+"""
+Moteurs Tesseract interchangeables
+- "cli" : pytesseract (1 processus tesseract + fichier temporaire par appel)
+- "api" : tesserocr (API C, handle chaud par processus/thread, modèle "fra"
+          chargé une seule fois, tableaux NumPy passés directement en mémoire)
+
+Le moteur est choisi par TESSERACT_ENGINE ; "api" retombe sur "cli"
+si tesserocr n'est pas installé.
+"""
+import os
+import threading
+
+import numpy as np
+import pytesseract
+
+from app.config import TESSERACT_ENGINE, TESSERACT_PATH
+
+try:
+    import tesserocr
+except ImportError:  # dépendance optionnelle
+    tesserocr = None
+
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+
+
+class MoteurTesseractCLI:
+    """Tesseract via pytesseract (sous-processus à chaque appel)"""
+
+    nom = "cli"
+
+    def texte(self, image: np.ndarray, lang: str = "fra") -> str:
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def donnees(self, image: np.ndarray, lang: str = "fra") -> dict:
+        return pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+
+
+class MoteurTesseractAPI:
+    """
+    Tesseract via l'API C (tesserocr).
+
+    Un handle PyTessBaseAPI par thread et par processus : il est créé au
+    premier appel puis réutilisé (pas de fork, pas de rechargement du modèle).
+    """
+
+    nom = "api"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _api(self, lang: str):
+        # Après un fork (pool de processus), ne pas réutiliser le handle du parent
+        cle = (os.getpid(), lang)
+        if getattr(self._local, "cle", None) != cle:
+            self._local.api = tesserocr.PyTessBaseAPI(lang=lang)
+            self._local.cle = cle
+        return self._local.api
+
+    def _charger(self, image: np.ndarray, lang: str):
+        image = np.ascontiguousarray(image)
+        if image.ndim == 2:
+            hauteur, largeur = image.shape
+            octets_par_pixel = 1
+        else:
+            hauteur, largeur, octets_par_pixel = image.shape
+
+        api = self._api(lang)
+        api.SetImageBytes(image.tobytes(), largeur, hauteur, octets_par_pixel, largeur * octets_par_pixel)
+        return api
+
+    def texte(self, image: np.ndarray, lang: str = "fra") -> str:
+        api = self._charger(image, lang)
+        try:
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+
+    def donnees(self, image: np.ndarray, lang: str = "fra") -> dict:
+        """Même format que pytesseract.image_to_data(output_type=DICT)"""
+        api = self._charger(image, lang)
+        data = {cle: [] for cle in ("block_num", "par_num", "line_num", "word_num",
+                                    "left", "top", "width", "height", "conf", "text")}
+        try:
+            api.Recognize()
+            iterateur = api.GetIterator()
+            bloc = paragraphe = ligne = mot = 0
+
+            for r in tesserocr.iterate_level(iterateur, tesserocr.RIL.WORD):
+                if r.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                    bloc, paragraphe, ligne = bloc + 1, 0, 0
+                if r.IsAtBeginningOf(tesserocr.RIL.PARA):
+                    paragraphe, ligne = paragraphe + 1, 0
+                if r.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    ligne, mot = ligne + 1, 0
+                mot += 1
+
+                boite = r.BoundingBox(tesserocr.RIL.WORD)
+                if boite is None:
+                    continue
+                x1, y1, x2, y2 = boite
+
+                data["block_num"].append(bloc)
+                data["par_num"].append(paragraphe)
+                data["line_num"].append(ligne)
+                data["word_num"].append(mot)
+                data["left"].append(x1)
+                data["top"].append(y1)
+                data["width"].append(x2 - x1)
+                data["height"].append(y2 - y1)
+                data["conf"].append(r.Confidence(tesserocr.RIL.WORD))
+                data["text"].append(r.GetUTF8Text(tesserocr.RIL.WORD) or "")
+            return data
+        finally:
+            api.Clear()
+
+
+_moteurs = {}
+
+
+def get_moteur(nom=None):
+    """Retourne le moteur Tesseract demandé (TESSERACT_ENGINE par défaut)"""
+    nom = nom or TESSERACT_ENGINE
+
+    if nom == "api" and tesserocr is None:
+        if "api_absent" not in _moteurs:
+            print("⚠️ tesserocr non installé : moteur Tesseract 'cli' utilisé")
+            _moteurs["api_absent"] = True
+        nom = "cli"
+
+    if nom not in _moteurs:
+        _moteurs[nom] = MoteurTesseractAPI() if nom == "api" else MoteurTesseractCLI()
+    return _moteurs[nom]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la détection imprimé/manuscrit
+Compare la détection actuelle (Tesseract pleine page 300 dpi) aux modes vignette
+sur les scans d'exemple de uploads/ (précision + latence)
+
+Usage :
+    python3 bench_detection.py [dossier] [--dpi 100] [--labels labels.json]
+
+labels.json (optionnel) : {"epreuve1.pdf": "printed", "copie.png": "handwritten"}
+Sans labels, la référence est le verdict de la détection actuelle.
+"""
+import os
+import sys
+import json
+import time
+
+from PIL import Image
+
+from app.services.ocr_hybrid_service import (
+    analyser_page_tesseract,
+    creer_vignette,
+    detecter_type_vignette_cv,
+    detecter_type_vignette_tesseract,
+    iter_pdf_pages,
+)
+
+EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+
+def lire_arguments():
+    dossier = "uploads"
+    dpi = 100
+    labels = {}
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        if args[i] == "--dpi":
+            dpi = int(args[i + 1])
+            i += 2
+        elif args[i] == "--labels":
+            with open(args[i + 1], 'r', encoding='utf-8') as f:
+                labels = json.load(f)
+            i += 2
+        else:
+            dossier = args[i]
+            i += 1
+    return dossier, dpi, labels
+
+
+def iter_pages(dossier):
+    """Génère (nom, numéro de page, image 300 dpi) pour chaque échantillon"""
+    for racine, _, fichiers in os.walk(dossier):
+        for nom in sorted(fichiers):
+            chemin = os.path.join(racine, nom)
+            ext = os.path.splitext(nom)[1].lower()
+            if ext not in EXTENSIONS:
+                continue
+            if ext == '.pdf':
+                for i, page in enumerate(iter_pdf_pages(chemin, dpi=300)):
+                    yield nom, i + 1, page
+            else:
+                yield nom, 1, Image.open(chemin)
+
+
+def chronometrer(fonction, *args):
+    debut = time.perf_counter()
+    resultat = fonction(*args)
+    return resultat, time.perf_counter() - debut
+
+
+def main():
+    dossier, dpi, labels = lire_arguments()
+
+    modes = {
+        "tesseract_300dpi": lambda page: analyser_page_tesseract(page)["type"],
+        f"vignette_cv_{dpi}dpi": lambda page: detecter_type_vignette_cv(creer_vignette(page, 300, dpi))["type"],
+        f"vignette_tesseract_{dpi}dpi": lambda page: detecter_type_vignette_tesseract(creer_vignette(page, 300, dpi))["type"],
+    }
+    stats = {mode: {"ok": 0, "total": 0, "duree": 0.0} for mode in modes}
+
+    print("=" * 90)
+    print(f"🧪 BENCHMARK DÉTECTION IMPRIMÉ / MANUSCRIT ({dossier})")
+    print("=" * 90)
+    print(f"{'Fichier':<40} {'Page':>4}  " + "  ".join(f"{m:>26}" for m in modes))
+
+    for nom, numero, page in iter_pages(dossier):
+        verdicts = {}
+        for mode, detecter in modes.items():
+            verdict, duree = chronometrer(detecter, page)
+            verdicts[mode] = verdict
+            stats[mode]["duree"] += duree
+
+        reference = labels.get(nom, verdicts["tesseract_300dpi"])
+        for mode, verdict in verdicts.items():
+            stats[mode]["total"] += 1
+            stats[mode]["ok"] += verdict == reference
+
+        print(f"{nom[:40]:<40} {numero:>4}  " + "  ".join(f"{verdicts[m]:>26}" for m in modes))
+
+    print("-" * 90)
+    reference = "labels" if labels else "tesseract_300dpi"
+    print(f"Référence : {reference}")
+    for mode, s in stats.items():
+        if not s["total"]:
+            continue
+        precision = s["ok"] / s["total"] * 100
+        latence = s["duree"] / s["total"] * 1000
+        print(f"  {mode:<28} précision {precision:5.1f}%   latence {latence:8.1f} ms/page")
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark des moteurs de rastérisation PDF
+Compare pdf2image (pdftoppm en sous-processus + fichiers PPM) et pypdfium2
+(rendu en processus, NumPy niveaux de gris) : pages/s et pic mémoire
+
+Chaque moteur est mesuré dans un processus neuf pour que les pics
+mémoire (ru_maxrss) ne se mélangent pas.
+
+Usage :
+    python3 bench_rasterisation.py [fichier ou dossier] [--dpi 300] [--repetitions 3]
+"""
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+
+MOTEURS = ("pdf2image", "pdfium")
+
+
+def lister_pdfs(cible):
+    if os.path.isdir(cible):
+        return [
+            os.path.join(racine, nom)
+            for racine, _, noms in os.walk(cible)
+            for nom in sorted(noms) if nom.lower().endswith('.pdf')
+        ]
+    return [cible]
+
+
+def mesurer(moteur, pdfs, dpi, repetitions):
+    """Exécuté dans le processus fils : rastérise tout et renvoie les mesures"""
+    from app.services.ocr_hybrid_service import iter_pdf_pages, _taille_image
+
+    pages = 0
+    octets_pic = 0
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        for pdf in pdfs:
+            for page in iter_pdf_pages(pdf, dpi=dpi, grayscale=True, moteur=moteur):
+                pages += 1
+                octets_pic = max(octets_pic, _taille_image(page))
+                del page
+    duree = time.perf_counter() - debut
+
+    return {
+        "pages": pages,
+        "duree": duree,
+        "page_mo": octets_pic / (1024 * 1024),
+        "rss_pic_mo": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_enfants_mo": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def lancer(moteur, cible, dpi, repetitions):
+    """Lance la mesure d'un moteur dans un processus neuf"""
+    commande = [sys.executable, __file__, cible, "--dpi", str(dpi),
+                "--repetitions", str(repetitions), "--moteur", moteur]
+    sortie = subprocess.run(commande, capture_output=True, text=True)
+    if sortie.returncode != 0:
+        return {"erreur": (sortie.stderr.strip().splitlines() or ["échec"])[-1]}
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+def lire_arguments(args):
+    options = {"cible": "uploads", "dpi": 300, "repetitions": 3, "moteur": None}
+    i = 0
+    while i < len(args):
+        if args[i] in ("--dpi", "--repetitions"):
+            options[args[i][2:]] = int(args[i + 1])
+            i += 2
+        elif args[i] == "--moteur":
+            options["moteur"] = args[i + 1]
+            i += 2
+        else:
+            options["cible"] = args[i]
+            i += 1
+    return options
+
+
+def main():
+    options = lire_arguments(sys.argv[1:])
+    pdfs = lister_pdfs(options["cible"])
+    if not pdfs:
+        print(f"❌ Aucun PDF trouvé dans {options['cible']}")
+        sys.exit(1)
+
+    # Processus fils : une seule mesure, résultat en JSON sur la dernière ligne
+    if options["moteur"]:
+        print(json.dumps(mesurer(options["moteur"], pdfs, options["dpi"], options["repetitions"])))
+        return
+
+    print("=" * 70)
+    print("🧪 BENCH RASTÉRISATION PDF")
+    print("=" * 70)
+    print(f"  📄 {len(pdfs)} PDF  |  {options['dpi']} dpi niveaux de gris  |  {options['repetitions']} répétition(s)")
+
+    resultats = {}
+    for moteur in MOTEURS:
+        r = lancer(moteur, options["cible"], options["dpi"], options["repetitions"])
+        resultats[moteur] = r
+        print(f"\n  ⚙️  {moteur}")
+        if "erreur" in r:
+            print(f"    ❌ {r['erreur']}")
+            continue
+        print(f"    ⏱️  {r['pages']} pages en {r['duree']:.2f}s  →  {r['pages'] / r['duree']:.2f} pages/s")
+        print(f"    🧠 Pic RSS : {r['rss_pic_mo']:.0f} Mo (+ {r['rss_enfants_mo']:.0f} Mo sous-processus)"
+              f"  |  page : {r['page_mo']:.1f} Mo")
+
+    if all("erreur" not in r for r in resultats.values()):
+        a, b = resultats["pdf2image"], resultats["pdfium"]
+        gain = (b["pages"] / b["duree"]) / (a["pages"] / a["duree"])
+        print(f"\n  🚀 pdfium : x{gain:.2f} pages/s par rapport à pdf2image")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
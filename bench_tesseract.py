@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark des moteurs Tesseract
+Compare pytesseract (1 processus + PNG temporaire par appel) et tesserocr
+(API C, moteur chaud) sur les mêmes pages pré-traitées
+
+Usage :
+    python3 bench_tesseract.py [fichier ou dossier] [--repetitions 3]
+"""
+import os
+import sys
+import time
+
+from PIL import Image
+
+from app.services.ocr_hybrid_service import iter_pdf_pages, preprocess_array_for_tesseract
+from app.services.tesseract_engine import MoteurTesseractAPI, MoteurTesseractCLI, tesserocr
+
+EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+
+def charger_pages(cible):
+    """Pages pré-traitées (tableaux NumPy) de tous les échantillons"""
+    fichiers = []
+    if os.path.isdir(cible):
+        for racine, _, noms in os.walk(cible):
+            fichiers += [os.path.join(racine, n) for n in sorted(noms) if n.lower().endswith(EXTENSIONS)]
+    else:
+        fichiers = [cible]
+
+    pages = []
+    for chemin in fichiers:
+        if chemin.lower().endswith('.pdf'):
+            images = iter_pdf_pages(chemin, dpi=300)
+        else:
+            images = [Image.open(chemin).convert('RGB')]
+        for image in images:
+            pages.append(preprocess_array_for_tesseract(image))
+    return pages
+
+
+def mesurer(moteur, pages, repetitions):
+    """Temps moyen par page (texte seul, puis texte + données mot à mot)"""
+    # Échauffement : chargement du modèle pour le moteur API
+    moteur.texte(pages[0])
+
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        for page in pages:
+            moteur.texte(page)
+    par_page_texte = (time.perf_counter() - debut) / (repetitions * len(pages))
+
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        for page in pages:
+            moteur.donnees(page)
+    par_page_donnees = (time.perf_counter() - debut) / (repetitions * len(pages))
+
+    return par_page_texte, par_page_donnees
+
+
+def main():
+    args = sys.argv[1:]
+    repetitions = 3
+    if "--repetitions" in args:
+        i = args.index("--repetitions")
+        repetitions = int(args[i + 1])
+        del args[i:i + 2]
+    cible = args[0] if args else "uploads"
+
+    pages = charger_pages(cible)
+    if not pages:
+        print(f"❌ Aucune page trouvée dans {cible}")
+        sys.exit(1)
+
+    moteurs = [MoteurTesseractCLI()]
+    if tesserocr is not None:
+        moteurs.append(MoteurTesseractAPI())
+    else:
+        print("⚠️ tesserocr non installé : seul le moteur 'cli' est mesuré")
+
+    print("=" * 70)
+    print(f"🧪 BENCHMARK MOTEURS TESSERACT ({len(pages)} page(s) × {repetitions})")
+    print("=" * 70)
+
+    resultats = {}
+    for moteur in moteurs:
+        resultats[moteur.nom] = mesurer(moteur, pages, repetitions)
+        texte, donnees = resultats[moteur.nom]
+        print(f"  {moteur.nom:<4} : texte {texte * 1000:8.1f} ms/page   texte+mots {donnees * 1000:8.1f} ms/page")
+
+    if "api" in resultats:
+        gain_texte = resultats["cli"][0] / resultats["api"][0]
+        gain_donnees = resultats["cli"][1] / resultats["api"][1]
+        print(f"  ⚡ Accélération API : x{gain_texte:.2f} (texte), x{gain_donnees:.2f} (texte+mots)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
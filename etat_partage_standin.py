@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Banc de test de l'état partagé entre workers (STATE_BACKEND=fichier)
+Deux processus sur un même STATE_FOLDER, SANS serveur ni IA :
+- exclusivité : les deux processus se disputent un bail, jamais deux
+  propriétaires en même temps
+- reprise : un porteur figé (SIGSTOP) perd son bail à l'expiration, l'autre
+  processus le reprend ; le porteur relancé constate la perte
+- annulation : une correction (simulée) tourne sur le worker A, le worker B
+  la voit, y est rattaché s'il la redemande, et l'annule
+
+Usage :
+    python3 etat_partage_standin.py [--scenario tous] [--duree 3] [--bail 1.0]
+
+Scénarios : exclusivite, reprise, annulation, tous
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import tempfile
+import subprocess
+
+ICI = os.path.dirname(os.path.abspath(__file__))
+
+
+def _sortie(**valeurs):
+    print(json.dumps(valeurs), flush=True)
+
+
+# ====================================
+# PROCESSUS FILS
+# ====================================
+
+def fils_exclusivite(dossier: str, duree: float):
+    """Prend / rend le bail en boucle ; compte les fois où quelqu'un d'autre était dans la section"""
+    from app.services.state_service import EtatFichier, WORKER_ID
+    etat = EtatFichier(dossier)
+    acquisitions = violations = 0
+    fin = time.monotonic() + duree
+    while time.monotonic() < fin:
+        if not etat.acquerir_bail("exclusif", WORKER_ID, 5.0):
+            continue
+        acquisitions += 1
+        if etat.get("occupant") not in (None, WORKER_ID):
+            violations += 1
+        etat.set("occupant", WORKER_ID)
+        time.sleep(0.005)
+        etat.supprimer("occupant")
+        etat.liberer_bail("exclusif", WORKER_ID)
+        # Laisser une chance à l'autre processus (un worker ne reprend pas le bail aussitôt)
+        time.sleep(random.uniform(0, 0.02))
+    _sortie(worker=WORKER_ID, acquisitions=acquisitions, violations=violations)
+
+
+def fils_porteur(dossier: str, bail: float):
+    """Prend le bail puis le renouvelle jusqu'à le perdre"""
+    from app.services.state_service import EtatFichier, WORKER_ID
+    etat = EtatFichier(dossier)
+    _sortie(evenement="pris", ok=etat.acquerir_bail("reprise", WORKER_ID, bail))
+    while etat.renouveler_bail("reprise", WORKER_ID, bail):
+        time.sleep(bail / 4)
+    _sortie(evenement="perdu", proprietaire=etat.proprietaire_bail("reprise"))
+
+
+def fils_preneur(dossier: str, bail: float):
+    """Tente de prendre le bail tout de suite, puis jusqu'à y arriver"""
+    from app.services.state_service import EtatFichier, WORKER_ID
+    etat = EtatFichier(dossier)
+    debut = time.monotonic()
+    _sortie(evenement="premier_essai", ok=etat.acquerir_bail("reprise", WORKER_ID, bail))
+    while not etat.acquerir_bail("reprise", WORKER_ID, bail):
+        time.sleep(0.05)
+    _sortie(evenement="repris", apres_s=round(time.monotonic() - debut, 2), worker=WORKER_ID)
+    # Garder le bail le temps que le porteur constate la perte
+    while etat.renouveler_bail("reprise", WORKER_ID, bail):
+        time.sleep(bail / 4)
+
+
+def fils_correction(session_id: str):
+    """Worker A : lance une correction simulée (20 copies, ~5 s) et attend sa fin"""
+    from app.database import depot_sessions
+    from app.services import job_service
+    from app.services.correction_service import CorrectionAnnulee
+
+    def correction_simulee(sid, suivi):
+        suivi.etape("copies")
+        suivi.debut_copies([{"nom_eleve": f"Élève {i + 1}"} for i in range(20)], 1)
+        for i in range(20):
+            if suivi.annulee():
+                raise CorrectionAnnulee(f"Correction annulée : {i}/20 copie(s) terminée(s)")
+            time.sleep(0.25)
+            suivi.questions_terminees(i, 1)
+            suivi.copie_terminee(i, {"nom_eleve": f"Élève {i + 1}", "note_finale": 10.0, "details": []})
+        return []
+
+    job_service.lancer_correction_automatique = correction_simulee
+    depot_sessions.creer(session_id, [], status="ready_to_correct")
+    gestionnaire = job_service.GestionnaireTaches(1)
+    tache, _ = gestionnaire.soumettre(session_id)
+    _sortie(evenement="lancee", job_id=tache["job_id"], worker=tache["worker"])
+
+    while True:
+        etat = gestionnaire.statut(tache["job_id"], avec_resultats=False)
+        if etat["statut"] not in job_service.STATUTS_ACTIFS:
+            break
+        time.sleep(0.1)
+    _sortie(evenement="fin", statut=etat["statut"], copies=etat["progression"]["copies_terminees"],
+            session=depot_sessions.statut(session_id))
+
+
+def fils_annulation(session_id: str, job_id: str):
+    """Worker B : voit la tâche de A, y est rattaché s'il la redemande, puis l'annule"""
+    from app.services import job_service
+    from app.services.state_service import WORKER_ID
+    gestionnaire = job_service.GestionnaireTaches(1)
+
+    vue = gestionnaire.statut(job_id, avec_resultats=False)
+    existante, deja = gestionnaire.soumettre(session_id)
+    _sortie(evenement="vue", worker=WORKER_ID, statut=vue["statut"], worker_tache=vue["worker"],
+            rattachee=deja and existante["job_id"] == job_id)
+
+    debut = time.monotonic()
+    gestionnaire.annuler(job_id)
+    while gestionnaire.statut(job_id, avec_resultats=False)["statut"] in job_service.STATUTS_ACTIFS:
+        time.sleep(0.05)
+    _sortie(evenement="annulee", delai_s=round(time.monotonic() - debut, 2))
+
+
+# ====================================
+# ORCHESTRATION
+# ====================================
+
+def _lancer(env: dict, *args) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "fils", *map(str, args)],
+                            cwd=ICI, env=env, stdout=subprocess.PIPE, text=True)
+
+
+def _lire(processus: subprocess.Popen, evenement: str = None) -> dict:
+    """Prochaine ligne JSON du fils (les affichages de l'application sont ignorés)"""
+    for ligne in processus.stdout:
+        if ligne.startswith("{"):
+            valeur = json.loads(ligne)
+            if evenement is None or valeur.get("evenement") == evenement:
+                return valeur
+    raise RuntimeError(f"Processus {processus.pid} terminé sans « {evenement or 'résultat'} »")
+
+
+def _environnement(racine: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "STATE_BACKEND": "fichier",
+        "STATE_FOLDER": os.path.join(racine, "etat"),
+        "DATABASE_PATH": os.path.join(racine, "sessions.db"),
+        "CHECKPOINT_FOLDER": os.path.join(racine, "checkpoints"),
+        "CACHE_FOLDER": os.path.join(racine, "cache"),
+        "OCR_USAGE_FILE": os.path.join(racine, "ocr_usage.json"),
+        "PYTHONPATH": ICI,
+    })
+    return env
+
+
+def scenario_exclusivite(env: dict, duree: float) -> bool:
+    dossier = os.path.join(tempfile.mkdtemp(), "etat")
+    fils = [_lancer(env, "exclusivite", dossier, duree) for _ in range(2)]
+    resultats = [_lire(p) for p in fils]
+    for p in fils:
+        p.wait()
+
+    print(f"\n🔒 Exclusivité ({duree:.0f}s, 2 processus)")
+    for r in resultats:
+        print(f"  - {r['worker']} : {r['acquisitions']} acquisition(s), {r['violations']} violation(s)")
+    ok = all(r["acquisitions"] for r in resultats) and not any(r["violations"] for r in resultats)
+    print(f"  {'✅' if ok else '❌'} Jamais deux propriétaires du bail en même temps")
+    return ok
+
+
+def scenario_reprise(env: dict, bail: float) -> bool:
+    dossier = os.path.join(tempfile.mkdtemp(), "etat")
+    porteur = _lancer(env, "porteur", dossier, bail)
+    pris = _lire(porteur, "pris")
+
+    # Worker figé (GC, swap, conteneur suspendu) : il ne renouvelle plus
+    os.kill(porteur.pid, signal.SIGSTOP)
+    preneur = _lancer(env, "preneur", dossier, bail)
+    premier = _lire(preneur, "premier_essai")
+    repris = _lire(preneur, "repris")
+
+    os.kill(porteur.pid, signal.SIGCONT)
+    perdu = _lire(porteur, "perdu")
+    porteur.wait(timeout=10)
+    preneur.kill()
+    preneur.wait()
+
+    print(f"\n⏳ Reprise après expiration (bail {bail}s, porteur figé par SIGSTOP)")
+    print(f"  - Porteur : bail pris = {pris['ok']}")
+    print(f"  - Preneur : premier essai = {premier['ok']}, repris après {repris['apres_s']}s")
+    print(f"  - Porteur relancé : bail perdu, propriétaire = {perdu['proprietaire']}")
+    ok = (pris["ok"] and not premier["ok"] and repris["apres_s"] <= bail * 3
+          and perdu["proprietaire"] == repris["worker"])
+    print(f"  {'✅' if ok else '❌'} Bail repris à l'expiration, perte constatée par l'ancien porteur")
+    return ok
+
+
+def scenario_annulation(env: dict) -> bool:
+    session_id = "session-standin"
+
+    worker_a = _lancer(env, "correction", session_id)
+    lancee = _lire(worker_a, "lancee")
+    time.sleep(1.0)
+    worker_b = _lancer(env, "annulation", session_id, lancee["job_id"])
+    vue = _lire(worker_b, "vue")
+    annulee = _lire(worker_b, "annulee")
+    fin = _lire(worker_a, "fin")
+    for p in (worker_a, worker_b):
+        p.wait(timeout=30)
+
+    print(f"\n🛑 Relais de l'annulation (tâche sur {lancee['worker']})")
+    print(f"  - Worker B ({vue['worker']}) voit la tâche : {vue['statut']} sur {vue['worker_tache']}")
+    print(f"  - Nouvelle demande sur B rattachée à la tâche de A : {vue['rattachee']}")
+    print(f"  - Annulée depuis B en {annulee['delai_s']}s : statut {fin['statut']}, "
+          f"{fin['copies']}/20 copie(s), session {fin['session']}")
+    ok = (vue["worker"] != lancee["worker"] and vue["statut"] == "en_cours" and vue["rattachee"]
+          and fin["statut"] == "annulee" and fin["copies"] < 20 and fin["session"] == "ready_to_correct")
+    print(f"  {'✅' if ok else '❌'} Annulation relayée au worker qui porte la tâche")
+    return ok
+
+
+def lire_options(args: list) -> dict:
+    options = {"scenario": "tous", "duree": 3.0, "bail": 1.0}
+    for i in range(0, len(args) - 1, 2):
+        if args[i] == "--scenario":
+            options["scenario"] = args[i + 1]
+        elif args[i] in ("--duree", "--bail"):
+            options[args[i][2:]] = float(args[i + 1])
+    return options
+
+
+def main():
+    options = lire_options(sys.argv[1:])
+    env = _environnement(tempfile.mkdtemp())
+    scenarios = {
+        "exclusivite": lambda: scenario_exclusivite(env, options["duree"]),
+        "reprise": lambda: scenario_reprise(env, options["bail"]),
+        "annulation": lambda: scenario_annulation(env),
+    }
+    choisis = list(scenarios) if options["scenario"] == "tous" else [options["scenario"]]
+    if any(nom not in scenarios for nom in choisis):
+        print(__doc__)
+        sys.exit(1)
+
+    print("=" * 70)
+    print("🧪 ÉTAT PARTAGÉ ENTRE WORKERS (EtatFichier, 2 processus)")
+    print("=" * 70)
+    resultats = {nom: scenarios[nom]() for nom in choisis}
+    print("\n" + "=" * 70)
+    print(f"  {sum(resultats.values())}/{len(resultats)} scénario(s) OK")
+    print("=" * 70)
+    sys.exit(0 if all(resultats.values()) else 1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "fils":
+        role, args = sys.argv[2], sys.argv[3:]
+        if role == "exclusivite":
+            fils_exclusivite(args[0], float(args[1]))
+        elif role == "porteur":
+            fils_porteur(args[0], float(args[1]))
+        elif role == "preneur":
+            fils_preneur(args[0], float(args[1]))
+        elif role == "correction":
+            fils_correction(args[0])
+        elif role == "annulation":
+            fils_annulation(args[0], args[1])
+    else:
+        main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Fournisseurs d'IA simulés pour tester le routeur (bascule + hedging)
+SANS clé API ni réseau : latence, erreurs et rate limits injectés
+
+Usage :
+    python3 llm_mock_providers.py [--requetes 60] [--concurrence 4] [--scenario tous]
+
+Scénarios : nominal, panne, rate_limit, lent (sans puis avec hedging)
+"""
+import sys
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.llm_router import RouteurIA
+
+
+class RateLimitSimule(Exception):
+    """Imite groq.RateLimitError (429)"""
+
+    def __init__(self):
+        super().__init__("Error code: 429 - rate_limit_exceeded (simulé)")
+
+
+class FournisseurSimule:
+    """
+    Fournisseur factice : fonction(prompt, max_retries) -> texte JSON.
+
+    latence : latence habituelle (s)
+    part_lente / latence_lente : part des appels très lents (queue de distribution)
+    erreurs : part d'erreurs serveur, rate_limit : part de 429
+    """
+
+    def __init__(self, nom, latence=0.2, part_lente=0.0, latence_lente=3.0, erreurs=0.0, rate_limit=0.0):
+        self.nom = nom
+        self.latence = latence
+        self.part_lente = part_lente
+        self.latence_lente = latence_lente
+        self.erreurs = erreurs
+        self.rate_limit = rate_limit
+        self.appels = 0
+        self._verrou = threading.Lock()
+
+    def __call__(self, prompt, max_retries=3):
+        for tentative in range(max_retries):
+            with self._verrou:
+                self.appels += 1
+
+            lent = random.random() < self.part_lente
+            time.sleep(self.latence_lente if lent else random.uniform(0.5, 1.5) * self.latence)
+
+            tirage = random.random()
+            if tirage < self.rate_limit:
+                erreur = RateLimitSimule()
+            elif tirage < self.rate_limit + self.erreurs:
+                erreur = RuntimeError(f"Error code: 503 - {self.nom} indisponible (simulé)")
+            else:
+                return json.dumps({"fournisseur": self.nom, "prompt": prompt[:20]})
+
+            if tentative == max_retries - 1:
+                raise erreur
+            time.sleep(0.05 * (2 ** tentative))
+
+
+SCENARIOS = {
+    "nominal": (dict(), dict(), False),
+    "panne": (dict(erreurs=1.0), dict(), False),
+    "rate_limit": (dict(rate_limit=0.3), dict(latence=0.3), False),
+    "lent": (dict(part_lente=0.04), dict(latence=0.3), False),
+    "lent_hedging": (dict(part_lente=0.04), dict(latence=0.3), True),
+}
+
+
+def percentile(valeurs, p):
+    triees = sorted(valeurs)
+    return triees[min(len(triees) - 1, int(len(triees) * p))] if triees else 0.0
+
+
+def executer(nom, nb_requetes, concurrence):
+    options_groq, options_gemini, hedging = SCENARIOS[nom]
+    groq = FournisseurSimule("groq", **options_groq)
+    gemini = FournisseurSimule("gemini", **options_gemini)
+    routeur = RouteurIA({"groq": groq, "gemini": gemini}, hedging=hedging,
+                        delai_hedge_defaut=1.0, pause_rate_limit=1.0, pause_echecs=2.0)
+
+    latences, echecs, gagnants = [], [], {"groq": 0, "gemini": 0}
+
+    def une_requete(i):
+        debut = time.perf_counter()
+        try:
+            _, fournisseur = routeur.appeler(f"Question {i}", "groq")
+            latences.append(time.perf_counter() - debut)
+            gagnants[fournisseur] += 1
+        except Exception as e:
+            echecs.append(str(e))
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as executor:
+        list(executor.map(une_requete, range(nb_requetes)))
+    duree = time.perf_counter() - debut
+
+    statut = routeur.statut()
+    print(f"\n  🎬 {nom}{' (hedging)' if hedging else ''}")
+    print(f"    ✅ {len(latences)}/{nb_requetes} OK en {duree:.1f}s  |  "
+          f"p50 {percentile(latences, 0.5):.2f}s  p95 {percentile(latences, 0.95):.2f}s  "
+          f"max {max(latences, default=0):.2f}s")
+    print(f"    🔀 Bascules : {statut['bascules']}  |  🏁 Hedges : {statut['hedges']}  |  "
+          f"Réponses : groq {gagnants['groq']}, gemini {gagnants['gemini']}")
+    print(f"    📨 Appels fournisseurs : groq {groq.appels}, gemini {gemini.appels}")
+    for nom_f, sante in statut["fournisseurs"].items():
+        print(f"    🩺 {nom_f} : {sante['succes']} succès, {sante['echecs']} échec(s), "
+              f"{sante['rate_limits']} rate limit(s), p95 {sante['latence_p95_s'] or '-'}s")
+    for erreur in echecs[:3]:
+        print(f"    ❌ {erreur}")
+
+
+def main():
+    args = sys.argv[1:]
+    options = {"requetes": 60, "concurrence": 4, "scenario": "tous"}
+    for i in range(0, len(args) - 1, 2):
+        cle = args[i].lstrip("-")
+        if cle in options:
+            options[cle] = args[i + 1] if cle == "scenario" else int(args[i + 1])
+
+    scenarios = list(SCENARIOS) if options["scenario"] == "tous" else [options["scenario"]]
+
+    print("=" * 70)
+    print("🧪 ROUTEUR IA CONTRE FOURNISSEURS SIMULÉS")
+    print("=" * 70)
+    print(f"  📨 {options['requetes']} requêtes, concurrence {options['concurrence']}, principal : groq")
+    for nom in scenarios:
+        executer(nom, options["requetes"], options["concurrence"])
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Serveur local imitant l'API OCR.space (format de réponse identique)
+Permet de tester le débit et la gestion des erreurs SANS quota ni réseau
+
+Usage :
+    # Serveur seul (puis OCRSPACE_URL=http://127.0.0.1:8088/parse/image)
+    python3 ocrspace_standin.py serve [--port 8088] [--latence 0.5] [--erreurs 0.1] [--rate-limit 0.05]
+
+    # Banc de test du client asynchrone contre le serveur local
+    python3 ocrspace_standin.py bench [--requetes 50] [--concurrence 4] [--latence 0.5] [--erreurs 0.1]
+                                      [--par-minute 0]  (limiteur de quota temporaire, 0 = désactivé)
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+import threading
+from email.parser import BytesParser
+from email.policy import default as politique_email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONFIG = {
+    "latence": 0.5,       # secondes par page
+    "erreurs": 0.0,       # part de réponses HTTP 503
+    "rate_limit": 0.0,    # part de réponses HTTP 429
+    "erreurs_traitement": 0.0,  # part de IsErroredOnProcessing (erreur définitive)
+}
+COMPTEURS = {"requetes": 0, "503": 0, "429": 0, "erreurs_traitement": 0, "ok": 0}
+_verrou = threading.Lock()
+
+
+def _compter(cle):
+    with _verrou:
+        COMPTEURS[cle] += 1
+
+
+def _lire_multipart(content_type: str, corps: bytes) -> dict:
+    """Retourne {nom du champ: contenu brut}"""
+    message = BytesParser(policy=politique_email).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + corps
+    )
+    champs = {}
+    for partie in message.iter_parts():
+        nom = partie.get_param('name', header='content-disposition')
+        champs[nom] = partie.get_payload(decode=True)
+    return champs
+
+
+def _compter_pages(contenu: bytes) -> int:
+    if contenu.startswith(b"%PDF"):
+        return max(1, len(re.findall(rb"/Type\s*/Page(?!s)", contenu)))
+    return 1
+
+
+class OCRSpaceStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _repondre(self, statut: int, corps: dict):
+        donnees = json.dumps(corps).encode("utf-8")
+        self.send_response(statut)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(donnees)))
+        self.end_headers()
+        self.wfile.write(donnees)
+
+    def do_POST(self):
+        debut = time.perf_counter()
+        longueur = int(self.headers.get("Content-Length", 0))
+        corps = self.rfile.read(longueur)
+        _compter("requetes")
+
+        tirage = random.random()
+        if tirage < CONFIG["erreurs"]:
+            _compter("503")
+            return self._repondre(503, {"error": "Service Unavailable"})
+        if tirage < CONFIG["erreurs"] + CONFIG["rate_limit"]:
+            _compter("429")
+            return self._repondre(429, {"error": "Too Many Requests"})
+
+        champs = _lire_multipart(self.headers.get("Content-Type", ""), corps)
+        fichier = champs.get("filename") or b""
+        nb_pages = _compter_pages(fichier)
+
+        time.sleep(CONFIG["latence"] * nb_pages)
+
+        if random.random() < CONFIG["erreurs_traitement"]:
+            _compter("erreurs_traitement")
+            return self._repondre(200, {
+                "OCRExitCode": 3,
+                "IsErroredOnProcessing": True,
+                "ErrorMessage": ["File failed validation (stand-in)"],
+                "ProcessingTimeInMilliseconds": "0"
+            })
+
+        _compter("ok")
+        self._repondre(200, {
+            "ParsedResults": [
+                {
+                    "TextOverlay": {"Lines": [], "HasOverlay": False, "Message": "Text overlay is not provided as it is not requested"},
+                    "TextOrientation": "0",
+                    "FileParseExitCode": 1,
+                    "ParsedText": f"Page {i + 1} ({len(fichier)} octets)\r\nTexte simulé par le stand-in OCR.space\r\n",
+                    "ErrorMessage": "",
+                    "ErrorDetails": ""
+                }
+                for i in range(nb_pages)
+            ],
+            "OCRExitCode": 1,
+            "IsErroredOnProcessing": False,
+            "ProcessingTimeInMilliseconds": str(int((time.perf_counter() - debut) * 1000)),
+            "SearchablePDFURL": "Searchable PDF not generated as it was not requested."
+        })
+
+
+def demarrer_serveur(port: int = 0) -> ThreadingHTTPServer:
+    """Démarre le stand-in dans un thread (port 0 = port libre)"""
+    serveur = ThreadingHTTPServer(("127.0.0.1", port), OCRSpaceStandIn)
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    return serveur
+
+
+def lire_options(args: list) -> dict:
+    options = {"port": 8088, "requetes": 50, "concurrence": 4, "par-minute": 0}
+    noms = {"--latence": "latence", "--erreurs": "erreurs", "--rate-limit": "rate_limit",
+            "--erreurs-traitement": "erreurs_traitement"}
+    for i in range(0, len(args) - 1, 2):
+        if args[i] in noms:
+            CONFIG[noms[args[i]]] = float(args[i + 1])
+        elif args[i] in ("--port", "--requetes", "--concurrence", "--par-minute"):
+            options[args[i][2:]] = int(args[i + 1])
+    return options
+
+
+async def _bench(url: str, nb_requetes: int, concurrence: int, par_minute: int):
+    from app.services.ocrspace_client import OCRSpaceClient
+    from app.services.quota_service import QuotaLedger
+
+    # Jamais le registre réel : le bench ne doit pas consommer le quota du mois
+    ledger = None
+    if par_minute > 0:
+        ledger = QuotaLedger(os.path.join(tempfile.mkdtemp(), "ocr_usage.json"), 10 ** 6, par_minute)
+
+    client = OCRSpaceClient(url=url, api_key="standin", max_concurrence=concurrence,
+                            backoff_base=0.2, backoff_max=2.0, deadline=60, ledger=ledger)
+    fichiers = [(b"%PDF-1.4 /Type /Page /Type /Page", f"copie_{i}.pdf", {}) for i in range(nb_requetes)]
+
+    debut = time.perf_counter()
+    reponses = await client.parse_many(fichiers)
+    duree = time.perf_counter() - debut
+    await client.aclose()
+
+    comptees = ledger.statut()["utilisees"] if ledger else None
+    return reponses, duree, client.stats, comptees
+
+
+def bench(options: dict):
+    serveur = demarrer_serveur(0)
+    url = f"http://127.0.0.1:{serveur.server_address[1]}/parse/image"
+
+    reponses, duree, stats, comptees = asyncio.run(
+        _bench(url, options["requetes"], options["concurrence"], options["par-minute"])
+    )
+    serveur.shutdown()
+
+    echecs = [r for r in reponses if isinstance(r, Exception)]
+    pages = sum(len(r) for r in reponses if not isinstance(r, Exception))
+
+    print("=" * 70)
+    print("🧪 BENCH CLIENT OCR.SPACE (stand-in local)")
+    print("=" * 70)
+    print(f"  ⚙️  Concurrence : {options['concurrence']}  |  Latence/page : {CONFIG['latence']}s  |  "
+          f"503 : {CONFIG['erreurs']:.0%}  |  429 : {CONFIG['rate_limit']:.0%}")
+    print(f"  📨 Requêtes : {options['requetes']}  →  {len(reponses) - len(echecs)} OK, {len(echecs)} échec(s)")
+    print(f"  🔁 Tentatives : {stats['tentatives']} ({stats['retries']} retries)")
+    print(f"  🚦 Attente limiteur : {stats['attente_quota_s']:.1f}s")
+    if comptees is not None:
+        print(f"  📒 Registre de quota : {comptees} requête(s) comptée(s)")
+    print(f"  🖥️  Serveur : {COMPTEURS}")
+    print(f"  ⏱️  {duree:.2f}s  →  {options['requetes'] / duree:.1f} req/s, {pages / duree:.1f} pages/s")
+    for erreur in echecs[:5]:
+        print(f"  ❌ {erreur}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("serve", "bench"):
+        print(__doc__)
+        sys.exit(1)
+
+    options = lire_options(sys.argv[2:])
+
+    if sys.argv[1] == "bench":
+        bench(options)
+    else:
+        serveur = ThreadingHTTPServer(("127.0.0.1", options["port"]), OCRSpaceStandIn)
+        print(f"🚀 Stand-in OCR.space sur http://127.0.0.1:{options['port']}/parse/image")
+        print(f"   Latence/page {CONFIG['latence']}s, 503 {CONFIG['erreurs']:.0%}, 429 {CONFIG['rate_limit']:.0%}")
+        serveur.serve_forever()